@@ -0,0 +1,124 @@
+"""
+benchmarks/bench_features.py
+============================
+Features de todo el catálogo: build_features juego por juego vs build_features_batch.
+
+Uso:
+  python -m benchmarks.bench_features --games 10000 --history 200 --sample 300
+
+Sobre una DuckDB temporal con `games` juegos (más algunos con 3–4 registros y
+precios 0, para cubrir los bordes) mide:
+  - por juego: get_game_bundle(include_history=True) + build_features en una
+    muestra de `sample` juegos, extrapolado al catálogo
+  - batch:     get_feature_inputs + build_features_batch + features_matrix
+  - estado:    get_feature_state (game_feature_state, mantenida en la ingesta)
+
+y verifica la paridad: para cada juego de la muestra (y todos los cortos) el
+dict de batch_row debe ser idéntico al de build_features, y las features desde
+game_feature_state idénticas a las calculadas desde el historial.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_ingest import make_batch
+
+
+def seed_db(con, games: int, history: int):
+    from src.db import queries
+
+    batch = make_batch(games * history, games)
+    # Algunos precios 0 (juego gratis por un tiempo): quedan fuera de la tendencia
+    rng = np.random.default_rng(3)
+    batch["price_usd"][rng.random(len(batch["price_usd"])) < 0.02] = 0.0
+    queries.upsert_price_columns(con, batch)
+
+    # Juegos cortos: 2 (se excluyen), 3 y 4 registros (sin tendencia)
+    for n in (2, 3, 4):
+        short = make_batch(n * 20, 20, seed=n)
+        short["game_id"] = np.array([f"short{n}-{g}" for g in short["game_id"]], dtype=object)
+        queries.upsert_price_columns(con, short)
+
+
+def per_game(con, game_ids: list[str]) -> dict:
+    from src.db import queries
+    from src.ml.features import build_features
+
+    out = {}
+    for gid in game_ids:
+        bundle = queries.get_game_bundle(con, gid, include_history=True)
+        out[gid] = build_features(bundle["stats"], bundle["history"], bundle["seasonal"])
+    return out
+
+
+def main(games: int, history: int, sample: int):
+    import duckdb
+
+    from src.db import queries
+    from src.db.models import create_all_tables
+    from src.ml.features import batch_row, build_features_batch, features_matrix
+
+    with tempfile.TemporaryDirectory() as tmp:
+        con = duckdb.connect(os.path.join(tmp, "bench.duckdb"))
+        create_all_tables(con)
+        seed_db(con, games, history)
+        ids = [r[0] for r in con.execute("SELECT DISTINCT game_id FROM price_history ORDER BY 1").fetchall()]
+        for gid in ids:
+            queries.upsert_game(con, gid, gid, gid.title(), None)
+
+        rng = np.random.default_rng(0)
+        picked = list(rng.choice([g for g in ids if g.startswith("game-")], size=sample, replace=False))
+        picked += [g for g in ids if g.startswith("short")]
+
+        t0 = time.perf_counter()
+        single = per_game(con, picked)
+        per_call = (time.perf_counter() - t0) / len(picked)
+
+        t0 = time.perf_counter()
+        batch = build_features_batch(queries.get_feature_inputs(con))
+        X = features_matrix(batch)
+        batch_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        state = build_features_batch(queries.get_feature_state(con))
+        state_s = time.perf_counter() - t0
+
+        n = len(batch["game_id"])
+        print(f"por juego  {per_call * 1e3:8.2f} ms/juego  → {per_call * n:8.1f}s estimados para {n:,} juegos")
+        print(f"batch      {batch_s:8.2f}s para {n:,} juegos  (matriz {X.shape[0]:,} × {X.shape[1]})"
+              f"  speedup {per_call * n / batch_s:,.0f}x")
+        print(f"estado     {state_s:8.2f}s para {n:,} juegos  (game_feature_state)")
+
+        same = list(state["game_id"]) == list(batch["game_id"]) and all(
+            batch_row(state, i) == batch_row(batch, i) for i in range(n))
+        print(f"Paridad game_feature_state vs historial: {'OK' if same else 'DIFERENTE'}")
+
+        # Paridad
+        pos = {gid: i for i, gid in enumerate(batch["game_id"])}
+        mismatches = []
+        for gid, expected in single.items():
+            got = batch_row(batch, pos[gid]) if gid in pos else None
+            if got != expected:
+                mismatches.append((gid, expected, got))
+        checked = len(single)
+        print(f"Paridad con build_features: {'OK' if not mismatches else 'DIFERENTE'} "
+              f"({checked - len(mismatches)}/{checked} juegos)")
+        for gid, expected, got in mismatches[:5]:
+            diff = {k: (v, (got or {}).get(k)) for k, v in (expected or {}).items()
+                    if (got or {}).get(k) != v}
+            print(f"  {gid}: {diff or (expected, got)}")
+
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--history", type=int, default=200)
+    parser.add_argument("--sample", type=int, default=300)
+    args = parser.parse_args()
+    main(args.games, args.history, args.sample)
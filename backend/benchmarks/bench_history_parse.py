@@ -0,0 +1,157 @@
+"""
+benchmarks/bench_history_parse.py
+=================================
+Parseo de respuestas de /games/history/v2: ruta anterior vs streaming.
+
+Uso:
+  python -m benchmarks.bench_history_parse --entries 200000
+  python -m benchmarks.bench_history_parse --file respuesta_grabada.json
+
+Compara, desde el cuerpo crudo hasta las columnas que recibe upsert_price_columns:
+  - records: json.loads + legacy_parse_history (PriceRecord, el parser que usaba
+             el cliente) + columnas por atributo
+  - stream:  history_parser.parse_history_columns (raw_decode → array.array → Arrow)
+
+Reporta tiempo, pico de memoria Python (tracemalloc) y verifica que ambas rutas
+produzcan las mismas filas. Sin --file genera una respuesta sintética con la
+forma A de ITAD (lista de {timestamp, shop, deal}).
+"""
+
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def make_response(entries: int, seed: int = 42) -> bytes:
+    """Cuerpo sintético de history/v2: cambios de precio cada ~3 días en varias tiendas."""
+    rng = np.random.default_rng(seed)
+    base = np.datetime64("2012-01-01T00:00:00", "s")
+    offsets = np.sort(rng.integers(0, 13 * 365 * 86400, size=entries))
+    shops = [(61, "Steam"), (35, "GOG"), (16, "Epic Game Store"), (37, "Humble Store")]
+    regular = 39.99
+    out = []
+    for off in offsets:
+        cut = int(rng.choice([0, 0, 10, 25, 33, 50, 75, 90]))
+        shop_id, shop_name = shops[int(rng.integers(0, len(shops)))]
+        ts = str(base + np.timedelta64(int(off), "s")) + "+00:00"
+        price = round(regular * (1 - cut / 100), 2)
+        out.append({
+            "timestamp": ts,
+            "shop": {"id": shop_id, "name": shop_name},
+            "deal": {
+                "price":   {"amount": price, "amountInt": int(price * 100), "currency": "USD"},
+                "regular": {"amount": regular, "amountInt": int(regular * 100), "currency": "USD"},
+                "cut": cut,
+            },
+        })
+    return json.dumps(out).encode()
+
+
+def legacy_parse_history(data, game_id: str, appid=None) -> list:
+    """Parser anterior de history/v2 (estructuras A/B/C) → un PriceRecord por entrada."""
+    from src.api.schemas import PriceRecord
+
+    if isinstance(data, dict):
+        entries = data.get("list") or data.get("prices") or data.get("history") or []
+        if not entries:
+            entries = next((v for v in data.values() if isinstance(v, list) and v), [])
+    elif isinstance(data, list):
+        entries = data
+    else:
+        entries = []
+
+    records = []
+    for entry in entries:
+        try:
+            if not isinstance(entry, dict):
+                continue
+            deal = entry.get("deal") or {}
+            price_obj = deal.get("price") or entry.get("price") or {}
+            regular_obj = deal.get("regular") or entry.get("regular") or {}
+            shop = deal.get("shop") or entry.get("shop") or {}
+
+            price_amount = price_obj.get("amount", 0) if isinstance(price_obj, dict) else float(price_obj or 0)
+            regular_amount = regular_obj.get("amount", 0) if isinstance(regular_obj, dict) else float(regular_obj or 0)
+            cut = deal.get("cut") if "cut" in deal else entry.get("cut", 0)
+            ts = entry.get("timestamp")
+            if not ts:
+                continue
+
+            records.append(PriceRecord(
+                game_id=game_id,
+                appid=appid,
+                timestamp=ts,
+                price_usd=float(price_amount or 0),
+                regular_usd=float(regular_amount or 0),
+                cut_pct=int(cut or 0),
+                shop_id=shop.get("id") if isinstance(shop, dict) else None,
+                shop_name=shop.get("name", "Steam") if isinstance(shop, dict) else "Steam",
+            ))
+        except Exception:
+            continue
+    return records
+
+
+def records_path(raw: bytes, game_id: str):
+    """Ruta anterior: el JSON completo en memoria y un PriceRecord por entrada."""
+    import pyarrow as pa
+
+    from src.db.queries import PRICE_COLUMNS
+
+    records = legacy_parse_history(json.loads(raw), game_id, 10)
+    return pa.table({c: [getattr(r, c) for r in records] for c in PRICE_COLUMNS})
+
+
+def stream_path(raw: bytes, game_id: str):
+    import pyarrow as pa
+
+    from src.api.history_parser import parse_history_columns
+
+    _, columns = parse_history_columns(raw, game_id, 10)
+    return pa.table(columns)
+
+
+def measure(label: str, entries: int, fn, raw: bytes, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(raw, "game-bench")
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    table = fn(raw, "game-bench")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {entries:>10,} entradas  {best:8.3f}s  "
+          f"{entries / best:>12,.0f} entradas/s  pico Python {peak / 2**20:8.1f} MiB")
+    return table
+
+
+def main(entries: int, path: str, repeat: int):
+    from src.db.queries import _to_price_table
+
+    logging.disable(logging.INFO)
+    raw = open(path, "rb").read() if path else make_response(entries)
+    if path:
+        from src.api.history_parser import parse_history_columns
+        entries = parse_history_columns(raw, "game-bench")[0]
+    print(f"Respuesta: {len(raw) / 2**20:.1f} MiB")
+
+    old = measure("records", entries, records_path, raw, repeat)
+    new = measure("stream", entries, stream_path, raw, repeat)
+
+    # Paridad: mismas filas una vez normalizadas al schema de price_history
+    same = _to_price_table(old).equals(_to_price_table(new))
+    print(f"Paridad de filas: {'OK' if same else 'DIFERENTE'} ({new.num_rows:,} filas)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--file", default=None, help="Cuerpo grabado de /games/history/v2")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.entries, args.file, args.repeat)
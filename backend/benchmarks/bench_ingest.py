@@ -0,0 +1,90 @@
+"""
+benchmarks/bench_ingest.py
+==========================
+Throughput de ingesta de price_history (filas/seg).
+
+Uso:
+  python -m benchmarks.bench_ingest --rows 1000000
+
+Mide sobre una DuckDB temporal:
+  - columnar: upsert_price_columns con arrays NumPy (batch nuevo)
+  - columnar: el mismo batch otra vez (todo conflicto → 0 insertadas)
+  - records:  upsert_price_records con list[dict] (ruta de compatibilidad)
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def make_batch(rows: int, games: int, seed: int = 42) -> dict:
+    """Batch sintético: `games` juegos con registros semanales y descuentos aleatorios."""
+    rng = np.random.default_rng(seed)
+    per_game = max(1, rows // games)
+    game_idx = np.repeat(np.arange(games), per_game)[:rows]
+    step = np.tile(np.arange(per_game), games)[:rows]
+
+    base = np.datetime64("2015-01-01T00:00:00", "us")
+    timestamp = base + (step * 7 * 24 * 3600).astype("timedelta64[s]")
+    regular = rng.choice([9.99, 19.99, 29.99, 59.99], size=games)[game_idx]
+    cut = rng.choice([0, 0, 0, 10, 25, 50, 75], size=len(game_idx)).astype(np.int32)
+
+    return {
+        "game_id":     np.array([f"game-{i:06d}" for i in range(games)], dtype=object)[game_idx],
+        "appid":       (game_idx + 10).astype(np.int32),
+        "timestamp":   timestamp,
+        "price_usd":   np.round(regular * (1 - cut / 100), 2),
+        "regular_usd": regular,
+        "cut_pct":     cut,
+        "shop_id":     np.full(len(game_idx), 61, dtype=np.int32),
+        "shop_name":   np.full(len(game_idx), "Steam", dtype=object),
+    }
+
+
+def timed(label: str, rows: int, fn) -> int:
+    t0 = time.perf_counter()
+    inserted = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<34} {rows:>10,} filas  {elapsed:8.2f}s  "
+          f"{rows / elapsed:>12,.0f} filas/s  (insertadas: {inserted:,})")
+    return inserted
+
+
+def main(rows: int, games: int, records_rows: int):
+    import duckdb
+
+    from src.db import queries
+    from src.db.models import create_all_tables
+
+    with tempfile.TemporaryDirectory() as tmp:
+        con = duckdb.connect(os.path.join(tmp, "bench.duckdb"))
+        create_all_tables(con)
+
+        batch = make_batch(rows, games)
+        timed("upsert_price_columns (nuevo)", rows,
+              lambda: queries.upsert_price_columns(con, batch))
+        timed("upsert_price_columns (duplicado)", rows,
+              lambda: queries.upsert_price_columns(con, batch))
+
+        small = make_batch(records_rows, max(1, games // 10), seed=7)
+        small["game_id"] = np.array([f"rec-{g}" for g in small["game_id"]], dtype=object)
+        records = [
+            {k: (v[i].item() if hasattr(v[i], "item") else v[i]) for k, v in small.items()}
+            for i in range(records_rows)
+        ]
+        timed("upsert_price_records (list[dict])", records_rows,
+              lambda: queries.upsert_price_records(con, records))
+
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--games", type=int, default=2_000)
+    parser.add_argument("--records-rows", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.rows, args.games, args.records_rows)
@@ -0,0 +1,116 @@
+"""
+benchmarks/bench_model.py
+=========================
+Modelo desde model.joblib (scikit-learn) vs model.npz (src/ml/compiled.py).
+
+Uso:
+  python -m benchmarks.bench_model --samples 20000 --rows 10000
+
+Entrena un GradientBoostingRegressor con los mismos hiperparámetros que
+train.py sobre datos sintéticos en FEATURE_ORDER, lo guarda en ambos formatos
+en un directorio temporal y mide:
+  - carga:    proceso nuevo que importa y carga el artefacto (tiempo y pico de
+              RSS; lee /proc, solo Linux)
+  - una fila: predict de un solo juego (lo que hace /predict/{id})
+  - batch:    predict de `rows` filas (predict_many)
+
+y verifica que las predicciones sean idénticas bit a bit.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+_LOAD_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+if sys.argv[1].endswith(".npz"):
+    from src.ml.compiled import CompiledGBR
+    CompiledGBR.load(sys.argv[1])
+else:
+    import joblib
+    joblib.load(sys.argv[1])
+# VmHWM (pico de RSS) y no ru_maxrss, que en Linux hereda el pico del proceso padre
+hwm = next(line.split()[1] for line in open("/proc/self/status") if line.startswith("VmHWM"))
+print(time.perf_counter() - t0, hwm)
+"""
+
+
+def synthetic(n: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    from src.ml.features import FEATURE_ORDER
+
+    rng = np.random.default_rng(seed)
+    X = rng.random((n, len(FEATURE_ORDER))) * 100
+    y = np.clip(100 - X[:, 0] * 0.4 + np.sin(X[:, 1] / 10) * 15 + rng.normal(0, 5, n), 0, 100)
+    return X, y
+
+
+def measure_load(path: str) -> tuple[float, float]:
+    out = subprocess.run([sys.executable, "-c", _LOAD_SNIPPET, path], capture_output=True,
+                         text=True, check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    seconds, rss_kb = out.stdout.split()
+    return float(seconds), int(rss_kb) / 1024
+
+
+def per_call(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main(samples: int, rows: int):
+    import joblib
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    from src.ml.compiled import CompiledGBR, export_model
+
+    X, y = synthetic(samples)
+    scaler = StandardScaler().fit(X)
+    model = GradientBoostingRegressor(n_estimators=200, max_depth=4, learning_rate=0.05,
+                                      random_state=42).fit(scaler.transform(X), y)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        joblib_path = os.path.join(tmp, "model.joblib")
+        npz_path = os.path.join(tmp, "model.npz")
+        joblib.dump({"model": model, "scaler": scaler}, joblib_path)
+        export_model(model, scaler, npz_path)
+        compiled = CompiledGBR.load(npz_path)
+
+        for label, path in (("joblib", joblib_path), ("npz", npz_path)):
+            seconds, rss = measure_load(path)
+            print(f"carga {label:7s} {seconds * 1e3:8.1f} ms  RSS {rss:6.1f} MB  "
+                  f"archivo {os.path.getsize(path) / 1024:7.1f} KB")
+
+        Xq, _ = synthetic(rows, seed=1)
+        one = Xq[:1]
+        sk_one = per_call(lambda: model.predict(scaler.transform(one)), 200)
+        c_one = per_call(lambda: compiled.predict(one), 2000)
+        print(f"una fila  sklearn {sk_one * 1e6:8.1f} µs  compilado {c_one * 1e6:8.1f} µs  "
+              f"({sk_one / c_one:.1f}x)")
+
+        t0 = time.perf_counter()
+        expected = model.predict(scaler.transform(Xq))
+        sk_batch = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = compiled.predict(Xq)
+        c_batch = time.perf_counter() - t0
+        print(f"batch     sklearn {sk_batch * 1e3:8.1f} ms  compilado {c_batch * 1e3:8.1f} ms  "
+              f"({rows:,} filas)")
+
+        singles = all(compiled.predict(Xq[i])[0] == expected[i] for i in range(0, rows, max(1, rows // 500)))
+        same = np.array_equal(got, expected) and singles
+        print(f"Paridad con scikit-learn: {'OK' if same else 'DIFERENTE'}"
+              + ("" if same else f" (máx {np.max(np.abs(got - expected)):.3g})"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20_000, help="Muestras de entrenamiento")
+    parser.add_argument("--rows", type=int, default=10_000, help="Filas del batch")
+    args = parser.parse_args()
+    main(args.samples, args.rows)
@@ -0,0 +1,113 @@
+"""
+benchmarks/bench_queries.py
+===========================
+Latencia por llamada de la capa de queries: pandas (antes) vs src.db.rows (ahora).
+
+Uso:
+  python -m benchmarks.bench_queries --games 2000 --history 500 --calls 500
+
+"antes" reproduce el patrón original con el mismo SQL: fetchdf() → to_dict() → _san.
+"ahora" llama a las funciones actuales de src.db.queries.
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from benchmarks.bench_ingest import make_batch
+
+
+# ── Implementaciones previas (pandas) ─────────────────────────────────────────
+
+def _san(d: dict) -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, float) and (math.isnan(v) or math.isinf(v)):
+            out[k] = None
+        else:
+            out[k] = v
+    return out
+
+
+def legacy_get_game(con, game_id):
+    row = con.execute("SELECT * FROM games WHERE id=?", [game_id]).fetchdf()
+    return _san(row.iloc[0].to_dict()) if not row.empty else None
+
+
+def legacy_get_price_history(con, game_id):
+    rows = con.execute("""
+        SELECT timestamp, price_usd, regular_usd, cut_pct, shop_name
+        FROM price_history
+        WHERE game_id = ?
+        ORDER BY timestamp ASC
+    """, [game_id]).fetchdf()
+    return rows.to_dict(orient="records")
+
+
+def legacy_list_games(con, limit=50, offset=0):
+    rows = con.execute("""
+        SELECT g.id, g.title, g.appid, g.slug,
+               COALESCE(s.total_records, 0) AS total_records,
+               COALESCE(s.min_price, 0)     AS min_price,
+               COALESCE(s.max_cut, 0)       AS max_discount
+        FROM games g
+        LEFT JOIN game_price_summary s ON s.game_id = g.id
+        ORDER BY total_records DESC
+        LIMIT ? OFFSET ?
+    """, [limit, offset]).fetchdf()
+    return [_san(r) for r in rows.to_dict(orient="records")]
+
+
+# ── Medición ──────────────────────────────────────────────────────────────────
+
+def per_call_us(fn, calls: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main(games: int, history: int, calls: int):
+    import duckdb
+
+    from src.db import queries
+    from src.db.models import create_all_tables
+
+    with tempfile.TemporaryDirectory() as tmp:
+        con = duckdb.connect(os.path.join(tmp, "bench.duckdb"))
+        create_all_tables(con)
+
+        batch = make_batch(games * history, games)
+        for i in range(games):
+            queries.upsert_game(con, f"game-{i:06d}", f"game-{i}", f"Game {i}", i + 10)
+        queries.upsert_price_columns(con, batch)
+
+        game_id = "game-000042"
+        cases = [
+            ("get_game",          lambda: legacy_get_game(con, game_id),
+                                  lambda: queries.get_game(con, game_id)),
+            ("get_price_history", lambda: legacy_get_price_history(con, game_id),
+                                  lambda: queries.get_price_history(con, game_id)),
+            ("list_games",        lambda: legacy_list_games(con),
+                                  lambda: queries.list_games(con)),
+        ]
+
+        print(f"{'query':<20} {'antes (µs)':>12} {'ahora (µs)':>12} {'speedup':>9}")
+        for name, before, after in cases:
+            b = per_call_us(before, calls)
+            a = per_call_us(after, calls)
+            print(f"{name:<20} {b:>12,.0f} {a:>12,.0f} {b / a:>8.1f}x")
+
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2_000)
+    parser.add_argument("--history", type=int, default=500)
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+    main(args.games, args.history, args.calls)
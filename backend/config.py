@@ -19,11 +19,28 @@ class Settings:
     itad_base_url: str = os.getenv("ITAD_BASE_URL", "https://api.isthereanydeal.com")
     itad_country: str = os.getenv("ITAD_COUNTRY", "US")
     itad_history_since: str = os.getenv("ITAD_HISTORY_SINCE", "2022-01-01T00:00:00Z")
+    itad_sync_overlap_hours: int = int(os.getenv("ITAD_SYNC_OVERLAP_HOURS", "48"))
+    itad_rate_per_sec: float = float(os.getenv("ITAD_RATE_PER_SEC", "5"))
+    itad_burst: int = int(os.getenv("ITAD_BURST", "10"))
+    itad_max_concurrency: int = int(os.getenv("ITAD_MAX_CONCURRENCY", "8"))
+    itad_lookup_ttl_days: float = float(os.getenv("ITAD_LOOKUP_TTL_DAYS", "30"))
+    itad_lookup_miss_ttl_hours: float = float(os.getenv("ITAD_LOOKUP_MISS_TTL_HOURS", "72"))
+
+    # ── Clientes HTTP (ITAD / Steam) ────────────────────────────
+    http2: bool = os.getenv("HTTP2", "false").lower() == "true"
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    singleflight_ttl_seconds: float = float(os.getenv("SINGLEFLIGHT_TTL_SECONDS", "30"))
 
     # ── DuckDB ──────────────────────────────────────────────────
     duckdb_path: str = os.getenv("DUCKDB_PATH", "./data/steamsense.duckdb")
     duckdb_memory_limit: str = os.getenv("DUCKDB_MEMORY_LIMIT", "512MB")
     duckdb_threads: int = int(os.getenv("DUCKDB_THREADS", "2"))
+    duckdb_pool_size: int = int(os.getenv("DUCKDB_POOL_SIZE", "8"))
+    duckdb_pool_idle_seconds: float = float(os.getenv("DUCKDB_POOL_IDLE_SECONDS", "300"))
+    duckdb_pool_timeout: float = float(os.getenv("DUCKDB_POOL_TIMEOUT", "30"))
+    duckdb_writer_batch: int = int(os.getenv("DUCKDB_WRITER_BATCH", "64"))
+    cold_storage_path: str = os.getenv("COLD_STORAGE_PATH", "./data/cold")
+    hot_history_days: int = int(os.getenv("HOT_HISTORY_DAYS", "365"))
 
     # ── API ─────────────────────────────────────────────────────
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
@@ -36,6 +53,23 @@ class Settings:
     request_batch_size: int = int(os.getenv("REQUEST_BATCH_SIZE", "10"))
     request_delay: float = float(os.getenv("REQUEST_DELAY", "0.5"))
 
+    # ── Pipeline de sync_top_games ──────────────────────────────
+    sync_fetch_concurrency: int = int(os.getenv("SYNC_FETCH_CONCURRENCY", "4"))
+    sync_parse_concurrency: int = int(os.getenv("SYNC_PARSE_CONCURRENCY", "2"))
+    sync_queue_size: int = int(os.getenv("SYNC_QUEUE_SIZE", "32"))
+    sync_write_batch_rows: int = int(os.getenv("SYNC_WRITE_BATCH_ROWS", "5000"))
+
+    # ── Cola de trabajos ────────────────────────────────────────
+    job_workers: int = int(os.getenv("JOB_WORKERS", "1"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    job_retry_base_seconds: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+    job_poll_seconds: float = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+    # ── Scheduler de refresco ───────────────────────────────────
+    refresh_budget_per_hour: int = int(os.getenv("REFRESH_BUDGET_PER_HOUR", "60"))
+    refresh_interval_seconds: float = float(os.getenv("REFRESH_INTERVAL_SECONDS", "300"))
+    refresh_min_age_hours: float = float(os.getenv("REFRESH_MIN_AGE_HOURS", "12"))
+
     @property
     def cors_origins_list(self) -> list[str]:
         return [o.strip() for o in self.cors_origins.split(",")]
@@ -61,14 +95,40 @@ class Settings:
         self.itad_base_url = os.getenv("ITAD_BASE_URL", "https://api.isthereanydeal.com")
         self.itad_country = os.getenv("ITAD_COUNTRY", "US")
         self.itad_history_since = os.getenv("ITAD_HISTORY_SINCE", "2022-01-01T00:00:00Z")
+        self.itad_sync_overlap_hours = int(os.getenv("ITAD_SYNC_OVERLAP_HOURS", "48"))
+        self.itad_rate_per_sec = float(os.getenv("ITAD_RATE_PER_SEC", "5"))
+        self.itad_burst = int(os.getenv("ITAD_BURST", "10"))
+        self.itad_max_concurrency = int(os.getenv("ITAD_MAX_CONCURRENCY", "8"))
+        self.itad_lookup_ttl_days = float(os.getenv("ITAD_LOOKUP_TTL_DAYS", "30"))
+        self.itad_lookup_miss_ttl_hours = float(os.getenv("ITAD_LOOKUP_MISS_TTL_HOURS", "72"))
+        self.http2 = os.getenv("HTTP2", "false").lower() == "true"
+        self.http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+        self.singleflight_ttl_seconds = float(os.getenv("SINGLEFLIGHT_TTL_SECONDS", "30"))
         self.duckdb_path = os.getenv("DUCKDB_PATH", "./data/steamsense.duckdb")
         self.duckdb_memory_limit = os.getenv("DUCKDB_MEMORY_LIMIT", "512MB")
         self.duckdb_threads = int(os.getenv("DUCKDB_THREADS", "2"))
+        self.duckdb_pool_size = int(os.getenv("DUCKDB_POOL_SIZE", "8"))
+        self.duckdb_pool_idle_seconds = float(os.getenv("DUCKDB_POOL_IDLE_SECONDS", "300"))
+        self.duckdb_pool_timeout = float(os.getenv("DUCKDB_POOL_TIMEOUT", "30"))
+        self.duckdb_writer_batch = int(os.getenv("DUCKDB_WRITER_BATCH", "64"))
+        self.cold_storage_path = os.getenv("COLD_STORAGE_PATH", "./data/cold")
+        self.hot_history_days = int(os.getenv("HOT_HISTORY_DAYS", "365"))
         self.cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000")
         self.env = os.getenv("ENV", "development")
         self.top_n_games = int(os.getenv("TOP_N_GAMES", "200"))
         self.request_batch_size = int(os.getenv("REQUEST_BATCH_SIZE", "10"))
         self.request_delay = float(os.getenv("REQUEST_DELAY", "0.5"))
+        self.sync_fetch_concurrency = int(os.getenv("SYNC_FETCH_CONCURRENCY", "4"))
+        self.sync_parse_concurrency = int(os.getenv("SYNC_PARSE_CONCURRENCY", "2"))
+        self.sync_queue_size = int(os.getenv("SYNC_QUEUE_SIZE", "32"))
+        self.sync_write_batch_rows = int(os.getenv("SYNC_WRITE_BATCH_ROWS", "5000"))
+        self.job_workers = int(os.getenv("JOB_WORKERS", "1"))
+        self.job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.job_retry_base_seconds = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+        self.job_poll_seconds = float(os.getenv("JOB_POLL_SECONDS", "2"))
+        self.refresh_budget_per_hour = int(os.getenv("REFRESH_BUDGET_PER_HOUR", "60"))
+        self.refresh_interval_seconds = float(os.getenv("REFRESH_INTERVAL_SECONDS", "300"))
+        self.refresh_min_age_hours = float(os.getenv("REFRESH_MIN_AGE_HOURS", "12"))
 
 
 _settings = None
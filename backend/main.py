@@ -9,9 +9,16 @@ from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import get_settings
-from src.db.connection import init_db, get_db, close_db
-from src.db.models import create_all_tables, create_user_tables
+from src.api.client import start_client, close_client
+from src.api.steam_client import start_steam_client, close_steam_client
+from src.db.connection import init_db, db_cursor, close_db
+from src.db.models import create_all_tables, create_job_tables, create_user_tables
+from src.db.queries import backfill_derived_tables
+from src.db.writer import start_writer, stop_writer
 from src.ml.model import get_model
+from src.services.job_service import start_job_worker, stop_job_worker
+from src.services.refresh_scheduler import start_refresh_scheduler, stop_refresh_scheduler
+from src.services.search_index import get_index
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,23 +32,39 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     logger.info("Iniciando SteamSense API...")
 
-    init_db()           # solo configura _db_path, no abre conexión
-    con = get_db()      # abre la conexión del main thread
-    create_all_tables(con)
-    create_user_tables(con)
+    init_db()           # abre la instancia compartida y el pool de cursores
+    with db_cursor() as con:
+        create_all_tables(con)
+        create_user_tables(con)
+        create_job_tables(con)
+        backfill_derived_tables(con)
+    start_writer(settings.duckdb_writer_batch)   # todas las mutaciones pasan por aquí
+    get_index().rebuild()   # índice local de títulos para /games/search
     logger.info("DuckDB listo")
 
     get_model()
     logger.info("Modelo ML listo")
 
-    if not settings.itad_api_key:
+    # Clientes HTTP compartidos: un pool keep-alive por servicio para todo el proceso
+    if settings.itad_api_key:
+        await start_client()
+    else:
         logger.warning("ITAD_API_KEY no configurada")
+    await start_steam_client()
     if not settings.steam_api_key:
         logger.warning("STEAM_API_KEY no configurada — login con Steam deshabilitado")
 
+    await start_job_worker()     # reanuda trabajos interrumpidos por un reinicio
+    start_refresh_scheduler()    # refrescos por prioridad con presupuesto ITAD por hora
+
     logger.info(f"SteamSense API lista — modo: {settings.env}")
     yield
 
+    await stop_refresh_scheduler()
+    await stop_job_worker()
+    await close_client()
+    await close_steam_client()
+    stop_writer()       # drena la cola antes de cerrar la conexión
     close_db()
     logger.info("SteamSense API detenida")
 
@@ -63,7 +86,7 @@ app.add_middleware(
 )
 
 # Import routers here (after app creation) to avoid circular import issues
-from src.routes import games, prices, predict, sync, stats, auth, user  # noqa: E402
+from src.routes import games, prices, predict, sync, stats, auth, user, jobs  # noqa: E402
 
 app.include_router(games.router)
 app.include_router(prices.router)
@@ -72,6 +95,7 @@ app.include_router(sync.router)
 app.include_router(stats.router)
 app.include_router(auth.router)
 app.include_router(user.router)
+app.include_router(jobs.router)
 
 
 @app.get("/", tags=["health"])
@@ -82,7 +106,8 @@ def root():
 @app.get("/health", tags=["health"])
 def health():
     try:
-        get_db().execute("SELECT 1").fetchone()
+        with db_cursor(timeout=5) as con:
+            con.execute("SELECT 1").fetchone()
         db_status = "ok"
     except Exception:
         db_status = "error"
@@ -2,9 +2,12 @@
 src/api/client.py
 =================
 Cliente HTTP para IsThereAnyDeal API.
-Maneja: autenticación, retry con backoff, rate limiting, parsing de respuestas.
+Maneja: autenticación, retry con backoff, parsing de respuestas.
+El rate limiting es global a todo el proceso (src.api.rate_limit).
 
-Una sola instancia se crea en el lifespan de FastAPI y se reutiliza.
+Una sola instancia (get_client) se abre en el lifespan de FastAPI y se reutiliza:
+su pool keep-alive lo comparten búsqueda, precios actuales y sync.
+`async with ITADClient(key)` sigue sirviendo para scripts con su propio pool.
 """
 
 import asyncio
@@ -14,12 +17,27 @@ from typing import Optional
 import httpx
 
 from config import get_settings
-from src.api.schemas import ITADLookupResponse, ITADGame, PriceRecord, ITADSearchResult
+from src.api.history_parser import parse_history_columns
+from src.api.http import new_async_client
+from src.api.rate_limit import itad_request
+from src.api.schemas import ITADLookupResponse, ITADGame, ITADSearchResult
+from src.api.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Shop id de Steam en ITAD (endpoints /lookup/id/shop/{shop}/...)
+_STEAM_SHOP_ID = 61
+
+# Llamadas idénticas concurrentes comparten un solo request; los resultados no
+# vacíos quedan SINGLEFLIGHT_TTL_SECONDS en cache (vacío puede ser un fallo).
+_search_flight = SingleFlight("itad.search", ttl=settings.singleflight_ttl_seconds, cache_if=bool)
+_prices_flight = SingleFlight("itad.current_prices", ttl=settings.singleflight_ttl_seconds,
+                              cache_if=bool)
+_info_flight = SingleFlight("itad.game_info", ttl=settings.singleflight_ttl_seconds,
+                            cache_if=lambda info: info is not None)
+
 
 class ITADClient:
     """
@@ -34,34 +52,60 @@ class ITADClient:
         self._base = settings.itad_base_url
         self._client: Optional[httpx.AsyncClient] = None
 
-    async def __aenter__(self):
-        self._client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0, connect=10.0),
-            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
-        )
+    async def open(self):
+        """Crea el pool de conexiones (idempotente)."""
+        if self._client is None or self._client.is_closed:
+            self._client = new_async_client(timeout=30.0, connect=10.0,
+                                            max_connections=20, max_keepalive=10)
         return self
 
-    async def __aexit__(self, *_):
-        if self._client:
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
             await self._client.aclose()
+        self._client = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *_):
+        await self.aclose()
+
+    async def _request(self, method: str, path: str, retries: int = 3, **kwargs) -> httpx.Response:
+        if self._client is None or self._client.is_closed:
+            await self.open()
+        return await itad_request(self._client, method, f"{self._base}{path}",
+                                  retries=retries, **kwargs)
 
     def _params(self, extra: dict) -> dict:
         """Agrega la API key a todos los requests."""
         return {"key": self._key, **extra}
 
     async def _get(self, path: str, params: dict, retries: int = 3) -> Optional[dict]:
-        """GET con retry exponencial."""
-        url = f"{self._base}{path}"
+        """GET con el cuerpo ya decodificado como JSON (ver _get_response)."""
+        r = await self._get_response(path, params, retries)
+        if r is None:
+            return None
+        try:
+            return r.json()
+        except ValueError as e:
+            logger.error(f"JSON inválido en {path}: {e}")
+            return None
+
+    async def _get_response(self, path: str, params: dict,
+                            retries: int = 3) -> Optional[httpx.Response]:
+        """
+        GET vía el limitador global (429/503 y Retry-After se manejan ahí).
+        Los timeouts se reintentan aquí. None si no hubo un 200.
+        """
         for attempt in range(retries):
             try:
-                r = await self._client.get(url, params=self._params(params))
+                r = await self._request("GET", path, retries=retries,
+                                        params=self._params(params))
                 if r.status_code == 200:
-                    return r.json()
+                    return r
                 if r.status_code == 429:
-                    wait = 2 ** attempt
-                    logger.warning(f"Rate limit hit, esperando {wait}s...")
-                    await asyncio.sleep(wait)
-                    continue
+                    logger.warning(f"Rate limit persistente en {path} tras {retries} intentos")
+                    return None
                 logger.debug(f"HTTP {r.status_code} en {path}")
                 return None
             except httpx.TimeoutException:
@@ -79,106 +123,98 @@ class ITADClient:
         Convierte un Steam appid en datos de ITAD.
         Retorna (game_id, slug, title) o None si no se encontró.
         """
+        game, _ = await self.lookup_game_status(appid)
+        return game
+
+    async def lookup_game_status(self, appid: int) -> tuple[Optional[tuple[str, str, str]], bool]:
+        """
+        Como lookup_game, pero distingue "ITAD no lo conoce" de un error:
+        retorna (juego | None, definitivo). definitivo=False si el request falló.
+        """
         data = await self._get("/games/lookup/v1", {"appid": appid})
         if not data:
-            return None
+            return None, False
         try:
             resp = ITADLookupResponse(**data)
             if resp.found and resp.game:
-                return (resp.game.id, resp.game.slug, resp.game.title)
-            return None
+                return (resp.game.id, resp.game.slug, resp.game.title), True
+            return None, True
         except Exception as e:
             logger.debug(f"Error parseando lookup para appid={appid}: {e}")
+            return None, False
+
+    async def lookup_appids_bulk(self, appids: list[int]) -> Optional[dict[int, Optional[str]]]:
+        """
+        Resuelve muchos appids en un request: POST /lookup/id/shop/61/v1 (61 = Steam)
+        con ["app/<appid>", ...]. Retorna {appid: game_id | None} o None si falló
+        (para no cachear como "no encontrado" lo que fue un error de red).
+        """
+        if not appids:
+            return {}
+        try:
+            r = await self._request(
+                "POST", f"/lookup/id/shop/{_STEAM_SHOP_ID}/v1",
+                params={"key": self._key},
+                json=[f"app/{a}" for a in appids],
+            )
+        except Exception as e:
+            logger.error(f"Error en lookup bulk: {e}")
+            return None
+        if r.status_code != 200:
+            logger.warning(f"ITAD lookup bulk HTTP {r.status_code}: {r.text[:200]}")
             return None
+        data = r.json()
+        if not isinstance(data, dict):
+            return None
+        result = {}
+        for a in appids:
+            gid = data.get(f"app/{a}")
+            result[a] = gid if isinstance(gid, str) and gid else None
+        return result
 
-    async def get_price_history(
-        self,
-        game_id: str,
-        appid: Optional[int] = None,
-        since: Optional[str] = None,
-    ) -> list[PriceRecord]:
+    async def fetch_price_history(self, game_id: str, since: Optional[str] = None) -> Optional[bytes]:
         """
-        Obtiene historial completo de precios de un juego.
-        Retorna lista de PriceRecord normalizados.
+        Cuerpo crudo (bytes) de /games/history/v2 desde `since` (ISO 8601; por
+        defecto ITAD_HISTORY_SINCE, es decir el historial completo). None si falló.
+        Se decodifica en streaming con history_parser.parse_history_columns.
         """
         params = {
             "id": game_id,
             "country": settings.itad_country,
             "since": since or settings.itad_history_since,
         }
-        data = await self._get("/games/history/v2", params)
-        if not data:
-            logger.warning(f"history/v2 vacío para game_id={game_id}")
-            return []
-
-        # ITAD /games/history/v2 puede retornar varias estructuras según versión:
-        # A) Lista directa: [{timestamp, deal:{price,regular,cut,shop}}, ...]
-        # B) Dict con lista: {"list": [{...}], "urls": {...}}
-        # C) Lista de objetos planos: [{timestamp, price:{amount}, cut, shop:{id,name}}]
-        if isinstance(data, dict):
-            entries = data.get("list") or data.get("prices") or data.get("history") or []
-            if not entries:
-                # Intentar cualquier lista dentro del dict
-                for v in data.values():
-                    if isinstance(v, list) and v:
-                        entries = v
-                        break
-        elif isinstance(data, list):
-            entries = data
-        else:
-            entries = []
-
-        if entries:
-            logger.info(f"history/v2 → {len(entries)} entradas para {game_id}. "
-                        f"Keys del primer entry: {list(entries[0].keys()) if isinstance(entries[0], dict) else type(entries[0])}")
-        else:
-            logger.warning(f"history/v2 sin entradas para {game_id}. Estructura: {str(data)[:300]}")
-            return []
-
-        records = []
-        for entry in entries:
-            try:
-                if not isinstance(entry, dict):
-                    continue
-
-                # Estructura A/C: deal anidado
-                deal = entry.get("deal") or {}
-
-                # Precio: puede estar en deal.price o directo en entry
-                price_obj    = deal.get("price") or entry.get("price") or {}
-                regular_obj  = deal.get("regular") or entry.get("regular") or {}
-                shop         = deal.get("shop") or entry.get("shop") or {}
-
-                price_amount   = price_obj.get("amount", 0) if isinstance(price_obj, dict) else float(price_obj or 0)
-                regular_amount = regular_obj.get("amount", 0) if isinstance(regular_obj, dict) else float(regular_obj or 0)
-                cut            = deal.get("cut") if "cut" in deal else entry.get("cut", 0)
-                ts             = entry.get("timestamp")
-
-                if not ts:
-                    continue
-
-                shop_id   = shop.get("id") if isinstance(shop, dict) else None
-                shop_name = shop.get("name", "Steam") if isinstance(shop, dict) else "Steam"
-
-                records.append(PriceRecord(
-                    game_id=game_id,
-                    appid=appid,
-                    timestamp=ts,
-                    price_usd=float(price_amount or 0),
-                    regular_usd=float(regular_amount or 0),
-                    cut_pct=int(cut or 0),
-                    shop_id=shop_id,
-                    shop_name=shop_name,
-                ))
-            except Exception as e:
-                logger.debug(f"Entry skip: {e} — {str(entry)[:100]}")
-                continue
+        r = await self._get_response("/games/history/v2", params)
+        if r is None:
+            (logger.debug if since else logger.warning)(f"history/v2 vacío para game_id={game_id}")
+            return None
+        return r.content
 
-        logger.info(f"Parseados {len(records)}/{len(entries)} registros para {game_id}")
-        return records
+    async def get_price_history_columns(
+        self,
+        game_id: str,
+        appid: Optional[int] = None,
+        since: Optional[str] = None,
+    ) -> Optional[tuple[int, dict]]:
+        """
+        Historial de precios desde `since` como columnas listas para
+        queries.upsert_price_columns: (filas, {columna: pyarrow.Array}).
+        None si el request falló o la respuesta no es JSON válido (distinto de
+        0 filas, que es "no hay registros nuevos").
+        """
+        raw = await self.fetch_price_history(game_id, since=since)
+        if raw is None:
+            return None
+        try:
+            return parse_history_columns(raw, game_id, appid, quiet_empty=bool(since))
+        except ValueError:
+            return None
 
     async def search_games(self, query: str, limit: int = 20) -> list[ITADSearchResult]:
-        """Busca juegos por nombre en ITAD."""
+        """Busca juegos por nombre en ITAD (búsquedas idénticas simultáneas se coalescen)."""
+        return await _search_flight.do((query.strip().lower(), limit),
+                                       lambda: self._search_games(query, limit))
+
+    async def _search_games(self, query: str, limit: int) -> list[ITADSearchResult]:
         data = await self._get("/games/search/v1", {"title": query, "results": limit})
         if not data:
             return []
@@ -190,20 +226,40 @@ class ITADClient:
                 continue
         return results
 
-    async def get_current_prices(self, game_ids: list[str]) -> dict:
-        """Obtiene precios actuales de múltiples juegos (batch)."""
+    async def get_current_prices(self, game_ids: list[str]) -> list:
+        """
+        Precios actuales de múltiples juegos (batch): POST /games/prices/v3
+        con la lista de ids en el body. Lista vacía si falló.
+        Pedidos simultáneos del mismo conjunto de ids comparten el request.
+        """
         if not game_ids:
-            return {}
-        params = {
-            "id": ",".join(game_ids),
-            "country": settings.itad_country,
-        }
-        data = await self._get("/games/prices/v3", params)
-        return data or {}
+            return []
+        ids = tuple(sorted(set(game_ids)))
+        return await _prices_flight.do(ids, lambda: self._get_current_prices(list(ids)))
+
+    async def _get_current_prices(self, game_ids: list[str]) -> list:
+        try:
+            r = await self._request(
+                "POST", "/games/prices/v3",
+                params={"country": settings.itad_country},
+                json=list(game_ids),
+                headers={"Authorization": f"Bearer {self._key}"},
+            )
+        except Exception as e:
+            logger.error(f"Error en /games/prices/v3: {e}")
+            return []
+        if r.status_code != 200:
+            logger.warning(f"ITAD prices/v3 HTTP {r.status_code}: {r.text[:200]}")
+            return []
+        data = r.json()
+        return data if isinstance(data, list) else data.get("list", [])
 
 
-    async def get_game_info(self, game_id: str) -> Optional[tuple[str, str, str]]:
-        """Obtiene título y slug de un juego por su ITAD game_id."""
+    async def get_game_info(self, game_id: str) -> Optional[tuple[str, Optional[str], str]]:
+        """Obtiene título y slug (None si ITAD no lo trae) de un juego por su ITAD game_id."""
+        return await _info_flight.do(game_id, lambda: self._get_game_info(game_id))
+
+    async def _get_game_info(self, game_id: str) -> Optional[tuple[str, Optional[str], str]]:
         data = await self._get("/games/info/v2", {"id": game_id})
         if not data:
             return None
@@ -211,8 +267,10 @@ class ITADClient:
             item = data[0] if isinstance(data, list) and data else data if isinstance(data, dict) else None
             if not item:
                 return None
-            title = item.get("title") or item.get("name") or game_id
-            slug  = item.get("slug") or game_id
+            title = item.get("title") or item.get("name")
+            if not title:
+                return None
+            slug  = item.get("slug")
             return (game_id, slug, title)
         except Exception as e:
             logger.debug(f"Error en get_game_info({game_id}): {e}")
@@ -225,9 +283,23 @@ _client_instance: Optional[ITADClient] = None
 
 
 def get_client() -> ITADClient:
-    """Retorna la instancia singleton del cliente."""
+    """
+    Instancia compartida del cliente. El pool se abre en start_client() (lifespan);
+    fuera de la app se abre solo en el primer request.
+    """
     global _client_instance
     if _client_instance is None:
         _client_instance = ITADClient(settings.itad_api_key)
     return _client_instance
 
+
+async def start_client() -> ITADClient:
+    return await get_client().open()
+
+
+async def close_client():
+    global _client_instance
+    if _client_instance is not None:
+        await _client_instance.aclose()
+        _client_instance = None
+
@@ -0,0 +1,205 @@
+"""
+src/api/history_parser.py
+=========================
+Parser en streaming de /games/history/v2 → columnas tipadas para
+queries.upsert_price_columns, sin PriceRecord ni list[dict] intermedios.
+
+El cuerpo se recorre entrada por entrada con JSONDecoder.raw_decode: en memoria
+solo conviven el texto de la respuesta, la entrada actual y los buffers de
+columnas (array.array para números). Acepta las estructuras que devuelve ITAD:
+  A) Lista directa: [{timestamp, deal:{price,regular,cut,shop}}, ...]
+  B) Dict con lista: {"list": [{...}], "urls": {...}}
+  C) Lista de objetos planos: [{timestamp, price:{amount}, cut, shop:{id,name}}]
+"""
+
+import json
+import logging
+import re
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_WS = re.compile(r"[ \t\n\r]*")
+# Claves preferidas en la estructura B, en orden; si no están vale cualquier lista no vacía
+_LIST_KEYS = ("list", "prices", "history")
+
+
+def _skip_ws(s: str, pos: int) -> int:
+    return _WS.match(s, pos).end()
+
+
+def _iter_array(s: str, pos: int) -> Iterator:
+    """Elementos del array JSON que abre en s[pos] ('['), decodificados de a uno."""
+    pos = _skip_ws(s, pos + 1)
+    if s[pos:pos + 1] == "]":
+        return
+    while True:
+        value, pos = _decoder.raw_decode(s, pos)
+        yield value
+        pos = _skip_ws(s, pos)
+        ch = s[pos:pos + 1]
+        if ch == "]":
+            return
+        if ch != ",":
+            raise ValueError(f"JSON inválido en la posición {pos}")
+        pos = _skip_ws(s, pos + 1)
+
+
+def _skip_value(s: str, pos: int) -> tuple[int, bool]:
+    """
+    Salta el valor en s[pos]. Retorna (fin, es_array_no_vacío). Los arrays se
+    recorren elemento a elemento, sin acumularlos.
+    """
+    if s[pos] != "[":
+        _, end = _decoder.raw_decode(s, pos)
+        return end, False
+    pos = _skip_ws(s, pos + 1)
+    if s[pos:pos + 1] == "]":
+        return pos + 1, False
+    while True:
+        _, pos = _decoder.raw_decode(s, pos)
+        pos = _skip_ws(s, pos)
+        ch = s[pos:pos + 1]
+        if ch == "]":
+            return pos + 1, True
+        if ch != ",":
+            raise ValueError(f"JSON inválido en la posición {pos}")
+        pos = _skip_ws(s, pos + 1)
+
+
+def _find_entries(s: str) -> Optional[int]:
+    """Posición del '[' con las entradas del historial, o None si no hay."""
+    pos = _skip_ws(s, 0)
+    ch = s[pos:pos + 1]
+    if ch == "[":
+        return pos
+    if ch != "{":
+        return None
+    # Estructura B: se recorren las claves de primer nivel sin decodificar sus valores
+    candidates: dict[str, int] = {}
+    first_list: Optional[int] = None
+    pos = _skip_ws(s, pos + 1)
+    while s[pos:pos + 1] not in ("}", ""):
+        key, pos = _decoder.raw_decode(s, pos)
+        pos = _skip_ws(s, pos)
+        if s[pos:pos + 1] != ":":
+            raise ValueError(f"JSON inválido en la posición {pos}")
+        pos = _skip_ws(s, pos + 1)
+        start = pos
+        if key == _LIST_KEYS[0] and s[pos] == "[" and s[_skip_ws(s, pos + 1)] != "]":
+            return pos
+        pos, non_empty = _skip_value(s, pos)
+        if non_empty:
+            candidates.setdefault(key, start)
+            if first_list is None:
+                first_list = start
+        pos = _skip_ws(s, pos)
+        if s[pos:pos + 1] == ",":
+            pos = _skip_ws(s, pos + 1)
+    for key in _LIST_KEYS:
+        if key in candidates:
+            return candidates[key]
+    return first_list
+
+
+def _amount(obj) -> float:
+    return float(obj.get("amount", 0) or 0) if isinstance(obj, dict) else float(obj or 0)
+
+
+def _timestamps(values: list[str]) -> pa.Array:
+    """ISO 8601 → timestamp[us] UTC naive. Vectorizado; si algún valor no trae zona, uno a uno."""
+    try:
+        ts = pa.array(values, pa.string()).cast(pa.timestamp("us", tz="UTC"))
+        return ts.cast(pa.timestamp("us"))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        parsed = []
+        for v in values:
+            try:
+                d = datetime.fromisoformat(v.replace("Z", "+00:00"))
+            except ValueError:
+                parsed.append(None)     # upsert_price_columns descarta la fila
+                continue
+            if d.tzinfo is not None:
+                d = d.astimezone(timezone.utc).replace(tzinfo=None)
+            parsed.append(d)
+        return pa.array(parsed, pa.timestamp("us"))
+
+
+def _empty_buffers() -> dict:
+    return {"timestamp": [], "price": array("d"), "regular": array("d"), "cut": array("i"),
+            "shop_id": [], "shop_name": []}
+
+
+def _collect(s: str) -> tuple[int, dict]:
+    """Recorre las entradas y llena los buffers por columna. Retorna (entradas_vistas, buffers)."""
+    buf = _empty_buffers()
+    start = _find_entries(s)
+    total = 0
+    for entry in (_iter_array(s, start) if start is not None else ()):
+        total += 1
+        if not isinstance(entry, dict):
+            continue
+        ts = entry.get("timestamp")
+        if not ts or not isinstance(ts, str):
+            continue
+        deal = entry.get("deal") or {}
+        try:
+            price = _amount(deal.get("price") or entry.get("price") or {})
+            regular = _amount(deal.get("regular") or entry.get("regular") or {})
+            cut = int((deal.get("cut") if "cut" in deal else entry.get("cut", 0)) or 0)
+            shop = deal.get("shop") or entry.get("shop") or {}
+            shop_id = shop.get("id") if isinstance(shop, dict) else None
+            shop_id = int(shop_id) if shop_id is not None else None
+            shop_name = shop.get("name", "Steam") if isinstance(shop, dict) else "Steam"
+            buf["cut"].append(cut)       # array("i") valida el rango antes de agregar el resto
+        except (TypeError, ValueError, OverflowError) as e:
+            logger.debug(f"Entry skip: {e} — {str(entry)[:100]}")
+            continue
+        buf["timestamp"].append(ts)
+        buf["price"].append(price)
+        buf["regular"].append(regular)
+        buf["shop_id"].append(shop_id)
+        buf["shop_name"].append(shop_name)
+    return total, buf
+
+
+def parse_history_columns(raw: Union[bytes, str], game_id: str, appid: Optional[int] = None,
+                          quiet_empty: bool = False) -> tuple[int, dict[str, pa.Array]]:
+    """
+    Normaliza el cuerpo crudo de /games/history/v2 a columnas de price_history.
+    Retorna (filas, {columna: pyarrow.Array}); las entradas sin timestamp o con
+    valores no numéricos se descartan.
+    ValueError si el cuerpo no es JSON válido: para el sync es un fallo, no
+    "sin registros nuevos".
+    """
+    s = raw.decode("utf-8", errors="replace") if isinstance(raw, (bytes, bytearray)) else raw
+    try:
+        total, buf = _collect(s) if s else (0, _empty_buffers())
+    except ValueError as e:
+        logger.error(f"JSON inválido en history/v2 para {game_id}: {e}")
+        raise
+
+    n = len(buf["timestamp"])
+    if not total:
+        (logger.debug if quiet_empty else logger.warning)(
+            f"history/v2 sin entradas para {game_id}. Estructura: {s[:300]}")
+    else:
+        logger.info(f"Parseados {n}/{total} registros para {game_id}")
+
+    return n, {
+        "game_id":     pa.array([game_id] * n, pa.string()),
+        "appid":       pa.array([appid] * n, pa.int32()),
+        "timestamp":   _timestamps(buf["timestamp"]),
+        # np.frombuffer: vista sin copia sobre los buffers de array.array
+        "price_usd":   pa.array(np.frombuffer(buf["price"], np.float64)),
+        "regular_usd": pa.array(np.frombuffer(buf["regular"], np.float64)),
+        "cut_pct":     pa.array(np.frombuffer(buf["cut"], np.int32)),
+        "shop_id":     pa.array(buf["shop_id"], pa.int32()),
+        "shop_name":   pa.array(buf["shop_name"], pa.string()),
+    }
@@ -0,0 +1,59 @@
+"""
+src/api/http.py
+===============
+Construcción de los httpx.AsyncClient de larga vida (ITAD y Steam).
+
+Los clientes se crean una vez en el lifespan de FastAPI y se cierran al apagar:
+cada request reutiliza conexiones keep-alive en vez de abrir TCP + TLS nuevos.
+HTTP/2 es opcional (HTTP2=true) y solo se activa si el paquete `h2` está
+instalado (`pip install httpx[http2]`); si no, se sigue con HTTP/1.1.
+"""
+
+import logging
+from typing import Optional
+
+import httpx
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_warned_h2 = False
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _use_http2() -> bool:
+    global _warned_h2
+    if not get_settings().http2:
+        return False
+    if http2_available():
+        return True
+    if not _warned_h2:
+        logger.warning("HTTP2=true pero el paquete h2 no está instalado — se usa HTTP/1.1")
+        _warned_h2 = True
+    return False
+
+
+def new_async_client(timeout: float = 30.0, connect: float = 10.0,
+                     max_connections: int = 20, max_keepalive: int = 10,
+                     headers: Optional[dict] = None, **kwargs) -> httpx.AsyncClient:
+    """httpx.AsyncClient con pool keep-alive y HTTP/2 si está disponible."""
+    s = get_settings()
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=connect),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=s.http_keepalive_expiry,
+        ),
+        http2=_use_http2(),
+        headers=headers,
+        **kwargs,
+    )
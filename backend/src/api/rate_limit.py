@@ -0,0 +1,187 @@
+"""
+src/api/rate_limit.py
+=====================
+Limitador adaptativo compartido por todo el tráfico hacia ITAD.
+
+Búsqueda, precios actuales, wishlist y sync masivo usaban clientes independientes
+y sumados podían pasarse del límite de ITAD. Aquí hay una sola instancia por proceso:
+  - token bucket: ritmo sostenido ITAD_RATE_PER_SEC con ráfagas de ITAD_BURST
+  - AIMD sobre la concurrencia: +1/limit por respuesta OK, ×0.5 ante 429/503
+  - Retry-After: bloquea a todos los llamadores hasta la hora indicada
+  - métricas: req/s logrados, eventos de throttling, límite actual
+
+Uso:
+    r = await itad_request(client, "GET", url, params=...)
+
+Las esperas usan asyncio.sleep (sin primitivas atadas a un event loop), así la
+instancia global sirve también a scripts que llaman asyncio.run() varias veces.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Estados HTTP que indican sobrecarga → decremento multiplicativo
+_THROTTLE_STATUS = (429, 503)
+# Granularidad de espera cuando no hay concurrencia disponible
+_POLL_S = 0.02
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float, burst: int, max_concurrency: int,
+                 min_concurrency: int = 1, window_s: float = 60.0):
+        self.rate = max(0.01, rate)
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._window_s = window_s
+        self._recent: deque[float] = deque()   # timestamps de requests despachados
+        self._stats = {
+            "requests":        0,
+            "throttled":       0,   # respuestas 429/503
+            "retry_after_s":   0.0, # tiempo total bloqueado por Retry-After
+            "decreases":       0,
+            "wait_time_s":     0.0, # tiempo total esperando turno
+        }
+
+    # ── Turnos ────────────────────────────────────────────────────────────────
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _delay(self, now: float) -> float:
+        """Segundos a esperar antes de poder despachar (0 = ya)."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return _POLL_S
+        self._refill(now)
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0.0
+
+    async def acquire(self):
+        start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            delay = self._delay(now)
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self._tokens -= 1
+        self.in_flight += 1
+        self._stats["requests"] += 1
+        self._stats["wait_time_s"] += now - start
+        self._recent.append(now)
+
+    def release(self, status: Optional[int] = None, retry_after: Optional[float] = None):
+        """Devuelve el turno y ajusta el límite según la respuesta (None = error de red)."""
+        self.in_flight = max(0, self.in_flight - 1)
+        if status in _THROTTLE_STATUS:
+            self._stats["throttled"] += 1
+            self._decrease()
+            if retry_after:
+                until = time.monotonic() + retry_after
+                if until > self._blocked_until:
+                    self._stats["retry_after_s"] += until - max(self._blocked_until, time.monotonic())
+                    self._blocked_until = until
+                logger.warning(f"ITAD throttling: Retry-After {retry_after:.1f}s "
+                               f"(concurrencia → {int(self.limit)})")
+        elif status is not None and status < 500:
+            # Incremento aditivo: ~+1 por cada `limit` respuestas correctas
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self):
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        self._stats["decreases"] += 1
+
+    # ── Métricas ──────────────────────────────────────────────────────────────
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        while self._recent and self._recent[0] < now - self._window_s:
+            self._recent.popleft()
+        self._refill(now)
+        return {
+            "rate_limit_per_s":  self.rate,
+            "burst":             self.burst,
+            "concurrency_limit": int(self.limit),
+            "in_flight":         self.in_flight,
+            "tokens":            round(self._tokens, 2),
+            "achieved_rps":      round(len(self._recent) / self._window_s, 3),
+            "blocked_for_s":     round(max(0.0, self._blocked_until - now), 2),
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After en segundos o como fecha HTTP → segundos desde ahora."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+async def itad_request(client: httpx.AsyncClient, method: str, url: str,
+                       retries: int = 3, **kwargs) -> httpx.Response:
+    """
+    Request a ITAD pasando por el limitador global. Ante 429/503 reintenta
+    respetando Retry-After (o backoff exponencial si no viene). Los errores de
+    red se propagan; la última respuesta se retorna tal cual.
+    """
+    limiter = get_limiter()
+    for attempt in range(retries):
+        await limiter.acquire()
+        try:
+            r = await client.request(method, url, **kwargs)
+        except Exception:
+            limiter.release(None)
+            raise
+        retry_after = parse_retry_after(r.headers.get("Retry-After"))
+        if r.status_code in _THROTTLE_STATUS and retry_after is None:
+            retry_after = float(2 ** attempt)
+        limiter.release(r.status_code, retry_after)
+        if r.status_code not in _THROTTLE_STATUS or attempt == retries - 1:
+            return r
+    return r
+
+
+# ── Instancia global ──────────────────────────────────────────────────────────
+
+_limiter: Optional[AdaptiveRateLimiter] = None
+
+
+def get_limiter() -> AdaptiveRateLimiter:
+    global _limiter
+    if _limiter is None:
+        from config import get_settings
+        s = get_settings()
+        _limiter = AdaptiveRateLimiter(
+            rate=s.itad_rate_per_sec,
+            burst=s.itad_burst,
+            max_concurrency=s.itad_max_concurrency,
+        )
+    return _limiter
+
+
+def limiter_metrics() -> dict:
+    return get_limiter().metrics()
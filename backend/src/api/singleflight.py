@@ -0,0 +1,104 @@
+"""
+src/api/singleflight.py
+=======================
+Coalescencia de llamadas idénticas concurrentes ("single-flight").
+
+Si varios usuarios abren el mismo juego o buscan lo mismo a la vez, la primera
+llamada con una clave ejecuta el trabajo real y las demás esperan el mismo
+resultado en lugar de repetir el request a ITAD (o la escritura en DuckDB).
+El resultado se guarda además en un cache de TTL corto (SINGLEFLIGHT_TTL_SECONDS)
+para las llamadas que llegan justo después.
+
+Uso:
+    _search = SingleFlight("itad.search", ttl=settings.singleflight_ttl_seconds)
+    results = await _search.do(("zelda", 20), lambda: fetch())
+
+  - el trabajo corre en su propia task: si el primer llamador se cancela
+    (cliente desconectado) los demás igual reciben el resultado
+  - las excepciones se propagan a todos los que esperaban y no se cachean
+  - cache_if decide qué resultados se cachean (p.ej. no guardar fallos vacíos)
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_groups: dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    def __init__(self, name: str, ttl: float = 0.0, max_entries: int = 1024,
+                 cache_if: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_if = cache_if
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._cache: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._stats = {
+            "calls":      0,
+            "executed":   0,   # trabajos reales lanzados
+            "coalesced":  0,   # llamadas que esperaron un trabajo ya en curso
+            "cache_hits": 0,   # llamadas servidas desde el cache TTL
+            "errors":     0,
+        }
+        _groups[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self._stats["calls"] += 1
+        hit = self._cached(key)
+        if hit is not None:
+            self._stats["cache_hits"] += 1
+            return hit[1]
+
+        task = self._inflight.get(key)
+        # Una task de otro event loop (scripts con varios asyncio.run) no sirve
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["executed"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._settle(k, t))
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Hashable):
+        self._cache.pop(key, None)
+
+    def _cached(self, key: Hashable) -> Optional[tuple[float, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _settle(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._stats["errors"] += 1
+            return
+        result = task.result()
+        if self.ttl > 0 and (self.cache_if is None or self.cache_if(result)):
+            self._cache[key] = (time.monotonic() + self.ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def metrics(self) -> dict:
+        return {**self._stats, "in_flight": len(self._inflight),
+                "cached": len(self._cache), "ttl_s": self.ttl}
+
+
+def singleflight_metrics() -> dict:
+    """Contadores de cada grupo (calls / executed / coalesced / cache_hits ...)."""
+    return {name: g.metrics() for name, g in _groups.items()}
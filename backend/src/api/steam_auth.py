@@ -12,7 +12,6 @@ import re
 import time
 from typing import Optional
 
-import httpx
 from config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -37,11 +36,12 @@ def get_openid_redirect_url(return_url: str) -> str:
 async def verify_openid_response(params: dict) -> Optional[str]:
     check_params = {k: v for k, v in params.items()}
     check_params["openid.mode"] = "check_authentication"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post(STEAM_OPENID, data=check_params)
-        if "is_valid:true" not in r.text:
-            logger.warning("Steam OpenID verification failed")
-            return None
+    from src.api.steam_client import get_steam_client
+    client = await get_steam_client().http()
+    r = await client.post(STEAM_OPENID, data=check_params, timeout=15)
+    if "is_valid:true" not in r.text:
+        logger.warning("Steam OpenID verification failed")
+        return None
     claimed_id = params.get("openid.claimed_id", "")
     match = STEAM_ID_RE.search(claimed_id)
     return match.group(1) if match else None
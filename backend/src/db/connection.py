@@ -1,17 +1,28 @@
 """
 src/db/connection.py
 ====================
-Conexión DuckDB thread-safe.
+Pool acotado de cursores DuckDB sobre una única instancia de base de datos.
 
 DuckDB no permite compartir una conexión entre threads (FastAPI usa un thread pool
-para endpoints síncronos). Solución: una conexión por thread via threading.local(),
-todas apuntando al mismo archivo .duckdb.
+para endpoints síncronos). Antes se abría una conexión por thread, cada una con su
+propio memory_limit/threads y nunca se cerraba. Ahora:
+  - una sola conexión raíz (duckdb.connect) con la config de memoria/threads
+  - N cursores (con.cursor()) reutilizables, prestados con db_cursor()
+  - los cursores ociosos más de DUCKDB_POOL_IDLE_SECONDS se cierran
+  - métricas de préstamos y esperas en pool_metrics()
+
+Uso:
+    with db_cursor() as con:
+        queries.get_game(con, game_id)
 """
 
 import logging
 import os
 import threading
-from typing import Optional
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
 import duckdb
 
@@ -20,58 +31,200 @@ from config import get_settings
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Una conexión por thread
-_local = threading.local()
-_db_path: Optional[str] = None
+
+class CursorPool:
+    """
+    Pool thread-safe de cursores de una misma conexión DuckDB.
+    Crea cursores bajo demanda hasta `size`; si no hay libres, espera hasta `timeout`.
+    """
+
+    def __init__(self, root: duckdb.DuckDBPyConnection, size: int,
+                 idle_timeout: float, timeout: float):
+        self._root = root
+        self._size = max(1, size)
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._idle: deque[tuple[duckdb.DuckDBPyConnection, float]] = deque()
+        self._cond = threading.Condition()
+        self._waiters: deque[object] = deque()
+        self._open = 0          # cursores vivos (prestados + ociosos)
+        self._closed = False
+        self._stats = {
+            "checkouts":     0,
+            "waits":         0,
+            "wait_time_ms":  0.0,
+            "max_wait_ms":   0.0,
+            "timeouts":      0,
+            "created":       0,
+            "reaped":        0,
+        }
+
+    def acquire(self, timeout: Optional[float] = None) -> duckdb.DuckDBPyConnection:
+        timeout = self._timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+        ticket = object()
+        with self._cond:
+            # Cola FIFO: un thread que devuelve y vuelve a pedir no se adelanta a los que esperan
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Pool DuckDB cerrado")
+                    if self._waiters[0] is ticket:
+                        self._reap_locked()
+                        if self._idle:
+                            cur, _ = self._idle.pop()  # LIFO: los del fondo envejecen y se cierran
+                            break
+                        if self._open < self._size:
+                            cur = self._root.cursor()
+                            self._open += 1
+                            self._stats["created"] += 1
+                            break
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise TimeoutError(
+                            f"Sin cursores DuckDB libres tras {timeout:.1f}s (pool={self._size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+            self._stats["checkouts"] += 1
+            if waited:
+                wait_ms = (time.monotonic() - start) * 1000
+                self._stats["waits"] += 1
+                self._stats["wait_time_ms"] += wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        return cur
+
+    def release(self, cur: duckdb.DuckDBPyConnection, discard: bool = False):
+        with self._cond:
+            if self._closed or discard:
+                self._open -= 1
+                _close_quietly(cur)
+            else:
+                self._idle.append((cur, time.monotonic()))
+            self._cond.notify_all()
+
+    def _reap_locked(self):
+        """Cierra los cursores ociosos más antiguos que idle_timeout (llamar con el lock)."""
+        cutoff = time.monotonic() - self._idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            cur, _ = self._idle.popleft()
+            _close_quietly(cur)
+            self._open -= 1
+            self._stats["reaped"] += 1
+
+    def reap_idle(self):
+        with self._cond:
+            self._reap_locked()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            in_use = self._open - len(self._idle)
+            return {
+                "size":    self._size,
+                "open":    self._open,
+                "in_use":  in_use,
+                "idle":    len(self._idle),
+                **{k: round(v, 2) if isinstance(v, float) else v
+                   for k, v in self._stats.items()},
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                cur, _ = self._idle.popleft()
+                _close_quietly(cur)
+                self._open -= 1
+            self._cond.notify_all()
+
+
+def _close_quietly(con):
+    try:
+        con.close()
+    except Exception:
+        pass
+
+
+# ── Instancia global ──────────────────────────────────────────────────────────
+
+_root: Optional[duckdb.DuckDBPyConnection] = None
+_pool: Optional[CursorPool] = None
 
 
 def init_db():
     """
-    Configura la ruta de la DB al arrancar la app.
-    No abre conexión aquí — get_db() lo hace por thread.
+    Abre la instancia DuckDB compartida y crea el pool al arrancar la app.
+    Los cursores se crean bajo demanda en db_cursor().
     """
-    global _db_path
+    global _root, _pool
 
     db_path = settings.duckdb_path
     os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
-    _db_path = db_path
-
-    logger.info(f"DuckDB configurado en: {db_path}")
-
 
-def _open_connection() -> duckdb.DuckDBPyConnection:
-    """Abre una nueva conexión al archivo DuckDB."""
-    con = duckdb.connect(
-        _db_path,
+    _root = duckdb.connect(
+        db_path,
         config={
             "memory_limit": settings.duckdb_memory_limit,
             "threads": settings.duckdb_threads,
         }
     )
-    return con
+    _pool = CursorPool(
+        _root,
+        size=settings.duckdb_pool_size,
+        idle_timeout=settings.duckdb_pool_idle_seconds,
+        timeout=settings.duckdb_pool_timeout,
+    )
+    logger.info(f"DuckDB abierto en: {db_path} (pool de {settings.duckdb_pool_size} cursores)")
 
 
-def get_db() -> duckdb.DuckDBPyConnection:
+@contextmanager
+def db_cursor(timeout: Optional[float] = None) -> Iterator[duckdb.DuckDBPyConnection]:
+    """Presta un cursor del pool durante el bloque `with` y lo devuelve al salir."""
+    if _pool is None:
+        raise RuntimeError("DuckDB no inicializado. Llama a init_db() primero.")
+    cur = _pool.acquire(timeout)
+    discard = False
+    try:
+        yield cur
+    except duckdb.FatalException:
+        discard = True
+        raise
+    finally:
+        _pool.release(cur, discard=discard)
+
+
+def dedicated_cursor() -> duckdb.DuckDBPyConnection:
     """
-    Retorna la conexión DuckDB del thread actual.
-    Si no existe todavía para este thread, la crea.
+    Cursor fuera del pool para un consumidor de larga vida (el writer de
+    src.db.writer). No cuenta contra DUCKDB_POOL_SIZE; lo cierra su dueño.
     """
-    if _db_path is None:
+    if _root is None:
         raise RuntimeError("DuckDB no inicializado. Llama a init_db() primero.")
+    return _root.cursor()
 
-    if not hasattr(_local, "connection") or _local.connection is None:
-        _local.connection = _open_connection()
-        logger.debug(f"Nueva conexión DuckDB para thread {threading.current_thread().name}")
 
-    return _local.connection
+def pool_metrics() -> dict:
+    """Métricas del pool (préstamos, esperas, cursores vivos/ociosos/reciclados)."""
+    if _pool is None:
+        return {}
+    _pool.reap_idle()
+    return _pool.metrics()
 
 
 def close_db():
-    """Cierra la conexión del thread actual (llamado en shutdown)."""
-    if hasattr(_local, "connection") and _local.connection is not None:
-        try:
-            _local.connection.close()
-        except Exception:
-            pass
-        _local.connection = None
-    logger.info("DuckDB desconectado")
\ No newline at end of file
+    """Cierra todos los cursores y la conexión raíz (llamado en shutdown)."""
+    global _root, _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    if _root is not None:
+        _close_quietly(_root)
+        _root = None
+    logger.info("DuckDB desconectado")
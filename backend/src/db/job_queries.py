@@ -0,0 +1,216 @@
+"""
+src/db/job_queries.py — cola persistente de trabajos (jobs / job_items).
+
+Todas las mutaciones pasan por el writer único; como hay un solo escritor,
+reclamar un trabajo (SELECT + UPDATE) no necesita locks adicionales.
+"""
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pyarrow as pa
+
+from src.db.rows import fetch_all, fetch_one
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _now() -> datetime:
+    """Timestamp UTC actual, naive (DuckDB no maneja tzinfo)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _decode(job: Optional[dict]) -> Optional[dict]:
+    if job:
+        for k in ("params", "result"):
+            if job.get(k):
+                job[k] = json.loads(job[k])
+    return job
+
+
+# ── Jobs ──────────────────────────────────────────────────────────────────────
+
+def create_job(con, job_id: str, kind: str, params: dict, max_attempts: int,
+               dedupe_key: Optional[str] = None) -> dict:
+    """
+    Encola un trabajo. Si hay otro activo (queued/running) con el mismo
+    dedupe_key se retorna ese, con deduplicated=True.
+    """
+    if dedupe_key:
+        existing = fetch_one(con.execute("""
+            SELECT * FROM jobs
+            WHERE dedupe_key = ? AND list_contains(?, status)
+            ORDER BY created_at
+            LIMIT 1
+        """, [dedupe_key, list(ACTIVE_STATUSES)]))
+        if existing:
+            return {**_decode(existing), "deduplicated": True}
+    now = _now()
+    con.execute("""
+        INSERT INTO jobs (id, kind, params, dedupe_key, status, max_attempts,
+                          run_after, created_at)
+        VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+    """, [job_id, kind, json.dumps(params or {}), dedupe_key, max_attempts, now, now])
+    return {**get_job(con, job_id), "deduplicated": False}
+
+
+def get_job(con, job_id: str) -> Optional[dict]:
+    return _decode(fetch_one(con.execute("SELECT * FROM jobs WHERE id = ?", [job_id])))
+
+
+def list_jobs(con, limit: int = 50, status: Optional[str] = None,
+              kind: Optional[str] = None) -> list[dict]:
+    rows = fetch_all(con.execute("""
+        SELECT * FROM jobs
+        WHERE (? IS NULL OR status = ?)
+          AND (? IS NULL OR kind = ?)
+        ORDER BY created_at DESC
+        LIMIT ?
+    """, [status, status, kind, kind, limit]))
+    return [_decode(r) for r in rows]
+
+
+def claim_next_job(con, now: Optional[datetime] = None) -> Optional[dict]:
+    """Toma el trabajo en cola más antiguo cuyo backoff ya venció y lo marca running."""
+    now = now or _now()
+    row = con.execute("""
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_after <= ?
+        ORDER BY created_at
+        LIMIT 1
+    """, [now]).fetchone()
+    if not row:
+        return None
+    con.execute("""
+        UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                        started_at = ?, heartbeat_at = ?, error = NULL
+        WHERE id = ?
+    """, [now, now, row[0]])
+    return get_job(con, row[0])
+
+
+def requeue_running_jobs(con) -> int:
+    """
+    Al arrancar ningún trabajo puede estar corriendo: los 'running' quedaron así
+    por una caída y vuelven a la cola (sus ítems completados se conservan).
+    """
+    n = con.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+    if n:
+        # Ítems fallidos del intento interrumpido: no llegaron a pasar por retry_job
+        con.execute("""
+            UPDATE job_items SET status = 'pending'
+            FROM jobs
+            WHERE jobs.id = job_items.job_id AND jobs.status = 'running'
+              AND job_items.status = 'failed' AND job_items.attempts < jobs.max_attempts
+        """)
+        con.execute("UPDATE jobs SET status = 'queued', run_after = ? WHERE status = 'running'",
+                    [_now()])
+    return n
+
+
+def finish_job(con, job_id: str, status: str, result: Optional[dict] = None,
+               error: Optional[str] = None):
+    now = _now()
+    con.execute("""
+        UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = ?
+        WHERE id = ?
+    """, [status, json.dumps(result) if result is not None else None, error, now, now, job_id])
+
+
+def retry_job(con, job_id: str, delay_s: float, error: str, max_item_attempts: int):
+    """
+    Vuelve a encolar tras un fallo, ejecutable en delay_s segundos (backoff).
+    Los ítems fallidos con intentos restantes se reabren.
+    """
+    run_after = _now() + timedelta(seconds=delay_s)
+    con.execute("""
+        UPDATE job_items SET status = 'pending'
+        WHERE job_id = ? AND status = 'failed' AND attempts < ?
+    """, [job_id, max_item_attempts])
+    con.execute("""
+        UPDATE jobs SET status = 'queued', run_after = ?, error = ?, heartbeat_at = ?
+        WHERE id = ?
+    """, [run_after, error, _now(), job_id])
+    _refresh_counts(con, job_id)
+
+
+# ── Ítems (checkpoints) ───────────────────────────────────────────────────────
+
+def add_job_items(con, job_id: str, items: list[tuple[str, Optional[str]]]) -> int:
+    """Registra los ítems del trabajo (item, label) en orden; seq = posición."""
+    if not items:
+        return 0
+    con.register("_job_items_batch", pa.table({
+        "seq":   pa.array(range(len(items)), pa.int32()),
+        "item":  pa.array([str(i) for i, _ in items], pa.string()),
+        "label": pa.array([label for _, label in items], pa.string()),
+    }))
+    try:
+        con.execute("""
+            INSERT INTO job_items (job_id, seq, item, label, status, updated_at)
+            SELECT ?, seq, item, label, 'pending', ? FROM _job_items_batch
+            ON CONFLICT (job_id, seq) DO NOTHING
+        """, [job_id, _now()])
+    finally:
+        con.unregister("_job_items_batch")
+    con.execute("UPDATE jobs SET total_items = ? WHERE id = ?", [len(items), job_id])
+    return len(items)
+
+
+def count_job_items(con, job_id: str) -> int:
+    return con.execute("SELECT COUNT(*) FROM job_items WHERE job_id = ?", [job_id]).fetchone()[0]
+
+
+def get_pending_items(con, job_id: str) -> list[dict]:
+    return fetch_all(con.execute("""
+        SELECT seq, item, label, attempts FROM job_items
+        WHERE job_id = ? AND status = 'pending'
+        ORDER BY seq
+    """, [job_id]))
+
+
+def get_job_items(con, job_id: str, status: Optional[str] = None,
+                  limit: int = 100, offset: int = 0) -> list[dict]:
+    return fetch_all(con.execute("""
+        SELECT seq, item, label, status, attempts, error, updated_at FROM job_items
+        WHERE job_id = ? AND (? IS NULL OR status = ?)
+        ORDER BY seq
+        LIMIT ? OFFSET ?
+    """, [job_id, status, status, limit, offset]))
+
+
+def mark_job_items(con, job_id: str, seqs: list[int], status: str,
+                   error: Optional[str] = None) -> int:
+    """Checkpoint: marca ítems como done/skipped/failed y actualiza el progreso del trabajo."""
+    if not seqs:
+        return 0
+    con.execute("""
+        UPDATE job_items
+        SET status = ?, error = ?, updated_at = ?,
+            attempts = attempts + CASE WHEN ? = 'failed' THEN 1 ELSE 0 END
+        WHERE job_id = ? AND list_contains(?, seq)
+    """, [status, error, _now(), status, job_id, list(seqs)])
+    _refresh_counts(con, job_id)
+    return len(seqs)
+
+
+def _refresh_counts(con, job_id: str):
+    con.execute("""
+        UPDATE jobs SET
+            done_items   = (SELECT COUNT(*) FROM job_items
+                            WHERE job_id = $1 AND status IN ('done', 'skipped')),
+            failed_items = (SELECT COUNT(*) FROM job_items
+                            WHERE job_id = $1 AND status = 'failed'),
+            heartbeat_at = $2
+        WHERE id = $1
+    """, [job_id, _now()])
+
+
+def get_job_item_counts(con, job_id: str) -> dict:
+    rows = con.execute("""
+        SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status
+    """, [job_id]).fetchall()
+    return dict(rows)
@@ -0,0 +1,91 @@
+"""
+src/db/maintenance.py
+=====================
+Tareas de mantenimiento de DuckDB ejecutables desde la línea de comandos.
+
+Uso:
+  python -m src.db.maintenance --db ./data/steamsense.duckdb rebuild
+  python -m src.db.maintenance --db ./data/steamsense.duckdb rebuild --table latest_prices
+  python -m src.db.maintenance --db ./data/steamsense.duckdb tier --hot-days 365
+
+Con la API detenida (DuckDB no permite dos procesos escribiendo el mismo archivo).
+"""
+
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("maintenance")
+
+# tabla derivada → función de queries que la reconstruye desde price_history
+REBUILDERS = {
+    "game_price_summary":   "rebuild_price_summary",
+    "latest_prices":        "rebuild_latest_prices",
+    "price_history_daily":  "rebuild_daily_rollup",
+    "price_history_weekly": "rebuild_weekly_rollup",
+    "game_feature_state":   "rebuild_feature_state",
+}
+
+
+def rebuild(db_path: str, tables: list[str]):
+    import duckdb
+
+    from src.db import queries
+    from src.db.models import create_all_tables
+
+    logger.info(f"Conectando a DuckDB: {db_path}")
+    con = duckdb.connect(db_path)
+    try:
+        create_all_tables(con)
+        for table in tables:
+            n = getattr(queries, REBUILDERS[table])(con)
+            logger.info(f"{table} reconstruida: {n} filas")
+    finally:
+        con.close()
+
+
+def tier(db_path: str, cold_path: str, hot_days: int):
+    import duckdb
+
+    from src.db import queries
+    from src.db.models import create_all_tables
+
+    logger.info(f"Conectando a DuckDB: {db_path}")
+    con = duckdb.connect(db_path)
+    try:
+        create_all_tables(con, cold_path)
+        con.execute("BEGIN TRANSACTION")
+        try:
+            result = queries.tier_price_history(con, cold_path, hot_days)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("CHECKPOINT")   # libera los bloques de las filas borradas
+        logger.info(f"Tier frío: {result}")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="./data/steamsense.duckdb")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_rebuild = sub.add_parser("rebuild", help="Reconstruye tablas derivadas desde price_history")
+    p_rebuild.add_argument("--table", choices=sorted(REBUILDERS), action="append",
+                           help="Tabla a reconstruir (repetible). Por defecto todas.")
+
+    p_tier = sub.add_parser("tier", help="Mueve historial viejo a Parquet particionado (tier frío)")
+    p_tier.add_argument("--cold", default=None, help="Directorio del tier frío (COLD_STORAGE_PATH)")
+    p_tier.add_argument("--hot-days", type=int, default=None,
+                        help="Días que permanecen en DuckDB (HOT_HISTORY_DAYS)")
+
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        rebuild(args.db, args.table or list(REBUILDERS))
+    elif args.command == "tier":
+        from config import get_settings
+        settings = get_settings()
+        tier(args.db, args.cold or settings.cold_storage_path,
+             args.hot_days if args.hot_days is not None else settings.hot_history_days)
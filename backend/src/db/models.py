@@ -5,14 +5,22 @@ Definición y creación de tablas en DuckDB.
 Ejecutar create_all_tables() una vez al iniciar la app.
 """
 
+import glob
 import logging
+import os
+from typing import Optional
 
 import duckdb
 
 logger = logging.getLogger(__name__)
 
 
-def create_all_tables(con: duckdb.DuckDBPyConnection):
+# Columnas de price_history que se conservan en el tier frío (sin 'id' de la SEQUENCE).
+HISTORY_COLUMNS = ("game_id, appid, timestamp, price_usd, regular_usd, "
+                   "cut_pct, shop_id, shop_name")
+
+
+def create_all_tables(con: duckdb.DuckDBPyConnection, cold_path: Optional[str] = None):
     """Crea todas las tablas si no existen. Idempotente."""
 
     # ── games ─────────────────────────────────────────────────────────────────
@@ -62,7 +70,178 @@ def create_all_tables(con: duckdb.DuckDBPyConnection):
         )
     """)
 
-    logger.info("Tablas DuckDB verificadas/creadas: games, price_history, predictions_cache")
+    # ── game_price_summary ────────────────────────────────────────────────────
+    # Agregados por juego mantenidos de forma incremental por upsert_price_records.
+    # Evita el GROUP BY sobre todo price_history en cada request de listado.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS game_price_summary (
+            game_id       VARCHAR PRIMARY KEY,
+            min_price     DECIMAL(10, 2),
+            max_price     DECIMAL(10, 2),
+            avg_price     DOUBLE,
+            total_records BIGINT DEFAULT 0,
+            max_cut       INTEGER DEFAULT 0,
+            first_seen    TIMESTAMP,
+            last_seen     TIMESTAMP,
+            last_price    DECIMAL(10, 2),
+            updated_at    TIMESTAMP
+        )
+    """)
+
+    # ── latest_prices ─────────────────────────────────────────────────────────
+    # Último precio conocido por (juego, tienda), actualizado durante la ingesta.
+    # shop_id sigue la misma normalización que price_history (NULL → -1).
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            game_id     VARCHAR NOT NULL,
+            shop_id     INTEGER NOT NULL,
+            shop_name   VARCHAR,
+            timestamp   TIMESTAMP NOT NULL,
+            price_usd   DECIMAL(10, 2) NOT NULL,
+            regular_usd DECIMAL(10, 2),
+            cut_pct     INTEGER DEFAULT 0,
+            updated_at  TIMESTAMP,
+            PRIMARY KEY (game_id, shop_id)
+        )
+    """)
+    # La PK (game_id, shop_id) ya cubre los lookups por game_id: el índice
+    # aparte que creaban versiones anteriores solo duplicaba trabajo en cada upsert
+    con.execute("DROP INDEX IF EXISTS idx_latest_prices_game")
+
+    # Precio actual por juego = la tienda con el registro más reciente.
+    # La ventana corre sobre latest_prices (juegos × tiendas), no sobre el historial.
+    con.execute("""
+        CREATE OR REPLACE VIEW current_prices AS
+        SELECT game_id, shop_id, shop_name, timestamp, price_usd, regular_usd, cut_pct
+        FROM latest_prices
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC, shop_id) = 1
+    """)
+
+    # ── price_history_daily / price_history_weekly ───────────────────────────
+    # Rollups por (juego, día|semana) para gráficos de historiales largos.
+    # Se mantienen de forma incremental en la ingesta; bucket = date_trunc(unidad, timestamp).
+    for table in ("price_history_daily", "price_history_weekly"):
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                game_id     VARCHAR NOT NULL,
+                bucket      TIMESTAMP NOT NULL,
+                min_price   DECIMAL(10, 2) NOT NULL,
+                max_price   DECIMAL(10, 2) NOT NULL,
+                sum_price   DOUBLE NOT NULL,
+                samples     BIGINT NOT NULL,
+                regular_usd DECIMAL(10, 2),
+                max_cut     INTEGER DEFAULT 0,
+                PRIMARY KEY (game_id, bucket)
+            )
+        """)
+
+    # ── history_tiering ───────────────────────────────────────────────────────
+    # Registro de cada movimiento de historial al tier frío (Parquet).
+    # MAX(cutoff) es la marca bajo la cual price_history ya fue volcada a disco.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS history_tiering (
+            run_id   VARCHAR PRIMARY KEY,
+            cutoff   TIMESTAMP NOT NULL,
+            moved    BIGINT,
+            ran_at   TIMESTAMP
+        )
+    """)
+
+    # ── itad_lookup_cache ─────────────────────────────────────────────────────
+    # Resultado de resolver Steam appid → ITAD game_id, incluidos los "no existe"
+    # (found=false, game_id NULL). Vence según ITAD_LOOKUP_TTL_DAYS / _MISS_TTL_HOURS.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS itad_lookup_cache (
+            appid      INTEGER PRIMARY KEY,
+            game_id    VARCHAR,
+            slug       VARCHAR,
+            title      VARCHAR,
+            found      BOOLEAN NOT NULL,
+            checked_at TIMESTAMP NOT NULL
+        )
+    """)
+
+    # ── refresh_state ─────────────────────────────────────────────────────────
+    # Última vez que se pidió el historial de cada juego a ITAD (haya traído
+    # registros nuevos o no). El scheduler de refresco mide la antigüedad con
+    # GREATEST(last_seen, last_refresh_at).
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_state (
+            game_id         VARCHAR PRIMARY KEY,
+            last_refresh_at TIMESTAMP NOT NULL,
+            refreshes       INTEGER DEFAULT 0
+        )
+    """)
+
+    # ── game_feature_state ────────────────────────────────────────────────────
+    # Agregados acumulados por juego para features.build_features_from_state:
+    # la ingesta los actualiza solo con las filas nuevas, así que las features
+    # se leen en tiempo constante sin importar cuántos años de historial haya.
+    # trend_*: sumas de la regresión precio ~ x, con x = 1..trend_n el índice de
+    # los registros con precio > 0 en orden de timestamp.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS game_feature_state (
+            game_id        VARCHAR PRIMARY KEY,
+            total_records  BIGINT NOT NULL,
+            sum_price      DECIMAL(38, 2) NOT NULL,
+            min_price      DECIMAL(10, 2),
+            max_price      DECIMAL(10, 2),
+            min_price_ts   TIMESTAMP,
+            max_cut        INTEGER DEFAULT 0,
+            sale_records   BIGINT DEFAULT 0,
+            last_sale_ts   TIMESTAMP,
+            q4_cut_sum     BIGINT DEFAULT 0,
+            q4_sales       BIGINT DEFAULT 0,
+            summer_cut_sum BIGINT DEFAULT 0,
+            summer_sales   BIGINT DEFAULT 0,
+            last_ts        TIMESTAMP,
+            last_price     DOUBLE,
+            last_cut       INTEGER,
+            trend_n        BIGINT DEFAULT 0,
+            trend_sum_y    DECIMAL(38, 2) DEFAULT 0,
+            trend_sum_xy   DECIMAL(38, 2) DEFAULT 0,
+            updated_at     TIMESTAMP
+        )
+    """)
+
+    if cold_path is None:
+        from config import get_settings
+        cold_path = get_settings().cold_storage_path
+    create_history_views(con, cold_path)
+
+    logger.info("Tablas DuckDB verificadas/creadas: games, price_history, "
+                "predictions_cache, game_price_summary, latest_prices, "
+                "price_history_daily, price_history_weekly, history_tiering, "
+                "itad_lookup_cache, refresh_state, game_feature_state")
+
+
+def cold_parquet_glob(cold_path: str) -> str:
+    return os.path.join(os.path.abspath(cold_path), "**", "*.parquet")
+
+
+def create_history_views(con: duckdb.DuckDBPyConnection, cold_path: str):
+    """
+    (Re)crea las vistas sobre el historial completo:
+      - price_history_cold: archivos Parquet particionados year=/month= en cold_path
+      - price_history_all:  price_history (caliente) UNION ALL price_history_cold
+    read_parquet falla si el glob no encuentra archivos, así que sin tier frío
+    price_history_cold es una vista vacía con el mismo schema.
+    """
+    pattern = cold_parquet_glob(cold_path)
+    if glob.glob(pattern, recursive=True):
+        source = pattern.replace("'", "''")
+        cold_sql = (f"SELECT {HISTORY_COLUMNS} "
+                    f"FROM read_parquet('{source}', hive_partitioning = true)")
+    else:
+        cold_sql = f"SELECT {HISTORY_COLUMNS} FROM price_history WHERE false"
+
+    con.execute(f"CREATE OR REPLACE VIEW price_history_cold AS {cold_sql}")
+    con.execute(f"""
+        CREATE OR REPLACE VIEW price_history_all AS
+        SELECT {HISTORY_COLUMNS} FROM price_history
+        UNION ALL
+        SELECT {HISTORY_COLUMNS} FROM price_history_cold
+    """)
 
 
 def create_user_tables(con):
@@ -104,3 +283,49 @@ def create_user_tables(con):
     """)
 
     logger.info("Tablas de usuario verificadas/creadas")
+
+
+def create_job_tables(con):
+    """Cola persistente de trabajos en segundo plano (src.services.job_service)."""
+
+    # Un trabajo: sync de top juegos, predicciones en lote, sync de librería...
+    # dedupe_key evita encolar dos veces lo mismo mientras siga pendiente.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id           VARCHAR PRIMARY KEY,
+            kind         VARCHAR NOT NULL,
+            params       VARCHAR,                -- JSON
+            dedupe_key   VARCHAR,
+            status       VARCHAR NOT NULL,       -- queued | running | done | failed
+            attempts     INTEGER DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            total_items  INTEGER,
+            done_items   INTEGER DEFAULT 0,
+            failed_items INTEGER DEFAULT 0,
+            result       VARCHAR,                -- JSON
+            error        VARCHAR,
+            run_after    TIMESTAMP NOT NULL,     -- backoff entre reintentos
+            created_at   TIMESTAMP NOT NULL,
+            started_at   TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at  TIMESTAMP
+        )
+    """)
+
+    # Checkpoint por ítem (appid, game_id, steam_id): al reanudar solo se
+    # procesan los que siguen pendientes.
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS job_items (
+            job_id     VARCHAR NOT NULL,
+            seq        INTEGER NOT NULL,
+            item       VARCHAR NOT NULL,
+            label      VARCHAR,
+            status     VARCHAR NOT NULL,         -- pending | done | skipped | failed
+            attempts   INTEGER DEFAULT 0,
+            error      VARCHAR,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (job_id, seq)
+        )
+    """)
+
+    logger.info("Tablas de trabajos verificadas/creadas")
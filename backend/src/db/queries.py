@@ -9,12 +9,16 @@ NOTAS DuckDB importantes:
   - INSERT OR IGNORE no existe → ON CONFLICT ... DO NOTHING
   - shop_id NULL en UNIQUE → normalizar a -1
 """
+import glob
 import json
 import logging
 import math
+import os
 import datetime as dt
 from typing import Optional
 
+from src.db.rows import clean_value, fetch_all, fetch_one
+
 logger = logging.getLogger(__name__)
 
 
@@ -35,116 +39,788 @@ def _f(v) -> Optional[float]:
         return None
 
 
-def _san(d: dict) -> dict:
-    out = {}
-    for k, v in d.items():
-        if isinstance(v, float) and (math.isnan(v) or math.isinf(v)):
-            out[k] = None
-        else:
-            out[k] = v
-    return out
-
-
 # ── games ─────────────────────────────────────────────────────────────────────
 
-def upsert_game(con, game_id: str, slug: str, title: str, appid: Optional[int] = None):
+def upsert_game(con, game_id: str, slug: Optional[str], title: str, appid: Optional[int] = None):
+    """slug None (el lookup bulk de ITAD no lo trae) conserva el slug guardado."""
     con.execute("""
         INSERT INTO games (id, slug, title, appid)
         VALUES (?, ?, ?, ?)
         ON CONFLICT (id) DO NOTHING
     """, [game_id, slug, title, appid])
-    con.execute("UPDATE games SET slug=?, title=? WHERE id=?", [slug, title, game_id])
+    con.execute("UPDATE games SET slug=COALESCE(?, slug), title=? WHERE id=?", [slug, title, game_id])
     if appid:
         con.execute("UPDATE games SET appid=? WHERE id=? AND appid IS NULL", [appid, game_id])
 
 
 def get_game(con, game_id: str) -> Optional[dict]:
-    row = con.execute("SELECT * FROM games WHERE id=?", [game_id]).fetchdf()
-    return _san(row.iloc[0].to_dict()) if not row.empty else None
+    return fetch_one(con.execute("SELECT * FROM games WHERE id=?", [game_id]))
+
+
+def get_games_by_ids(con, game_ids: list[str]) -> dict[str, dict]:
+    """{game_id: fila de games} para un lote de ids en una sola consulta."""
+    if not game_ids:
+        return {}
+    rows = fetch_all(con.execute("""
+        SELECT id, slug, title, appid FROM games WHERE list_contains(?, id)
+    """, [list(game_ids)]))
+    return {r["id"]: r for r in rows}
+
+
+def list_game_titles(con) -> list[dict]:
+    """id, slug, title y appid de todos los juegos (entrada del índice de búsqueda local)."""
+    return fetch_all(con.execute("SELECT id, slug, title, appid FROM games"))
 
 
 def get_game_by_appid(con, appid: int) -> Optional[dict]:
-    row = con.execute("SELECT * FROM games WHERE appid=?", [appid]).fetchdf()
-    return _san(row.iloc[0].to_dict()) if not row.empty else None
+    return fetch_one(con.execute("SELECT * FROM games WHERE appid=?", [appid]))
 
 
-def list_games(con, limit: int = 50, offset: int = 0) -> list[dict]:
-    rows = con.execute("""
+# Órdenes de GET /games: nombre → (expresión de la clave, dirección).
+# Las claves salen de game_price_summary / predictions_cache (sin agregar
+# price_history); los NULL se normalizan para que el keyset sea total.
+# Desempate siempre por g.id ASC.
+GAME_SORTS = {
+    "records":      ("COALESCE(s.total_records, 0)",                  "DESC"),
+    "title":        ("lower(g.title)",                                "ASC"),
+    "last_seen":    ("COALESCE(s.last_seen, TIMESTAMP '1970-01-01')", "DESC"),
+    "max_discount": ("COALESCE(s.max_cut, 0)",                        "DESC"),
+    "score":        ("COALESCE(p.score, -1)::DOUBLE",                 "DESC"),
+}
+
+
+def list_games_page(con, limit: int = 50, sort: str = "records",
+                    after: Optional[tuple] = None, offset: int = 0) -> tuple[list[dict], Optional[tuple]]:
+    """
+    Página de juegos ordenada por `sort`.
+    after=(clave, game_id) de la última fila vista → paginación keyset: la página N
+    cuesta lo mismo que la primera (Top-N con filtro, sin descartar filas con OFFSET).
+    Sin after se usa offset (compatibilidad).
+    Retorna (filas, after de la página siguiente o None si no hay más).
+    """
+    key, direction = GAME_SORTS[sort]
+    cmp = "<" if direction == "DESC" else ">"
+    where, params = "", []
+    if after is not None:
+        where = f"WHERE {key} {cmp} ? OR ({key} = ? AND g.id > ?)"
+        params = [after[0], after[0], after[1]]
+        offset = 0
+
+    rows = fetch_all(con.execute(f"""
         SELECT g.id, g.title, g.appid, g.slug,
-               COUNT(ph.id)                   AS total_records,
-               COALESCE(MIN(ph.price_usd), 0) AS min_price,
-               COALESCE(MAX(ph.cut_pct), 0)   AS max_discount
+               COALESCE(s.total_records, 0) AS total_records,
+               COALESCE(s.min_price, 0)     AS min_price,
+               COALESCE(s.max_cut, 0)       AS max_discount,
+               s.last_seen,
+               p.score,
+               p.signal,
+               {key}                        AS _sort_key
         FROM games g
-        LEFT JOIN price_history ph ON g.id = ph.game_id
-        GROUP BY g.id, g.title, g.appid, g.slug
-        ORDER BY total_records DESC
+        LEFT JOIN game_price_summary s ON s.game_id = g.id
+        LEFT JOIN predictions_cache p  ON p.game_id = g.id
+        {where}
+        ORDER BY {key} {direction}, g.id ASC
         LIMIT ? OFFSET ?
-    """, [limit, offset]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, params + [limit + 1, offset]))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = (rows[-1]["_sort_key"], rows[-1]["id"]) if has_more else None
+    for r in rows:
+        del r["_sort_key"]
+    return rows, next_after
+
+
+def list_games(con, limit: int = 50, offset: int = 0) -> list[dict]:
+    return list_games_page(con, limit=limit, offset=offset)[0]
 
 
 # ── price_history ─────────────────────────────────────────────────────────────
 
-def upsert_price_records(con, records: list[dict]) -> int:
+# Columnas de price_history que acepta la ingesta (sin 'id', que viene de la SEQUENCE).
+PRICE_COLUMNS = ("game_id", "appid", "timestamp", "price_usd",
+                 "regular_usd", "cut_pct", "shop_id", "shop_name")
+
+# DECIMAL(10, 2) → valores >= 1e8 no caben y abortarían el INSERT completo.
+_MAX_PRICE = 1e8
+
+# Columnas de las filas recién insertadas que alimentan las tablas derivadas.
+_NEW_ROW_COLS = "game_id, timestamp, price_usd, regular_usd, cut_pct, shop_id, shop_name"
+
+
+def _price_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("game_id",     pa.string()),
+        ("appid",       pa.int32()),
+        ("timestamp",   pa.timestamp("us")),
+        ("price_usd",   pa.float64()),
+        ("regular_usd", pa.float64()),
+        ("cut_pct",     pa.int32()),
+        ("shop_id",     pa.int32()),
+        ("shop_name",   pa.string()),
+    ])
+
+
+def _to_price_table(data):
     """
-    Inserta registros de precio sin duplicados.
-    - Nunca pasar 'id' (autoincrement SEQUENCE)
-    - shop_id NULL → -1 (DuckDB trata cada NULL como distinto en UNIQUE)
+    Normaliza la entrada columnar a una pyarrow.Table con el schema de price_history.
+    Acepta pyarrow.Table / RecordBatch o un dict {columna: np.ndarray | list}.
+    Columnas ausentes → NULL. Timestamps con zona horaria → UTC naive.
     """
-    if not records:
-        return 0
+    import pyarrow as pa
+
+    if isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    elif not isinstance(data, pa.Table):
+        data = pa.table({k: v for k, v in data.items() if k in PRICE_COLUMNS})
 
-    import pandas as pd
+    n = data.num_rows
+    columns = []
+    for field in _price_schema():
+        if field.name not in data.column_names:
+            columns.append(pa.nulls(n, field.type))
+            continue
+        col = data.column(field.name)
+        if pa.types.is_timestamp(col.type) and col.type.tz is not None:
+            col = col.cast(pa.timestamp(col.type.unit))    # conserva el instante UTC
+        columns.append(col.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=_price_schema())
 
-    df = pd.DataFrame(records)
-    df = df.drop(columns=["id"], errors="ignore")
 
-    if "shop_id" in df.columns:
-        df["shop_id"] = df["shop_id"].fillna(-1).astype(int)
+def _valid_price_rows(table):
+    """Máscara vectorizada de filas insertables: claves presentes y precio finito en rango."""
+    import pyarrow.compute as pc
 
-    valid_cols = ["game_id", "appid", "timestamp", "price_usd",
-                  "regular_usd", "cut_pct", "shop_id", "shop_name"]
-    df = df[[c for c in valid_cols if c in df.columns]]
-    df = df.dropna(subset=["game_id", "timestamp"])
+    price = table.column("price_usd")
+    mask = pc.and_kleene(pc.is_valid(table.column("game_id")),
+                         pc.is_valid(table.column("timestamp")))
+    mask = pc.and_kleene(mask, pc.is_finite(price))
+    mask = pc.and_kleene(mask, pc.greater_equal(price, 0))
+    mask = pc.and_kleene(mask, pc.less(price, _MAX_PRICE))
+    return pc.fill_null(mask, False)
 
-    if df.empty:
+
+def upsert_price_columns(con, data) -> int:
+    """
+    Ingesta columnar de registros de precio (Arrow o arrays NumPy), sin duplicados.
+    - Filas sin game_id/timestamp o con precio no finito se descartan en bloque
+    - Duplicados dentro del batch se colapsan (DuckDB aborta el INSERT si no)
+    - shop_id NULL → -1 (DuckDB trata cada NULL como distinto en UNIQUE)
+    - Retorna las filas insertadas según RETURNING — sin COUNT(*) sobre price_history
+    """
+    import pyarrow.compute as pc
+
+    table = _to_price_table(data)
+    total = table.num_rows
+    if total == 0:
+        return 0
+
+    table = table.filter(_valid_price_rows(table))
+    rejected = total - table.num_rows
+    if rejected:
+        logger.warning(f"upsert_price_columns: {rejected}/{total} filas inválidas descartadas")
+    if table.num_rows == 0:
         return 0
 
-    before = con.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+    # Filas anteriores a la marca del tier frío: la UNIQUE de price_history ya no
+    # las ve, así que se descartan las que existen en Parquet (anti-join acotado
+    # a ese rango; solo se paga cuando el batch trae historial viejo).
+    cold_filter, params = "", []
+    watermark = _cold_watermark(con)
+    if watermark is not None and pc.min(table.column("timestamp")).as_py() < watermark:
+        cold_filter = """
+            WHERE b.timestamp >= ?
+               OR NOT EXISTS (
+                   SELECT 1 FROM price_history_cold c
+                   WHERE c.game_id = b.game_id AND c.timestamp = b.timestamp
+                     AND c.shop_id = b.shop_id AND c.timestamp < ?
+               )
+        """
+        params = [watermark, watermark]
 
     try:
-        con.register("_price_batch", df)
-        cols = ", ".join(df.columns)
-        con.execute(f"""
-            INSERT INTO price_history ({cols})
-            SELECT {cols} FROM _price_batch
+        con.register("_price_batch", table)
+        new_rows = con.execute(f"""
+            INSERT INTO price_history ({", ".join(PRICE_COLUMNS)})
+            SELECT DISTINCT ON (game_id, timestamp, shop_id) *
+            FROM (
+                SELECT game_id, appid, timestamp, price_usd,
+                       CASE WHEN isfinite(regular_usd) AND regular_usd < {_MAX_PRICE}
+                            THEN regular_usd END  AS regular_usd,
+                       COALESCE(cut_pct, 0)       AS cut_pct,
+                       COALESCE(shop_id, -1)      AS shop_id,
+                       COALESCE(shop_name, 'Steam') AS shop_name
+                FROM _price_batch
+            ) b
+            {cold_filter}
             ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING
-        """)
-    except Exception as e:
-        logger.error(f"upsert_price_records batch error: {e}")
-        cols = ", ".join(df.columns)
-        placeholders = ", ".join(["?"] * len(df.columns))
-        for _, row in df.iterrows():
-            try:
-                con.execute(
-                    f"INSERT INTO price_history ({cols}) VALUES ({placeholders})"
-                    " ON CONFLICT (game_id, timestamp, shop_id) DO NOTHING",
-                    list(row)
-                )
-            except Exception:
-                pass
+            RETURNING {_NEW_ROW_COLS}
+        """, params).arrow()
     finally:
         try:
             con.unregister("_price_batch")
         except Exception:
             pass
 
-    after = con.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
-    inserted = after - before
-    logger.debug(f"upsert_price_records: {inserted}/{len(df)} insertados")
+    inserted = new_rows.num_rows
+    if inserted:
+        _apply_new_price_rows(con, new_rows)
+
+    logger.debug(f"upsert_price_columns: {inserted}/{table.num_rows} insertados")
     return inserted
 
 
+def _as_timestamp(v) -> Optional[dt.datetime]:
+    """datetime / ISO 8601 / np.datetime64 → datetime UTC naive. ValueError si no se puede."""
+    if v is None:
+        return None
+    if isinstance(v, str):
+        v = dt.datetime.fromisoformat(v.replace("Z", "+00:00"))
+    elif not isinstance(v, dt.datetime):
+        if hasattr(v, "astype"):                       # np.datetime64
+            v = v.astype("datetime64[us]").item()
+        if not isinstance(v, dt.datetime):
+            raise ValueError(f"timestamp inválido: {v!r}")
+    if v.tzinfo is not None:
+        v = v.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return v
+
+
+def _as_int32(v) -> Optional[int]:
+    """Entero de 32 bits; None/NaN → None (NULL). ValueError si no es numérico o no cabe."""
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return None
+    i = int(v)
+    if not -2**31 <= i < 2**31:
+        raise ValueError(f"fuera de rango: {v!r}")
+    return i
+
+
+def _as_float(v) -> Optional[float]:
+    return None if v is None else float(v)
+
+
+def _as_str(v) -> Optional[str]:
+    return None if v is None else str(v)
+
+
+# Conversión por columna de upsert_price_records (mismo orden que PRICE_COLUMNS)
+_RECORD_COERCE = (_as_str, _as_int32, _as_timestamp, _as_float,
+                  _as_float, _as_int32, _as_int32, _as_str)
+
+
+def upsert_price_records(con, records: list[dict]) -> int:
+    """
+    Variante fila a fila de upsert_price_columns (lista de dicts / PriceRecord.model_dump()).
+    Cada valor se convierte al tipo de su columna (timestamps datetime o ISO 8601,
+    números como texto); la fila que no se puede convertir se descarta sola en
+    lugar de hacer fallar el batch completo al armar la tabla Arrow. El resto
+    se delega en la ruta columnar.
+    """
+    if not records:
+        return 0
+    import pyarrow as pa
+
+    rows = []
+    for r in records:
+        try:
+            rows.append([fn(r.get(c)) for c, fn in zip(PRICE_COLUMNS, _RECORD_COERCE)])
+        except (TypeError, ValueError, OverflowError, AttributeError):
+            continue
+    if len(rows) < len(records):
+        logger.warning(f"upsert_price_records: {len(records) - len(rows)}/{len(records)} "
+                       f"filas con valores no convertibles descartadas")
+    if not rows:
+        return 0
+
+    columns = {c: list(values) for c, values in zip(PRICE_COLUMNS, zip(*rows))}
+    return upsert_price_columns(con, pa.Table.from_pydict(columns, schema=_price_schema()))
+
+
+def _apply_new_price_rows(con, new_rows) -> None:
+    """
+    Propaga las filas recién insertadas a las tablas derivadas.
+    Solo toca los juegos presentes en el batch — nunca recorre price_history.
+    """
+    try:
+        con.register("_price_new", new_rows)
+        _merge_price_summary(con)
+        _merge_latest_prices(con)
+        _merge_price_rollups(con)
+        _merge_feature_state(con)
+    finally:
+        try:
+            con.unregister("_price_new")
+        except Exception:
+            pass
+
+
+def _merge_price_summary(con) -> None:
+    """Combina los agregados del batch (_price_new) con game_price_summary."""
+    con.execute("""
+        INSERT INTO game_price_summary (
+            game_id, min_price, max_price, avg_price, total_records, max_cut,
+            first_seen, last_seen, last_price, updated_at
+        )
+        SELECT game_id,
+               MIN(price_usd), MAX(price_usd), AVG(price_usd), COUNT(*),
+               COALESCE(MAX(cut_pct), 0), MIN(timestamp), MAX(timestamp),
+               arg_max(price_usd, timestamp), ?
+        FROM _price_new
+        GROUP BY game_id
+        ON CONFLICT (game_id) DO UPDATE SET
+            min_price     = LEAST(game_price_summary.min_price, excluded.min_price),
+            max_price     = GREATEST(game_price_summary.max_price, excluded.max_price),
+            avg_price     = (game_price_summary.avg_price * game_price_summary.total_records
+                             + excluded.avg_price * excluded.total_records)
+                            / (game_price_summary.total_records + excluded.total_records),
+            total_records = game_price_summary.total_records + excluded.total_records,
+            max_cut       = GREATEST(game_price_summary.max_cut, excluded.max_cut),
+            first_seen    = LEAST(game_price_summary.first_seen, excluded.first_seen),
+            last_price    = CASE WHEN excluded.last_seen >= game_price_summary.last_seen
+                                 THEN excluded.last_price
+                                 ELSE game_price_summary.last_price END,
+            last_seen     = GREATEST(game_price_summary.last_seen, excluded.last_seen),
+            updated_at    = excluded.updated_at
+    """, [_now()])
+
+
+def _merge_latest_prices(con) -> None:
+    """Actualiza latest_prices con el registro más nuevo del batch por (juego, tienda)."""
+    con.execute("""
+        INSERT INTO latest_prices (
+            game_id, shop_id, shop_name, timestamp, price_usd, regular_usd, cut_pct, updated_at
+        )
+        SELECT game_id, shop_id,
+               arg_max(shop_name, timestamp), MAX(timestamp),
+               arg_max(price_usd, timestamp), arg_max(regular_usd, timestamp),
+               arg_max(cut_pct, timestamp), ?
+        FROM _price_new
+        GROUP BY game_id, shop_id
+        ON CONFLICT (game_id, shop_id) DO UPDATE SET
+            shop_name   = excluded.shop_name,
+            timestamp   = excluded.timestamp,
+            price_usd   = excluded.price_usd,
+            regular_usd = excluded.regular_usd,
+            cut_pct     = excluded.cut_pct,
+            updated_at  = excluded.updated_at
+        WHERE excluded.timestamp >= latest_prices.timestamp
+    """, [_now()])
+
+
+# Agregados de game_feature_state sobre `{source}` (historial o batch nuevo).
+# x = índice 1..n de los registros con precio > 0 del juego en `source`.
+_FEATURE_STATE_COLS = """game_id, total_records, sum_price, min_price, max_price, min_price_ts,
+    max_cut, sale_records, last_sale_ts, q4_cut_sum, q4_sales, summer_cut_sum, summer_sales,
+    last_ts, last_price, last_cut, trend_n, trend_sum_y, trend_sum_xy, updated_at"""
+_FEATURE_STATE_SELECT = """
+    SELECT game_id,
+           COUNT(*), SUM(price_usd), MIN(price_usd), MAX(price_usd),
+           arg_min(timestamp, {{'p': price_usd, 't': -epoch_us(timestamp)}}),
+           COALESCE(MAX(cut_pct), 0),
+           COUNT(*) FILTER (WHERE cut_pct > 0),
+           MAX(timestamp) FILTER (WHERE cut_pct > 0),
+           COALESCE(SUM(cut_pct) FILTER (WHERE MONTH(timestamp) IN (10,11,12) AND cut_pct > 0), 0),
+           COUNT(*) FILTER (WHERE MONTH(timestamp) IN (10,11,12) AND cut_pct > 0),
+           COALESCE(SUM(cut_pct) FILTER (WHERE MONTH(timestamp) IN (6,7,8) AND cut_pct > 0), 0),
+           COUNT(*) FILTER (WHERE MONTH(timestamp) IN (6,7,8) AND cut_pct > 0),
+           MAX(timestamp),
+           MAX(price_usd::DOUBLE) FILTER (WHERE is_last),
+           MAX(cut_pct) FILTER (WHERE is_last),
+           COUNT(x),
+           COALESCE(SUM(price_usd) FILTER (WHERE x IS NOT NULL), 0),
+           COALESCE(SUM(x * price_usd), 0),
+           ?
+    FROM (
+        SELECT game_id, timestamp, price_usd, cut_pct,
+               CASE WHEN price_usd > 0 THEN ROW_NUMBER() OVER (
+                   PARTITION BY game_id, price_usd > 0 ORDER BY timestamp, shop_id) END AS x,
+               ROW_NUMBER() OVER (
+                   PARTITION BY game_id ORDER BY timestamp DESC, shop_id DESC) = 1 AS is_last
+        FROM {source}
+        {where}
+    )
+    GROUP BY game_id
+"""
+
+
+def _merge_feature_state(con) -> None:
+    """
+    Suma el batch (_price_new) a game_feature_state.
+    Si todas las filas nuevas de un juego son posteriores a su último registro
+    (el caso de un sync incremental) se combinan los agregados del batch con
+    los guardados: el índice x de la tendencia continúa desde trend_n. Si llega
+    historial más viejo (backfill) el índice de los registros cambia, y ese
+    juego se recalcula desde price_history_all.
+    """
+    stale = [r[0] for r in con.execute("""
+        SELECT b.game_id
+        FROM _price_new b
+        JOIN game_feature_state s USING (game_id)
+        GROUP BY b.game_id, s.last_ts
+        HAVING MIN(b.timestamp) <= s.last_ts
+    """).fetchall()]
+    if stale:
+        _recompute_feature_state(con, stale)
+
+    now = _now()
+    con.execute(f"""
+        INSERT INTO game_feature_state ({_FEATURE_STATE_COLS})
+        {_FEATURE_STATE_SELECT.format(source="_price_new",
+                                      where="WHERE NOT list_contains(?, game_id)")}
+        ON CONFLICT (game_id) DO UPDATE SET
+            min_price_ts   = CASE
+                WHEN excluded.min_price < game_feature_state.min_price THEN excluded.min_price_ts
+                WHEN excluded.min_price > game_feature_state.min_price THEN game_feature_state.min_price_ts
+                ELSE GREATEST(game_feature_state.min_price_ts, excluded.min_price_ts) END,
+            min_price      = LEAST(game_feature_state.min_price, excluded.min_price),
+            max_price      = GREATEST(game_feature_state.max_price, excluded.max_price),
+            max_cut        = GREATEST(game_feature_state.max_cut, excluded.max_cut),
+            sale_records   = game_feature_state.sale_records + excluded.sale_records,
+            last_sale_ts   = GREATEST(game_feature_state.last_sale_ts, excluded.last_sale_ts),
+            q4_cut_sum     = game_feature_state.q4_cut_sum + excluded.q4_cut_sum,
+            q4_sales       = game_feature_state.q4_sales + excluded.q4_sales,
+            summer_cut_sum = game_feature_state.summer_cut_sum + excluded.summer_cut_sum,
+            summer_sales   = game_feature_state.summer_sales + excluded.summer_sales,
+            last_ts        = excluded.last_ts,
+            last_price     = excluded.last_price,
+            last_cut       = excluded.last_cut,
+            -- x del batch empieza en 1: desplazarlo trend_n posiciones suma trend_n·Σy
+            trend_sum_xy   = game_feature_state.trend_sum_xy + excluded.trend_sum_xy
+                             + game_feature_state.trend_n * excluded.trend_sum_y,
+            trend_sum_y    = game_feature_state.trend_sum_y + excluded.trend_sum_y,
+            trend_n        = game_feature_state.trend_n + excluded.trend_n,
+            sum_price      = game_feature_state.sum_price + excluded.sum_price,
+            total_records  = game_feature_state.total_records + excluded.total_records,
+            updated_at     = excluded.updated_at
+    """, [now, stale])
+
+
+def _recompute_feature_state(con, game_ids: Optional[list[str]] = None) -> None:
+    """Recalcula game_feature_state desde el historial completo (todos o solo `game_ids`)."""
+    where, params = "", [_now()]
+    if game_ids is not None:
+        where = "WHERE list_contains(?, game_id)"
+        params.append(list(game_ids))
+    updates = ",\n".join(f"{c.strip()} = excluded.{c.strip()}"
+                          for c in _FEATURE_STATE_COLS.split(",")[1:])
+    con.execute(f"""
+        INSERT INTO game_feature_state ({_FEATURE_STATE_COLS})
+        {_FEATURE_STATE_SELECT.format(source="price_history_all", where=where)}
+        ON CONFLICT (game_id) DO UPDATE SET {updates}
+    """, params)
+
+
+def get_history_watermarks(con, game_ids: list[str]) -> dict[str, dt.datetime]:
+    """
+    Último timestamp almacenado por juego (máximo entre sus tiendas en latest_prices).
+    Juegos sin historial no aparecen en el resultado.
+    """
+    if not game_ids:
+        return {}
+    rows = con.execute("""
+        SELECT game_id, MAX(timestamp)
+        FROM latest_prices
+        WHERE list_contains(?, game_id)
+        GROUP BY game_id
+    """, [list(game_ids)]).fetchall()
+    return dict(rows)
+
+
+# ── Cache appid → ITAD ────────────────────────────────────────────────────────
+
+def get_cached_lookups(con, appids: list[int], found_ttl_days: float,
+                       missing_ttl_hours: float) -> dict[int, Optional[tuple[str, str, str]]]:
+    """
+    Entradas vigentes de itad_lookup_cache: appid → (game_id, slug, title),
+    o None si ITAD respondió que no lo conoce. Appids sin entrada o vencidos
+    no aparecen en el resultado.
+    """
+    if not appids:
+        return {}
+    now = _now()
+    rows = con.execute("""
+        SELECT appid, game_id, slug, title, found
+        FROM itad_lookup_cache
+        WHERE list_contains(?, appid)
+          AND checked_at > CASE WHEN found THEN ? ELSE ? END
+    """, [list(appids), now - dt.timedelta(days=found_ttl_days),
+          now - dt.timedelta(hours=missing_ttl_hours)]).fetchall()
+    return {appid: (gid, slug, title) if found else None
+            for appid, gid, slug, title, found in rows}
+
+
+def upsert_lookup_cache(con, entries: dict[int, Optional[tuple[str, str, str]]]) -> int:
+    """Guarda resultados de lookup (None = no encontrado) en una sola sentencia."""
+    import pyarrow as pa
+
+    if not entries:
+        return 0
+    appids = list(entries)
+    found = [entries[a] is not None for a in appids]
+    cols = [[(entries[a] or (None, None, None))[i] for a in appids] for i in range(3)]
+    con.register("_lookup_batch", pa.table({
+        "appid":   pa.array(appids, pa.int32()),
+        "game_id": pa.array(cols[0], pa.string()),
+        "slug":    pa.array(cols[1], pa.string()),
+        "title":   pa.array(cols[2], pa.string()),
+        "found":   pa.array(found, pa.bool_()),
+    }))
+    try:
+        con.execute("""
+            INSERT INTO itad_lookup_cache (appid, game_id, slug, title, found, checked_at)
+            SELECT appid, game_id, slug, title, found, ? FROM _lookup_batch
+            ON CONFLICT (appid) DO UPDATE SET
+                game_id    = excluded.game_id,
+                slug       = excluded.slug,
+                title      = excluded.title,
+                found      = excluded.found,
+                checked_at = excluded.checked_at
+        """, [_now()])
+    finally:
+        con.unregister("_lookup_batch")
+    return len(appids)
+
+
+# ── Refresco programado ───────────────────────────────────────────────────────
+
+def mark_refreshed(con, game_ids: list[str]) -> int:
+    """Registra en refresh_state que se acaba de pedir a ITAD el historial de estos juegos."""
+    if not game_ids:
+        return 0
+    con.execute("""
+        INSERT INTO refresh_state (game_id, last_refresh_at, refreshes)
+        SELECT UNNEST(?), ?, 1
+        ON CONFLICT (game_id) DO UPDATE SET
+            last_refresh_at = excluded.last_refresh_at,
+            refreshes       = refresh_state.refreshes + 1
+    """, [list(dict.fromkeys(game_ids)), _now()])
+    return len(game_ids)
+
+
+def get_refresh_candidates(con, min_age_hours: float, month: int) -> list[dict]:
+    """
+    Juegos cuyos datos tienen al menos min_age_hours, con las señales del scheduler:
+      - data_at:   GREATEST(último registro de precio, último refresco); NULL = nunca
+      - wishlists / owners: filas de user_wishlist / user_games que lo referencian
+      - month_cut: descuento máximo semanal promedio del juego en `month` (rollup)
+    """
+    cutoff = _now() - dt.timedelta(hours=min_age_hours)
+    return fetch_all(con.execute("""
+        WITH wish AS (SELECT appid, COUNT(*) AS n FROM user_wishlist GROUP BY appid),
+             own  AS (SELECT appid, COUNT(*) AS n FROM user_games GROUP BY appid),
+             season AS (
+                 SELECT game_id, AVG(max_cut) AS month_cut
+                 FROM price_history_weekly
+                 WHERE MONTH(bucket) = ? AND max_cut > 0
+                 GROUP BY game_id
+             )
+        SELECT g.id AS game_id, g.slug, g.title, g.appid,
+               GREATEST(s.last_seen, r.last_refresh_at) AS data_at,
+               COALESCE(w.n, 0)          AS wishlists,
+               COALESCE(o.n, 0)          AS owners,
+               COALESCE(se.month_cut, 0) AS month_cut
+        FROM games g
+        LEFT JOIN game_price_summary s ON s.game_id = g.id
+        LEFT JOIN refresh_state r      ON r.game_id = g.id
+        LEFT JOIN wish w               ON w.appid = g.appid
+        LEFT JOIN own o                ON o.appid = g.appid
+        LEFT JOIN season se            ON se.game_id = g.id
+        WHERE GREATEST(s.last_seen, r.last_refresh_at) IS NULL
+           OR GREATEST(s.last_seen, r.last_refresh_at) <= ?
+    """, [month, cutoff]))
+
+
+def get_refresh_spend(con, since: dt.datetime) -> int:
+    """Requests de historial a ITAD encolados por el scheduler desde `since` (trabajos 'refresh')."""
+    row = con.execute("""
+        SELECT COALESCE(SUM(json_array_length(params, '$.game_ids')), 0)
+        FROM jobs
+        WHERE kind = 'refresh' AND created_at >= ?
+    """, [since]).fetchone()
+    return int(row[0])
+
+
+# Rollups de historial: tabla → unidad de date_trunc.
+PRICE_ROLLUPS = {"price_history_daily": "day", "price_history_weekly": "week"}
+
+_ROLLUP_SELECT = """
+    SELECT game_id, date_trunc('{unit}', timestamp) AS bucket,
+           MIN(price_usd), MAX(price_usd), SUM(price_usd)::DOUBLE, COUNT(*),
+           MAX(regular_usd), COALESCE(MAX(cut_pct), 0)
+    FROM {source}
+    GROUP BY game_id, bucket
+"""
+_ROLLUP_COLS = "game_id, bucket, min_price, max_price, sum_price, samples, regular_usd, max_cut"
+
+
+def _merge_price_rollups(con) -> None:
+    """Suma el batch (_price_new) a los buckets diarios y semanales."""
+    for table, unit in PRICE_ROLLUPS.items():
+        con.execute(f"""
+            INSERT INTO {table} ({_ROLLUP_COLS})
+            {_ROLLUP_SELECT.format(unit=unit, source="_price_new")}
+            ON CONFLICT (game_id, bucket) DO UPDATE SET
+                min_price   = LEAST({table}.min_price, excluded.min_price),
+                max_price   = GREATEST({table}.max_price, excluded.max_price),
+                sum_price   = {table}.sum_price + excluded.sum_price,
+                samples     = {table}.samples + excluded.samples,
+                regular_usd = GREATEST({table}.regular_usd, excluded.regular_usd),
+                max_cut     = GREATEST({table}.max_cut, excluded.max_cut)
+        """)
+
+
+def _rebuild_rollup(con, table: str) -> int:
+    con.execute(f"DELETE FROM {table}")
+    con.execute(f"""
+        INSERT INTO {table} ({_ROLLUP_COLS})
+        {_ROLLUP_SELECT.format(unit=PRICE_ROLLUPS[table], source="price_history_all")}
+    """)
+    return int(con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+
+def rebuild_daily_rollup(con) -> int:
+    """Recalcula price_history_daily desde el historial completo. Retorna nº de buckets."""
+    return _rebuild_rollup(con, "price_history_daily")
+
+
+def rebuild_weekly_rollup(con) -> int:
+    """Recalcula price_history_weekly desde el historial completo. Retorna nº de buckets."""
+    return _rebuild_rollup(con, "price_history_weekly")
+
+
+def rebuild_price_summary(con) -> int:
+    """Recalcula game_price_summary desde el historial completo (caliente + frío). Retorna nº de juegos."""
+    con.execute("DELETE FROM game_price_summary")
+    con.execute("""
+        INSERT INTO game_price_summary (
+            game_id, min_price, max_price, avg_price, total_records, max_cut,
+            first_seen, last_seen, last_price, updated_at
+        )
+        SELECT game_id,
+               MIN(price_usd), MAX(price_usd), AVG(price_usd), COUNT(*),
+               COALESCE(MAX(cut_pct), 0), MIN(timestamp), MAX(timestamp),
+               arg_max(price_usd, timestamp), ?
+        FROM price_history_all
+        GROUP BY game_id
+    """, [_now()])
+    return int(con.execute("SELECT COUNT(*) FROM game_price_summary").fetchone()[0])
+
+
+def rebuild_latest_prices(con) -> int:
+    """Recalcula latest_prices desde el historial completo (caliente + frío). Retorna nº de filas."""
+    con.execute("DELETE FROM latest_prices")
+    con.execute("""
+        INSERT INTO latest_prices (
+            game_id, shop_id, shop_name, timestamp, price_usd, regular_usd, cut_pct, updated_at
+        )
+        SELECT game_id, shop_id,
+               arg_max(shop_name, timestamp), MAX(timestamp),
+               arg_max(price_usd, timestamp), arg_max(regular_usd, timestamp),
+               arg_max(cut_pct, timestamp), ?
+        FROM price_history_all
+        GROUP BY game_id, shop_id
+    """, [_now()])
+    return int(con.execute("SELECT COUNT(*) FROM latest_prices").fetchone()[0])
+
+
+def rebuild_feature_state(con) -> int:
+    """Recalcula game_feature_state desde el historial completo (caliente + frío). Retorna nº de juegos."""
+    con.execute("DELETE FROM game_feature_state")
+    _recompute_feature_state(con)
+    return int(con.execute("SELECT COUNT(*) FROM game_feature_state").fetchone()[0])
+
+
+def backfill_derived_tables(con) -> None:
+    """
+    Rellena las tablas derivadas si están vacías pero ya hay historial
+    (DB creada antes de que existieran). Idempotente y barato si ya están pobladas.
+    """
+    has_history = con.execute("SELECT 1 FROM price_history_all LIMIT 1").fetchone()
+    if not has_history:
+        return
+    if not con.execute("SELECT 1 FROM game_price_summary LIMIT 1").fetchone():
+        n = rebuild_price_summary(con)
+        logger.info(f"game_price_summary reconstruida: {n} juegos")
+    if not con.execute("SELECT 1 FROM latest_prices LIMIT 1").fetchone():
+        n = rebuild_latest_prices(con)
+        logger.info(f"latest_prices reconstruida: {n} filas")
+    for table in PRICE_ROLLUPS:
+        if not con.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+            n = _rebuild_rollup(con, table)
+            logger.info(f"{table} reconstruida: {n} buckets")
+    if not con.execute("SELECT 1 FROM game_feature_state LIMIT 1").fetchone():
+        n = rebuild_feature_state(con)
+        logger.info(f"game_feature_state reconstruida: {n} juegos")
+
+
+# ── Tier frío (Parquet) ───────────────────────────────────────────────────────
+
+def _cold_watermark(con) -> Optional[dt.datetime]:
+    """Marca del tier frío: todo lo anterior a ella vive en Parquet. None si nunca se movió nada."""
+    return con.execute("SELECT MAX(cutoff) FROM history_tiering").fetchone()[0]
+
+
+def tier_price_history(con, cold_path: str, hot_days: int) -> dict:
+    """
+    Mueve el historial anterior a `hot_days` días a Parquet particionado
+    (cold_path/year=YYYY/month=M/run<id>_<n>.parquet, ZSTD) y lo borra de price_history.
+    Cada corrida escribe archivos nuevos, así que un mes puede tener varios.
+
+    Pensado para correr dentro de una transacción (writer o CLI): si algo falla
+    después del COPY se borran los archivos de esta corrida y el rollback
+    deja price_history intacta. Mientras la transacción está abierta otros
+    cursores pueden ver esas filas duplicadas en price_history_all.
+    """
+    from src.db.models import HISTORY_COLUMNS, cold_parquet_glob, create_history_views
+
+    cutoff = (_now() - dt.timedelta(days=hot_days)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    result = {"cutoff": cutoff.isoformat(), "moved": 0, "run_id": None}
+
+    moved = int(con.execute(
+        "SELECT COUNT(*) FROM price_history WHERE timestamp < ?", [cutoff]).fetchone()[0])
+    if not moved:
+        return result
+
+    run_id = _now().strftime("%Y%m%dT%H%M%S%f")
+    target = os.path.abspath(cold_path)
+    os.makedirs(target, exist_ok=True)
+    try:
+        con.execute(f"""
+            COPY (
+                SELECT {HISTORY_COLUMNS},
+                       YEAR(timestamp)  AS year,
+                       MONTH(timestamp) AS month
+                FROM price_history
+                WHERE timestamp < ?
+                ORDER BY game_id, timestamp
+            ) TO '{target.replace("'", "''")}' (
+                FORMAT PARQUET, COMPRESSION ZSTD,
+                PARTITION_BY (year, month),
+                FILENAME_PATTERN 'run{run_id}_{{i}}',
+                OVERWRITE_OR_IGNORE true
+            )
+        """, [cutoff])
+        create_history_views(con, cold_path)
+        con.execute("DELETE FROM price_history WHERE timestamp < ?", [cutoff])
+        con.execute("""
+            INSERT INTO history_tiering (run_id, cutoff, moved, ran_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (run_id) DO NOTHING
+        """, [run_id, max(cutoff, _cold_watermark(con) or cutoff), moved, _now()])
+    except Exception:
+        pattern = os.path.join(os.path.dirname(cold_parquet_glob(cold_path)), f"run{run_id}_*.parquet")
+        for path in glob.glob(pattern, recursive=True):
+            os.remove(path)
+        raise
+
+    logger.info(f"Tier frío: {moved} registros anteriores a {cutoff:%Y-%m-%d} → {target}")
+    result.update(moved=moved, run_id=run_id)
+    return result
+
+
 def get_price_history(con, game_id: str,
                       since: Optional[dt.datetime] = None,
                       until: Optional[dt.datetime] = None) -> list[dict]:
@@ -156,51 +832,90 @@ def get_price_history(con, game_id: str,
     if until:
         filters.append("timestamp <= ?")
         params.append(until)
-    rows = con.execute(f"""
+    return fetch_all(con.execute(f"""
         SELECT timestamp, price_usd, regular_usd, cut_pct, shop_name
-        FROM price_history
+        FROM price_history_all
         WHERE {" AND ".join(filters)}
         ORDER BY timestamp ASC
-    """, params).fetchdf()
-    return rows.to_dict(orient="records")
+    """, params))
 
 
-def get_price_stats(con, game_id: str) -> Optional[dict]:
-    row = con.execute("""
-        SELECT
-            COALESCE(MIN(price_usd), 0)                              AS min_price,
-            COALESCE(MAX(price_usd), 0)                              AS max_price,
-            COALESCE(AVG(price_usd), 0)                              AS avg_price,
-            COALESCE(MAX(cut_pct), 0)                                AS max_discount,
-            COALESCE(AVG(CASE WHEN cut_pct > 0 THEN cut_pct END), 0) AS avg_discount_when_on_sale,
-            COUNT(*)                                                  AS total_records,
-            MIN(timestamp)                                            AS first_seen,
-            MAX(timestamp)                                            AS last_seen,
-            COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (10,11,12) AND cut_pct > 0 THEN cut_pct END), 0) AS avg_cut_q4,
-            COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (6,7,8)    AND cut_pct > 0 THEN cut_pct END), 0) AS avg_cut_summer
-        FROM price_history
-        WHERE game_id = ?
-    """, [game_id]).fetchone()
+# Columnas de get_price_series por resolución. En los rollups price_usd es el
+# mínimo del bucket (conserva las ofertas en el gráfico) y cut_pct el máximo.
+_SERIES_SQL = {
+    "raw": """
+        SELECT timestamp, price_usd::DOUBLE AS price_usd, regular_usd::DOUBLE AS regular_usd,
+               cut_pct, shop_name
+        FROM price_history_all
+    """,
+    "daily": """
+        SELECT bucket AS timestamp, min_price::DOUBLE AS price_usd,
+               regular_usd::DOUBLE AS regular_usd, max_cut AS cut_pct,
+               max_price::DOUBLE AS price_max, sum_price / samples AS price_avg, samples
+        FROM price_history_daily
+    """,
+}
+_SERIES_SQL["weekly"] = _SERIES_SQL["daily"].replace("price_history_daily", "price_history_weekly")
+
+
+def get_price_series(con, game_id: str, resolution: str = "raw",
+                     since: Optional[dt.datetime] = None,
+                     until: Optional[dt.datetime] = None) -> dict:
+    """
+    Serie de precios de un juego como arrays NumPy ({columna: array}), ordenada por tiempo.
+    resolution: "raw" (registros) | "daily" | "weekly" (rollups precalculados).
+    Columnas con NULL llegan como numpy.ma.MaskedArray.
+    """
+    base = _SERIES_SQL[resolution]
+    ts_col = "timestamp" if resolution == "raw" else "bucket"
+    filters = ["game_id = ?"]
+    params  = [game_id]
+    if since:
+        filters.append(f"{ts_col} >= ?")
+        params.append(since)
+    if until:
+        filters.append(f"{ts_col} <= ?")
+        params.append(until)
+    return con.execute(f"""
+        {base}
+        WHERE {" AND ".join(filters)}
+        ORDER BY {ts_col} ASC
+    """, params).fetchnumpy()
+
+
+def get_price_summary(con, game_id: str) -> Optional[dict]:
+    return fetch_one(con.execute(
+        "SELECT * FROM game_price_summary WHERE game_id = ?", [game_id]))
+
 
+# Agregados de un juego sobre su historial (CTE/tabla `h`). Compartido por
+# get_price_stats y get_game_bundle. min_price_ts = último timestamp con el
+# precio mínimo: arg_min ordena por (precio ASC, timestamp DESC).
+_STATS_AGG_SQL = """
+    COALESCE(MIN(price_usd), 0)                              AS min_price,
+    COALESCE(MAX(price_usd), 0)                              AS max_price,
+    COALESCE(AVG(price_usd), 0)                              AS avg_price,
+    COALESCE(MAX(cut_pct), 0)                                AS max_discount,
+    COALESCE(AVG(CASE WHEN cut_pct > 0 THEN cut_pct END), 0) AS avg_discount_when_on_sale,
+    COUNT(*)                                                  AS total_records,
+    MIN(timestamp)                                            AS first_seen,
+    MAX(timestamp)                                            AS last_seen,
+    COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (10,11,12) AND cut_pct > 0 THEN cut_pct END), 0) AS avg_cut_q4,
+    COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (6,7,8)    AND cut_pct > 0 THEN cut_pct END), 0) AS avg_cut_summer,
+    arg_min(timestamp, {'p': price_usd, 't': -epoch_us(timestamp)}) AS min_price_ts
+"""
+
+
+def _stats_from_row(row) -> Optional[dict]:
+    """Formatea una fila de _STATS_AGG_SQL (mismo orden de columnas)."""
     if not row or int(row[5] or 0) == 0:
         return None
 
-    # days_since_min_price via separate safe query
     days_since_min = 365
-    try:
-        min_ts_row = con.execute("""
-            SELECT timestamp FROM price_history
-            WHERE game_id = ?
-              AND price_usd = (SELECT MIN(price_usd) FROM price_history WHERE game_id = ?)
-            ORDER BY timestamp DESC LIMIT 1
-        """, [game_id, game_id]).fetchone()
-        if min_ts_row and min_ts_row[0]:
-            ts = min_ts_row[0]
-            if hasattr(ts, "replace"):
-                ts = ts.replace(tzinfo=None)
-                days_since_min = max(0, (dt.datetime.now() - ts).days)
-    except Exception:
-        pass
+    ts = row[10]
+    if ts and hasattr(ts, "replace"):
+        ts = ts.replace(tzinfo=None)
+        days_since_min = max(0, (dt.datetime.now() - ts).days)
 
     return {
         "min_price":                 _f(row[0]),
@@ -217,19 +932,283 @@ def get_price_stats(con, game_id: str) -> Optional[dict]:
     }
 
 
+def get_price_stats(con, game_id: str) -> Optional[dict]:
+    row = con.execute(f"""
+        SELECT {_STATS_AGG_SQL}
+        FROM price_history_all
+        WHERE game_id = ?
+    """, [game_id]).fetchone()
+    return _stats_from_row(row)
+
+
+def get_game_bundle(con, game_id: str, include_history: bool = False) -> Optional[dict]:
+    """
+    Juego + stats + patrón estacional (+ historial opcional) en una sola consulta.
+    El historial del juego se lee una vez (CTE materializada) y de ahí salen
+    todos los agregados, en lugar de get_game + get_price_stats +
+    get_seasonal_patterns + get_price_history por separado.
+
+    Retorna {"game", "stats", "seasonal", "last", "history"} o None si el juego no existe.
+    "last" es el registro más reciente ({timestamp, price_usd, cut_pct}) o {}.
+    "history" es None salvo con include_history=True.
+    """
+    history_sql = """
+        (SELECT list({'timestamp':   timestamp,
+                      'price_usd':   price_usd::DOUBLE,
+                      'regular_usd': regular_usd::DOUBLE,
+                      'cut_pct':     cut_pct,
+                      'shop_name':   shop_name} ORDER BY timestamp)
+         FROM h)
+    """ if include_history else "NULL"
+
+    row = con.execute(f"""
+        WITH h AS MATERIALIZED (
+            SELECT timestamp, price_usd, regular_usd, cut_pct, shop_name
+            FROM price_history_all
+            WHERE game_id = ?
+        ),
+        agg AS (
+            SELECT {_STATS_AGG_SQL},
+                   arg_max({{'timestamp': timestamp,
+                             'price_usd': price_usd::DOUBLE,
+                             'cut_pct':   cut_pct}}, timestamp) AS last_record
+            FROM h
+        ),
+        seasonal AS (
+            SELECT list({{'month':        month,
+                          'avg_discount': avg_discount,
+                          'sample_size':  sample_size,
+                          'min_price':    min_price}} ORDER BY month) AS patterns
+            FROM (
+                SELECT MONTH(timestamp)        AS month,
+                       AVG(cut_pct)            AS avg_discount,
+                       COUNT(*)                AS sample_size,
+                       MIN(price_usd)::DOUBLE  AS min_price
+                FROM h
+                WHERE cut_pct > 0
+                GROUP BY MONTH(timestamp)
+            )
+        )
+        SELECT g.id, g.slug, g.title, g.appid, g.created_at,
+               agg.*,
+               seasonal.patterns,
+               {history_sql} AS history
+        FROM games g, agg, seasonal
+        WHERE g.id = ?
+    """, [game_id, game_id]).fetchone()
+
+    if not row:
+        return None
+
+    game = dict(zip(("id", "slug", "title", "appid", "created_at"), row[:5]))
+    stats_row = row[5:16]
+    last, patterns, history = row[16], row[17], row[18]
+    return {
+        "game":     game,
+        "stats":    _stats_from_row(stats_row),
+        "seasonal": [{k: clean_value(v) for k, v in p.items()} for p in patterns or []],
+        "last":     last or {},
+        "history":  (history or []) if include_history else None,
+    }
+
+
+def get_feature_inputs(con, game_ids: Optional[list[str]] = None) -> dict:
+    """
+    Entradas de features.build_features_batch para todos los juegos con 3+
+    registros (o solo `game_ids`), en una consulta: los agregados de
+    _STATS_AGG_SQL + último registro + ventas + pendiente de la tendencia.
+    Retorna {columna: array NumPy}, una fila por juego, ordenado por game_id.
+
+    trend_slope = regr_slope del precio contra el índice de los registros con
+    precio > 0 (lo mismo que np.polyfit grado 1 en build_features).
+    """
+    where, params = "", []
+    if game_ids is not None:
+        where, params = "WHERE list_contains(?, game_id)", [list(game_ids)]
+    return con.execute(f"""
+        WITH h AS MATERIALIZED (
+            SELECT game_id, timestamp, shop_id, price_usd, cut_pct
+            FROM price_history_all
+            {where}
+        ),
+        agg AS (
+            SELECT game_id, {_STATS_AGG_SQL},
+                   arg_max({{'p': price_usd::DOUBLE, 'c': cut_pct}},
+                           {{'t': timestamp, 's': shop_id}})  AS last_record,
+                   COUNT(*) FILTER (WHERE cut_pct > 0)        AS sale_records,
+                   MAX(timestamp) FILTER (WHERE cut_pct > 0)  AS last_sale_ts
+            FROM h
+            GROUP BY game_id
+            HAVING COUNT(*) >= 3
+        ),
+        trend AS (
+            SELECT game_id, COUNT(*) AS trend_points, regr_slope(p, x) AS trend_slope
+            FROM (
+                SELECT game_id, price_usd::DOUBLE AS p,
+                       ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp, shop_id) AS x
+                FROM h
+                WHERE price_usd > 0
+            )
+            GROUP BY game_id
+        )
+        SELECT agg.game_id,
+               agg.min_price::DOUBLE AS min_price, agg.max_price::DOUBLE AS max_price,
+               agg.avg_price::DOUBLE AS avg_price, agg.max_discount, agg.total_records,
+               agg.avg_cut_q4, agg.avg_cut_summer, agg.min_price_ts,
+               agg.last_record.p AS last_price, agg.last_record.c AS last_cut,
+               agg.sale_records, agg.last_sale_ts,
+               COALESCE(trend.trend_points, 0) AS trend_points, trend.trend_slope
+        FROM agg
+        LEFT JOIN trend USING (game_id)
+        ORDER BY agg.game_id
+    """, params).fetchnumpy()
+
+
+def get_feature_state(con, game_ids: Optional[list[str]] = None, min_records: int = 3) -> dict:
+    """
+    Mismas columnas que get_feature_inputs, leídas de game_feature_state (una
+    fila por juego, sin recorrer el historial). Empates de timestamp: vale la
+    tienda de mayor shop_id, igual que en get_feature_inputs. Los promedios reproducen los
+    AVG de DuckDB sobre DECIMAL(10, 2): suma entera en centavos / (n × 100).
+    trend_slope es la pendiente de mínimos cuadrados con x = 1..n:
+    (n·Σxy − Σx·Σy) / (n·Σx² − (Σx)²), con Σx y Σx² en forma cerrada.
+    """
+    where, params = "WHERE total_records >= ?", [min_records]
+    if game_ids is not None and len(game_ids) == 1:
+        where += " AND game_id = ?"             # lookup por PK (predicción de un juego)
+        params.append(game_ids[0])
+    elif game_ids is not None:
+        where += " AND list_contains(?, game_id)"
+        params.append(list(game_ids))
+    return con.execute(f"""
+        SELECT game_id,
+               min_price::DOUBLE AS min_price, max_price::DOUBLE AS max_price,
+               (sum_price * 100)::HUGEINT::DOUBLE / (total_records * 100) AS avg_price,
+               max_cut AS max_discount, total_records,
+               COALESCE(q4_cut_sum::DOUBLE / NULLIF(q4_sales, 0), 0)         AS avg_cut_q4,
+               COALESCE(summer_cut_sum::DOUBLE / NULLIF(summer_sales, 0), 0) AS avg_cut_summer,
+               min_price_ts, last_price, last_cut, sale_records, last_sale_ts,
+               trend_n AS trend_points,
+               CASE WHEN trend_n >= 2 THEN
+                   (trend_n * trend_sum_xy - (trend_n * (trend_n + 1) // 2) * trend_sum_y)::DOUBLE
+                   / (trend_n::DOUBLE * trend_n * (trend_n + 1) * (trend_n - 1) / 12)
+               END AS trend_slope
+        FROM game_feature_state
+        {where}
+        ORDER BY game_id
+    """, params).fetchnumpy()
+
+
+def get_training_inputs(con, stride_days: int = 7, horizon_days: int = 30,
+                        min_records: int = 10) -> dict:
+    """
+    Muestras (juego, fecha) para el dataset de entrenamiento, en una pasada.
+    Mismas columnas que get_feature_inputs + as_of + future_min_price, pero
+    cada fila usa solo los registros con timestamp <= as_of (sin fuga del futuro):
+
+      - state:   agregados acumulados por registro (ventanas ROWS UNBOUNDED
+                 PRECEDING), uno por (juego, timestamp)
+      - samples: una fecha cada `stride_days` días por juego, hasta
+                 `horizon_days` antes de su último registro
+      - future:  precio mínimo de los registros en [as_of, as_of + horizon)
+                 (NULL si el precio no cambió en ese lapso)
+
+    Cada muestra toma el estado vigente con un ASOF JOIN. Solo juegos con
+    `min_records`+ registros y muestras con 3+ registros a esa fecha.
+    """
+    stride, horizon = int(stride_days), int(horizon_days)
+    if stride < 1 or horizon < 1:
+        raise ValueError("stride_days y horizon_days deben ser >= 1")
+    return con.execute(f"""
+        WITH h AS MATERIALIZED (
+            SELECT game_id, timestamp, shop_id, price_usd, cut_pct
+            FROM price_history_all
+            WHERE game_id IN (SELECT game_id FROM price_history_all
+                              GROUP BY game_id HAVING COUNT(*) >= ?)
+        ),
+        indexed AS (
+            -- x = índice (1..n) entre los registros con precio > 0, como en build_features
+            SELECT *,
+                   CASE WHEN price_usd > 0
+                        THEN SUM(CASE WHEN price_usd > 0 THEN 1 ELSE 0 END) OVER w END AS x
+            FROM h
+            WINDOW w AS (PARTITION BY game_id ORDER BY timestamp, shop_id
+                         ROWS UNBOUNDED PRECEDING)
+        ),
+        state AS (
+            SELECT game_id, timestamp,
+                   (MIN(price_usd) OVER w)::DOUBLE                       AS min_price,
+                   (MAX(price_usd) OVER w)::DOUBLE                       AS max_price,
+                   (AVG(price_usd) OVER w)::DOUBLE                       AS avg_price,
+                   MAX(cut_pct) OVER w                                   AS max_discount,
+                   COUNT(*) OVER w                                       AS total_records,
+                   COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (10,11,12) AND cut_pct > 0
+                                     THEN cut_pct END) OVER w, 0)        AS avg_cut_q4,
+                   COALESCE(AVG(CASE WHEN MONTH(timestamp) IN (6,7,8) AND cut_pct > 0
+                                     THEN cut_pct END) OVER w, 0)        AS avg_cut_summer,
+                   arg_min(timestamp, {{'p': price_usd, 't': -epoch_us(timestamp)}}) OVER w
+                                                                         AS min_price_ts,
+                   price_usd::DOUBLE                                     AS last_price,
+                   cut_pct                                               AS last_cut,
+                   SUM(CASE WHEN cut_pct > 0 THEN 1 ELSE 0 END) OVER w   AS sale_records,
+                   MAX(CASE WHEN cut_pct > 0 THEN timestamp END) OVER w  AS last_sale_ts,
+                   COUNT(x) OVER w                                       AS trend_points,
+                   regr_slope(CASE WHEN x IS NOT NULL THEN price_usd::DOUBLE END, x) OVER w
+                                                                         AS trend_slope
+            FROM indexed
+            WINDOW w AS (PARTITION BY game_id ORDER BY timestamp, shop_id
+                         ROWS UNBOUNDED PRECEDING)
+            -- con varias tiendas en el mismo timestamp vale el estado tras la última
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY game_id, timestamp ORDER BY shop_id DESC) = 1
+        ),
+        samples AS (
+            SELECT game_id,
+                   UNNEST(generate_series(
+                       date_trunc('day', MIN(timestamp)) + INTERVAL {stride} DAY,
+                       MAX(timestamp) - INTERVAL {horizon} DAY,
+                       INTERVAL {stride} DAY)) AS as_of
+            FROM h
+            GROUP BY game_id
+        ),
+        future AS (
+            SELECT game_id, day AS as_of, is_sample,
+                   MIN(min_price) OVER (PARTITION BY game_id ORDER BY day
+                                        RANGE BETWEEN CURRENT ROW
+                                              AND INTERVAL {horizon - 1} DAY FOLLOWING)
+                       AS future_min_price
+            FROM (
+                SELECT game_id, date_trunc('day', timestamp) AS day,
+                       MIN(price_usd)::DOUBLE AS min_price, FALSE AS is_sample
+                FROM h
+                GROUP BY ALL
+                UNION ALL
+                SELECT game_id, as_of, NULL, TRUE FROM samples
+            )
+            QUALIFY is_sample
+        )
+        SELECT f.game_id, f.as_of, f.future_min_price,
+               s.min_price, s.max_price, s.avg_price, s.max_discount, s.total_records,
+               s.avg_cut_q4, s.avg_cut_summer, s.min_price_ts, s.last_price, s.last_cut,
+               s.sale_records, s.last_sale_ts, s.trend_points, s.trend_slope
+        FROM future f
+        ASOF JOIN state s ON f.game_id = s.game_id AND f.as_of >= s.timestamp
+        WHERE s.total_records >= 3
+        ORDER BY f.game_id, f.as_of
+    """, [min_records]).fetchnumpy()
+
+
 def get_seasonal_patterns(con, game_id: str) -> list[dict]:
-    rows = con.execute("""
+    return fetch_all(con.execute("""
         SELECT
             MONTH(timestamp) AS month,
             AVG(cut_pct)     AS avg_discount,
             COUNT(*)         AS sample_size,
             MIN(price_usd)   AS min_price
-        FROM price_history
+        FROM price_history_all
         WHERE game_id = ? AND cut_pct > 0
         GROUP BY MONTH(timestamp)
         ORDER BY month
-    """, [game_id]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, [game_id]))
 
 
 # ── predictions_cache ─────────────────────────────────────────────────────────
@@ -240,13 +1219,12 @@ def get_cached_prediction(con, game_id: str, max_age_hours: int = 6) -> Optional
     Antes usaba INTERVAL '6 hours' hardcodeado, ignorando max_age_hours.
     """
     cutoff = _now() - dt.timedelta(hours=max_age_hours)
-    row = con.execute("""
+    return fetch_one(con.execute("""
         SELECT score, signal, reason, features, computed_at
         FROM predictions_cache
         WHERE game_id = ?
           AND computed_at > ?
-    """, [game_id, cutoff]).fetchdf()
-    return _san(row.iloc[0].to_dict()) if not row.empty else None
+    """, [game_id, cutoff]))
 
 
 def upsert_prediction(con, game_id: str, score: float, signal: str,
@@ -267,13 +1245,45 @@ def upsert_prediction(con, game_id: str, score: float, signal: str,
     """, [game_id, score, signal, reason, json.dumps(features), now])
 
 
+def get_fresh_prediction_ids(con, game_ids: list[str], max_age_hours: int = 6) -> set[str]:
+    """Cuáles de `game_ids` tienen una predicción en cache más nueva que max_age_hours."""
+    cutoff = _now() - dt.timedelta(hours=max_age_hours)
+    rows = con.execute("""
+        SELECT game_id FROM predictions_cache
+        WHERE list_contains(?, game_id) AND computed_at > ?
+    """, [list(game_ids), cutoff]).fetchall()
+    return {r[0] for r in rows}
+
+
+def upsert_predictions(con, rows: list[dict]) -> int:
+    """
+    upsert_prediction en lote: un solo INSERT para todas las filas
+    ({game_id, score, signal, reason, features}). Los game_id deben ser únicos.
+    """
+    if not rows:
+        return 0
+    con.execute("""
+        INSERT INTO predictions_cache (game_id, score, signal, reason, features, computed_at)
+        SELECT UNNEST(?), UNNEST(?), UNNEST(?), UNNEST(?), UNNEST(?)::JSON, ?
+        ON CONFLICT (game_id) DO UPDATE SET
+            score       = excluded.score,
+            signal      = excluded.signal,
+            reason      = excluded.reason,
+            features    = excluded.features,
+            computed_at = excluded.computed_at
+    """, [[r["game_id"] for r in rows], [r["score"] for r in rows],
+          [r["signal"] for r in rows], [r["reason"] for r in rows],
+          [json.dumps(r["features"]) for r in rows], _now()])
+    return len(rows)
+
+
 # ── Overview ──────────────────────────────────────────────────────────────────
 
 def get_overview_stats(con) -> dict:
     row = con.execute("""
         SELECT
             (SELECT COUNT(*) FROM games)         AS total_games,
-            (SELECT COUNT(*) FROM price_history) AS total_records,
+            (SELECT COALESCE(SUM(total_records), 0) FROM game_price_summary) AS total_records,
             (SELECT COUNT(DISTINCT game_id) FROM predictions_cache WHERE signal = 'BUY')  AS buy_signals,
             (SELECT COUNT(DISTINCT game_id) FROM predictions_cache WHERE signal = 'WAIT') AS wait_signals
     """).fetchone()
@@ -286,16 +1296,7 @@ def get_overview_stats(con) -> dict:
 
 
 def get_top_deals(con, limit: int = 24) -> list[dict]:
-    rows = con.execute("""
-        WITH latest AS (
-            SELECT game_id, price_usd, regular_usd, cut_pct, timestamp,
-                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC) AS rn
-            FROM price_history
-        ),
-        mins AS (
-            SELECT game_id, MIN(price_usd) AS min_price
-            FROM price_history GROUP BY game_id
-        )
+    return fetch_all(con.execute("""
         SELECT
             g.id, g.title, g.appid,
             l.price_usd                        AS current_price,
@@ -303,23 +1304,17 @@ def get_top_deals(con, limit: int = 24) -> list[dict]:
             l.cut_pct                          AS discount_pct,
             CAST(l.timestamp AS VARCHAR)       AS last_seen,
             COALESCE(m.min_price, l.price_usd) AS min_price
-        FROM latest l
+        FROM current_prices l
         JOIN games g ON g.id = l.game_id
-        JOIN mins  m ON m.game_id = l.game_id
-        WHERE l.rn = 1 AND l.cut_pct > 0
+        JOIN game_price_summary m ON m.game_id = l.game_id
+        WHERE l.cut_pct > 0
         ORDER BY l.cut_pct DESC, l.price_usd ASC
         LIMIT ?
-    """, [limit]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, [limit]))
 
 
 def get_best_predictions(con, signal: str = "BUY", limit: int = 24) -> list[dict]:
-    rows = con.execute("""
-        WITH latest AS (
-            SELECT game_id, price_usd, cut_pct,
-                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC) AS rn
-            FROM price_history
-        )
+    return fetch_all(con.execute("""
         SELECT
             g.id, g.title, g.appid,
             pc.score, pc.signal, pc.reason,
@@ -327,9 +1322,8 @@ def get_best_predictions(con, signal: str = "BUY", limit: int = 24) -> list[dict
             COALESCE(lp.cut_pct, 0)   AS discount_pct
         FROM predictions_cache pc
         JOIN games g ON g.id = pc.game_id
-        LEFT JOIN (SELECT * FROM latest WHERE rn = 1) lp ON lp.game_id = pc.game_id
+        LEFT JOIN current_prices lp ON lp.game_id = pc.game_id
         WHERE pc.signal = ?
         ORDER BY pc.score DESC
         LIMIT ?
-    """, [signal, limit]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
\ No newline at end of file
+    """, [signal, limit]))
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+src/db/rows.py
+==============
+Mapeo liviano de resultados DuckDB → dicts, sin pandas.
+
+fetchall() devuelve tuplas; aquí se combinan con los nombres de columna de
+cursor.description. Es el único lugar donde se sanean valores numéricos:
+  - NaN / ±Inf → None (orjson no los serializa)
+  - Decimal    → float (DECIMAL(10, 2) de price_history; orjson tampoco lo acepta)
+Solo se revisan las columnas que DuckDB reporta como NUMBER.
+"""
+import math
+from decimal import Decimal
+from typing import Optional
+
+
+def clean_value(v):
+    """Sanea un valor escalar para serializarlo a JSON."""
+    cls = v.__class__
+    if cls is float:
+        return None if (math.isnan(v) or math.isinf(v)) else v
+    if cls is Decimal:
+        return clean_value(float(v))
+    return v
+
+
+def _numeric_positions(description) -> list[int]:
+    return [i for i, d in enumerate(description) if d[1] == "NUMBER"]
+
+
+def _clean_row(row: tuple, positions: list[int]) -> list:
+    row = list(row)
+    for i in positions:
+        row[i] = clean_value(row[i])
+    return row
+
+
+def fetch_all(cur) -> list[dict]:
+    """Todas las filas del cursor como lista de dicts saneados."""
+    cols = [d[0] for d in cur.description]
+    positions = _numeric_positions(cur.description)
+    rows = cur.fetchall()
+    if positions:
+        rows = [_clean_row(r, positions) for r in rows]
+    return [dict(zip(cols, r)) for r in rows]
+
+
+def fetch_one(cur) -> Optional[dict]:
+    """Primera fila del cursor como dict saneado, o None si no hay filas."""
+    row = cur.fetchone()
+    if row is None:
+        return None
+    positions = _numeric_positions(cur.description)
+    if positions:
+        row = _clean_row(row, positions)
+    return dict(zip((d[0] for d in cur.description), row))
+
+
+def fetch_column(cur) -> list:
+    """Primera columna de todas las filas (p. ej. listas de ids)."""
+    return [r[0] for r in cur.fetchall()]
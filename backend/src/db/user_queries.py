@@ -6,10 +6,13 @@ FIX: DuckDB lanza BinderException cuando se mezclan parámetros '?' con
      Solución: pasar datetime.now() como parámetro Python explícito.
 """
 import logging
-import math
 from datetime import datetime, timezone
 from typing import Optional
 
+import pyarrow as pa
+
+from src.db.rows import fetch_all, fetch_column, fetch_one
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,11 +21,6 @@ def _now() -> datetime:
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
-def _san(d: dict) -> dict:
-    return {k: (None if isinstance(v, float) and (math.isnan(v) or math.isinf(v)) else v)
-            for k, v in d.items()}
-
-
 def upsert_user(con, steam_id: str, display_name: str, avatar_url: str, profile_url: str):
     now = _now()
     con.execute("""
@@ -37,55 +35,87 @@ def upsert_user(con, steam_id: str, display_name: str, avatar_url: str, profile_
 
 
 def get_user(con, steam_id: str) -> Optional[dict]:
-    row = con.execute("SELECT * FROM users WHERE steam_id = ?", [steam_id]).fetchdf()
-    return _san(row.iloc[0].to_dict()) if not row.empty else None
+    return fetch_one(con.execute("SELECT * FROM users WHERE steam_id = ?", [steam_id]))
+
+
+def _register_user_rows(con, name: str, steam_id: str, rows: dict):
+    """Registra columnas Python como tabla Arrow temporal (una sola sentencia por sync)."""
+    n = len(rows["appid"])
+    con.register(name, pa.table({"steam_id": pa.array([steam_id] * n, pa.string()), **rows}))
 
 
 def sync_user_library(con, steam_id: str, games: list[dict]) -> int:
-    if not games:
-        return 0
-    inserted = 0
-    now = _now()
-    for g in games:
+    """
+    Inserta/actualiza la librería completa en una sola sentencia.
+    Filas sin appid válido se descartan (antes fallaban una a una).
+    """
+    appids, titles, playtimes, last_played = [], [], [], []
+    for g in games or []:
         try:
-            last_played = None
-            if g.get("last_played") and int(g["last_played"]) > 0:
-                last_played = datetime.fromtimestamp(int(g["last_played"]))
-            con.execute("""
-                INSERT INTO user_games (steam_id, appid, game_title, playtime_mins, last_played, synced_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT (steam_id, appid) DO UPDATE SET
-                    game_title    = excluded.game_title,
-                    playtime_mins = excluded.playtime_mins,
-                    last_played   = excluded.last_played,
-                    synced_at     = excluded.synced_at
-            """, [steam_id, g["appid"], g.get("title"), g.get("playtime_mins", 0), last_played, now])
-            inserted += 1
-        except Exception as e:
-            logger.debug(f"sync_user_library error appid={g.get('appid')}: {e}")
-    return inserted
+            appid = int(g["appid"])
+            lp = int(g.get("last_played") or 0)
+        except (KeyError, TypeError, ValueError):
+            logger.debug(f"sync_user_library: fila inválida {g!r}")
+            continue
+        appids.append(appid)
+        titles.append(g.get("title"))
+        playtimes.append(int(g.get("playtime_mins") or 0))
+        last_played.append(datetime.fromtimestamp(lp) if lp > 0 else None)
+    if not appids:
+        return 0
+
+    _register_user_rows(con, "_user_games_batch", steam_id, {
+        "appid":         pa.array(appids, pa.int32()),
+        "game_title":    pa.array(titles, pa.string()),
+        "playtime_mins": pa.array(playtimes, pa.int32()),
+        "last_played":   pa.array(last_played, pa.timestamp("us")),
+    })
+    try:
+        con.execute("""
+            INSERT INTO user_games (steam_id, appid, game_title, playtime_mins, last_played, synced_at)
+            SELECT DISTINCT ON (appid) steam_id, appid, game_title, playtime_mins, last_played, ?
+            FROM _user_games_batch
+            ON CONFLICT (steam_id, appid) DO UPDATE SET
+                game_title    = excluded.game_title,
+                playtime_mins = excluded.playtime_mins,
+                last_played   = excluded.last_played,
+                synced_at     = excluded.synced_at
+        """, [_now()])
+    finally:
+        con.unregister("_user_games_batch")
+    return len(set(appids))
 
 
 def sync_user_wishlist(con, steam_id: str, items: list[dict]) -> int:
-    if not items:
-        return 0
-    inserted = 0
-    now = _now()
-    for item in items:
+    appids, titles = [], []
+    for item in items or []:
         try:
-            con.execute("""
-                INSERT INTO user_wishlist (steam_id, appid, game_title, added_at)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT (steam_id, appid) DO NOTHING
-            """, [steam_id, item["appid"], item.get("title"), now])
-            inserted += 1
-        except Exception as e:
-            logger.debug(f"sync_user_wishlist error appid={item.get('appid')}: {e}")
-    return inserted
+            appids.append(int(item["appid"]))
+        except (KeyError, TypeError, ValueError):
+            logger.debug(f"sync_user_wishlist: fila inválida {item!r}")
+            continue
+        titles.append(item.get("title"))
+    if not appids:
+        return 0
+
+    _register_user_rows(con, "_user_wishlist_batch", steam_id, {
+        "appid":      pa.array(appids, pa.int32()),
+        "game_title": pa.array(titles, pa.string()),
+    })
+    try:
+        con.execute("""
+            INSERT INTO user_wishlist (steam_id, appid, game_title, added_at)
+            SELECT DISTINCT ON (appid) steam_id, appid, game_title, ?
+            FROM _user_wishlist_batch
+            ON CONFLICT (steam_id, appid) DO NOTHING
+        """, [_now()])
+    finally:
+        con.unregister("_user_wishlist_batch")
+    return len(set(appids))
 
 
 def get_user_library(con, steam_id: str) -> list[dict]:
-    rows = con.execute("""
+    return fetch_all(con.execute("""
         SELECT
             ug.appid,
             ug.game_title,
@@ -94,32 +124,18 @@ def get_user_library(con, steam_id: str) -> list[dict]:
             g.id                             AS game_id,
             COALESCE(ps.min_price, 0)        AS min_price,
             COALESCE(ps.avg_price, 0)        AS avg_price,
-            COALESCE(ps.max_discount, 0)     AS max_discount,
+            COALESCE(ps.max_cut, 0)          AS max_discount,
             COALESCE(ps.total_records, 0)    AS total_records
         FROM user_games ug
         LEFT JOIN games g ON g.appid = ug.appid
-        LEFT JOIN (
-            SELECT game_id,
-                   MIN(price_usd) AS min_price,
-                   AVG(price_usd) AS avg_price,
-                   MAX(cut_pct)   AS max_discount,
-                   COUNT(*)       AS total_records
-            FROM price_history
-            GROUP BY game_id
-        ) ps ON ps.game_id = g.id
+        LEFT JOIN game_price_summary ps ON ps.game_id = g.id
         WHERE ug.steam_id = ?
         ORDER BY ug.playtime_mins DESC
-    """, [steam_id]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, [steam_id]))
 
 
 def get_user_wishlist_with_prices(con, steam_id: str) -> list[dict]:
-    rows = con.execute("""
-        WITH latest AS (
-            SELECT game_id, price_usd, regular_usd, cut_pct,
-                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC) AS rn
-            FROM price_history
-        )
+    return fetch_all(con.execute("""
         SELECT
             uw.appid,
             uw.game_title,
@@ -133,38 +149,26 @@ def get_user_wishlist_with_prices(con, steam_id: str) -> list[dict]:
             pc.signal
         FROM user_wishlist uw
         LEFT JOIN games g ON g.appid = uw.appid
-        LEFT JOIN (SELECT * FROM latest WHERE rn = 1) lp ON lp.game_id = g.id
-        LEFT JOIN (
-            SELECT game_id,
-                   MIN(price_usd) AS min_price,
-                   AVG(price_usd) AS avg_price
-            FROM price_history GROUP BY game_id
-        ) ps ON ps.game_id = g.id
+        LEFT JOIN current_prices lp ON lp.game_id = g.id
+        LEFT JOIN game_price_summary ps ON ps.game_id = g.id
         LEFT JOIN predictions_cache pc ON pc.game_id = g.id
         WHERE uw.steam_id = ?
         ORDER BY COALESCE(pc.score, 0) DESC, COALESCE(lp.cut_pct, 0) DESC
-    """, [steam_id]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, [steam_id]))
 
 
 def get_user_owned_appids(con, steam_id: str) -> set:
-    rows = con.execute(
+    return set(fetch_column(con.execute(
         "SELECT appid FROM user_games WHERE steam_id = ?", [steam_id]
-    ).fetchdf()
-    return set(rows["appid"].tolist()) if not rows.empty else set()
+    )))
 
 
 def get_recommendations(con, steam_id: str, limit: int = 24) -> list[dict]:
-    rows = con.execute("""
+    return fetch_all(con.execute("""
         WITH owned AS (
             SELECT appid FROM user_games    WHERE steam_id = ?
             UNION ALL
             SELECT appid FROM user_wishlist WHERE steam_id = ?
-        ),
-        latest AS (
-            SELECT game_id, price_usd, cut_pct,
-                   ROW_NUMBER() OVER (PARTITION BY game_id ORDER BY timestamp DESC) AS rn
-            FROM price_history
         )
         SELECT
             g.id, g.title, g.appid,
@@ -174,18 +178,14 @@ def get_recommendations(con, steam_id: str, limit: int = 24) -> list[dict]:
             COALESCE(ps.min_price, 0)  AS min_price
         FROM predictions_cache pc
         JOIN games g ON g.id = pc.game_id
-        LEFT JOIN (SELECT * FROM latest WHERE rn = 1) lp ON lp.game_id = g.id
-        LEFT JOIN (
-            SELECT game_id, MIN(price_usd) AS min_price
-            FROM price_history GROUP BY game_id
-        ) ps ON ps.game_id = g.id
+        LEFT JOIN current_prices lp ON lp.game_id = g.id
+        LEFT JOIN game_price_summary ps ON ps.game_id = g.id
         WHERE pc.signal = 'BUY'
           AND g.appid IS NOT NULL
           AND g.appid NOT IN (SELECT appid FROM owned WHERE appid IS NOT NULL)
         ORDER BY pc.score DESC
         LIMIT ?
-    """, [steam_id, steam_id, limit]).fetchdf()
-    return [_san(r) for r in rows.to_dict(orient="records")]
+    """, [steam_id, steam_id, limit]))
 
 
 def get_library_stats(con, steam_id: str) -> dict:
@@ -0,0 +1,220 @@
+"""
+src/db/writer.py
+================
+Escritor único para todas las mutaciones de DuckDB.
+
+DuckDB admite un solo escritor efectivo: varias conexiones escribiendo a la vez
+(predicciones desde GET /predict, syncs en background, librería/wishlist) generan
+conflictos write-write y contención de locks. Aquí todas las escrituras se encolan
+y un thread dedicado las ejecuta con su propio cursor, agrupando lo que haya en la
+cola en una sola transacción.
+
+Las funciones encoladas tienen la forma de src.db.queries: fn(con, *args, **kwargs).
+
+Uso:
+    # async — espera a que la escritura se confirme
+    inserted = await get_writer().run(queries.upsert_price_records, records)
+
+    # sync — fire-and-forget, retorna un concurrent.futures.Future
+    get_writer().submit(queries.upsert_prediction, game_id, ...)
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DBWriter:
+    """Thread único que consume una cola de mutaciones y las aplica por lotes."""
+
+    def __init__(self, cursor_factory: Callable, max_batch: int = 64):
+        self._cursor_factory = cursor_factory
+        self._max_batch = max(1, max_batch)
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "submitted":      0,
+            "completed":      0,
+            "failed":         0,
+            "transactions":   0,
+            "rollbacks":      0,
+            "max_batch_seen": 0,
+            "busy_ms":        0.0,
+        }
+        self._lock = threading.Lock()
+
+    # ── API ───────────────────────────────────────────────────────────────────
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="duckdb-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Writer DuckDB iniciado (batch máx. {self._max_batch})")
+
+    def stop(self, timeout: float = 30.0):
+        """Procesa lo pendiente y detiene el thread."""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Writer DuckDB detenido")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Encola fn(con, *args, **kwargs). El Future se resuelve tras el COMMIT."""
+        if not self._thread:
+            raise RuntimeError("Writer DuckDB no iniciado")
+        fut: Future = Future()
+        with self._lock:
+            self._stats["submitted"] += 1
+        self._queue.put((fn, args, kwargs, fut))
+        return fut
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Versión awaitable de submit(): retorna el resultado de fn o propaga su excepción."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def run_sync(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Bloquea el thread actual hasta que la escritura termine (para código síncrono)."""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["busy_ms"] = round(stats["busy_ms"], 2)
+        stats["queued"] = self._queue.qsize()
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    # ── Loop ──────────────────────────────────────────────────────────────────
+
+    def _loop(self):
+        con = self._cursor_factory()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stop_after = False
+                while len(batch) < self._max_batch:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is _STOP:
+                        stop_after = True
+                        break
+                    batch.append(nxt)
+
+                t0 = time.perf_counter()
+                self._apply(con, batch)
+                with self._lock:
+                    self._stats["busy_ms"] += (time.perf_counter() - t0) * 1000
+                    self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(batch))
+
+                if stop_after:
+                    return
+        finally:
+            try:
+                con.close()
+            except Exception:
+                pass
+
+    def _apply(self, con, batch: list):
+        """Aplica el lote en una transacción; si algo falla, reintenta cada op por separado."""
+        try:
+            results = self._transaction(con, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._finish(batch[0][3], error=e)
+                return
+            logger.warning(f"Lote de {len(batch)} escrituras revertido ({e}); reintento individual")
+            for op in batch:
+                try:
+                    (result,) = self._transaction(con, [op])
+                    self._finish(op[3], result=result)
+                except Exception as op_error:
+                    self._finish(op[3], error=op_error)
+            return
+        for op, result in zip(batch, results):
+            self._finish(op[3], result=result)
+
+    def _transaction(self, con, ops: list) -> list:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            results = [fn(con, *args, **kwargs) for fn, args, kwargs, _ in ops]
+            con.execute("COMMIT")
+        except Exception:
+            with self._lock:
+                self._stats["rollbacks"] += 1
+            try:
+                con.execute("ROLLBACK")
+            except Exception:
+                pass
+            raise
+        with self._lock:
+            self._stats["transactions"] += 1
+        return results
+
+    def _finish(self, fut: Future, result=None, error: Optional[Exception] = None):
+        with self._lock:
+            self._stats["failed" if error else "completed"] += 1
+        if fut.done():
+            # El llamador canceló la espera (p.ej. apagado): la escritura ya se aplicó
+            return
+        if error:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+
+# ── Instancia global ──────────────────────────────────────────────────────────
+
+_writer: Optional[DBWriter] = None
+
+
+def start_writer(max_batch: int = 64) -> DBWriter:
+    """Crea e inicia el writer global. Requiere init_db() previo."""
+    global _writer
+    from src.db.connection import dedicated_cursor
+
+    if _writer is None:
+        _writer = DBWriter(dedicated_cursor, max_batch=max_batch)
+    _writer.start()
+    return _writer
+
+
+def get_writer() -> DBWriter:
+    if _writer is None:
+        raise RuntimeError("Writer DuckDB no iniciado. Llama a start_writer() primero.")
+    return _writer
+
+
+def stop_writer():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def writer_metrics() -> dict:
+    return _writer.metrics() if _writer is not None else {}
+
+
+def log_failure(fut: Future, what: str):
+    """Callback para escrituras fire-and-forget: registra el error si lo hubo."""
+    def _cb(f: Future):
+        err = f.exception()
+        if err:
+            logger.warning(f"Escritura fallida ({what}): {err}")
+    fut.add_done_callback(_cb)
@@ -0,0 +1,255 @@
+"""
+src/ml/compiled.py
+==================
+GradientBoostingRegressor + StandardScaler exportados a arrays NumPy (.npz) y
+un evaluador en NumPy puro, para que la API no importe scikit-learn ni joblib.
+
+Uso:
+  python -m src.ml.compiled --model src/ml/artifacts/model.joblib [--dataset ./data/training.parquet]
+
+Tras exportar, el CLI verifica la paridad con scikit-learn (verify_export)
+sobre el dataset de entrenamiento si existe, o sobre una muestra sintética
+que incluye los umbrales de cada split; si difiere, borra el .npz y sale con 1.
+
+El ensemble se aplana en arrays concatenados de todos los árboles:
+  - feature / threshold:  split de cada nodo (feature = -2 en las hojas)
+  - left / right:         hijos, como índices absolutos (-1 en las hojas)
+  - value:                valor de la hoja ya multiplicado por learning_rate
+  - roots:                índice del nodo raíz de cada árbol
+más init (predicción inicial), mean / scale del scaler y max_depth.
+
+CompiledGBR.predict reproduce a sklearn bit a bit: escala en float64, compara
+en float32 (sklearn convierte X a float32 antes de recorrer los árboles) y
+suma los árboles en orden, uno tras otro, partiendo de init. Evalúa una fila o
+un lote con el mismo código.
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Más profundo que esto el árbol completo ocupa demasiado: queda el .joblib
+MAX_COMPILED_DEPTH = 12
+_CHUNK_ROWS = 256
+# Pérdidas de regresión cuya predicción es la suma cruda (link identidad)
+_IDENTITY_LOSSES = ("squared_error", "absolute_error", "huber", "quantile")
+
+
+def export_model(model, scaler, path: str) -> dict:
+    """
+    Aplana un GradientBoostingRegressor entrenado (y su StandardScaler, o None)
+    y lo guarda en `path` (.npz). Retorna el resumen del artefacto.
+    ValueError si el modelo no se puede compilar (pérdida o init no soportados).
+    """
+    if getattr(model, "loss", None) not in _IDENTITY_LOSSES:
+        raise ValueError(f"Pérdida no soportada para compilar: {getattr(model, 'loss', None)}")
+    if model.init_ == "zero":
+        init = 0.0
+    elif hasattr(model.init_, "constant_"):
+        init = float(np.ravel(model.init_.constant_)[0])
+    else:
+        raise ValueError(f"init no soportado para compilar: {type(model.init_).__name__}")
+
+    lr = float(model.learning_rate)
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in model.estimators_[:, 0]:
+        t = est.tree_
+        is_leaf = t.children_left == -1
+        roots.append(offset)
+        feature.append(t.feature.astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        left.append(np.where(is_leaf, -1, t.children_left + offset).astype(np.int32))
+        right.append(np.where(is_leaf, -1, t.children_right + offset).astype(np.int32))
+        value.append(lr * t.value[:, 0, 0])       # mismo producto que sklearn en predict
+        offset += t.node_count
+        max_depth = max(max_depth, int(t.max_depth))
+
+    n_features = int(model.n_features_in_)
+    if scaler is not None:
+        mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(n_features), np.float64)
+        scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(n_features), np.float64)
+    else:
+        mean, scale = np.zeros(n_features), np.ones(n_features)
+
+    arrays = {
+        "version":   np.int32(FORMAT_VERSION),
+        "init":      np.float64(init),
+        "max_depth": np.int32(max_depth),
+        "roots":     np.asarray(roots, np.int32),
+        "feature":   np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left":      np.concatenate(left),
+        "right":     np.concatenate(right),
+        "value":     np.concatenate(value),
+        "mean":      mean,
+        "scale":     scale,
+        "scaled":    np.bool_(scaler is not None),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as fh:
+        np.savez(fh, **arrays)
+    info = {"trees": len(roots), "nodes": offset, "max_depth": max_depth,
+            "features": n_features, "bytes": os.path.getsize(path)}
+    logger.info(f"Modelo compilado guardado en {path}: {info}")
+    return info
+
+
+def verify_export(path: str, model, scaler, X: np.ndarray) -> None:
+    """
+    ValueError si CompiledGBR.load(path) no da exactamente model.predict sobre
+    X (sin escalar, en FEATURE_ORDER).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    expected = model.predict(scaler.transform(X) if scaler is not None else X)
+    got = CompiledGBR.load(path).predict(X)
+    if not np.array_equal(got, expected):
+        raise ValueError(f"difiere de scikit-learn en {int(np.sum(got != expected))}/{len(X)} "
+                         f"filas (máx {np.max(np.abs(got - expected)):.3g})")
+
+
+def sample_matrix(model, scaler, n: int = 2000, seed: int = 0) -> np.ndarray:
+    """
+    Muestra sin escalar para verify_export cuando no hay dataset: filas
+    aleatorias alrededor de la media del scaler más una fila por split con la
+    feature justo en el umbral (el caso en que float32 vs float64 importa).
+    """
+    n_features = int(model.n_features_in_)
+    mean = scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler is not None and scaler.with_std else np.ones(n_features)
+    rng = np.random.default_rng(seed)
+    rows = [rng.normal(0.0, 2.0, (n, n_features))]
+    for est in model.estimators_[:, 0]:
+        t = est.tree_
+        split = t.children_left != -1
+        at = np.zeros((int(split.sum()), n_features))
+        at[np.arange(len(at)), t.feature[split]] = t.threshold[split]
+        rows.append(at)
+    Z = np.vstack(rows)
+    return Z * scale + mean if scaler is not None else Z
+
+
+class CompiledGBR:
+    """
+    Evaluador NumPy de un artefacto de export_model. predict(X) recibe X sin escalar.
+
+    Al cargar, cada árbol se reacomoda como árbol binario completo de
+    profundidad max_depth (orden de heap: hijos de i en 2i+1 / 2i+2). Una hoja
+    que queda antes del último nivel se extiende con umbral +inf (siempre a la
+    izquierda) y su valor se copia a todas las hojas de abajo. Así cada nivel
+    es índice → comparación → 2i+1|2i+2, sin seguir punteros a hijos.
+    """
+
+    def __init__(self, arrays):
+        if int(arrays["version"]) != FORMAT_VERSION:
+            raise ValueError(f"Versión de artefacto no soportada: {int(arrays['version'])}")
+        self.init = float(arrays["init"])
+        self.depth = int(arrays["max_depth"])
+        if self.depth > MAX_COMPILED_DEPTH:
+            raise ValueError(f"Árboles demasiado profundos para compilar ({self.depth})")
+        self.mean = arrays["mean"]
+        self.scale = arrays["scale"]
+        self.scaled = bool(arrays["scaled"])
+        self.n_features = len(self.mean)
+        self.n_trees = len(arrays["roots"])
+        self._build_heaps(arrays)
+
+    def _build_heaps(self, arrays):
+        feature, threshold = arrays["feature"], arrays["threshold"]
+        left, right, value = arrays["left"], arrays["right"], arrays["value"]
+        inner, leaves = 2 ** self.depth - 1, 2 ** self.depth
+        feat = np.zeros((self.n_trees, inner), np.intp)
+        thr = np.full((self.n_trees, inner), np.inf)
+        vals = np.zeros((self.n_trees, leaves))
+        for t, root in enumerate(arrays["roots"]):
+            level = [int(root)]
+            for d in range(self.depth):
+                nxt = []
+                for i, n in enumerate(level):
+                    h = 2 ** d - 1 + i
+                    if left[n] == -1:               # hoja: sigue bajando por sí misma
+                        nxt += [n, n]
+                    else:
+                        feat[t, h], thr[t, h] = feature[n], threshold[n]
+                        nxt += [int(left[n]), int(right[n])]
+                level = nxt
+            vals[t] = value[level]
+        self._feat, self._thr, self._vals = feat.ravel(), thr.ravel(), vals.ravel()
+        # Posiciones absolutas: nodo h del árbol t en _feat/_thr[t·inner + h];
+        # al llegar al último nivel, h - inner es la hoja → _vals[t·leaves + h - inner]
+        self._base = np.arange(self.n_trees) * inner
+        self._leaf_shift = np.arange(self.n_trees) * (leaves - inner) - inner
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledGBR":
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        if self.scaled:
+            X = (X - self.mean) / self.scale
+        x32 = X.astype(np.float32)
+        if len(X) <= _CHUNK_ROWS:
+            return self._predict_rows(x32)
+        # Por bloques: acota la memoria (filas × árboles) y es más rápido que todo junto
+        return np.concatenate([self._predict_rows(x32[i:i + _CHUNK_ROWS])
+                               for i in range(0, len(X), _CHUNK_ROWS)])
+
+    def _predict_rows(self, x32: np.ndarray) -> np.ndarray:
+        n = len(x32)
+        flat = x32.ravel()
+        rows = (np.arange(n) * self.n_features)[:, None] if n > 1 else 0
+
+        # Todos los árboles a la vez: pos[i, t] = nodo actual de la fila i en el árbol t
+        pos = np.tile(self._base, (n, 1))
+        for _ in range(self.depth):
+            go_left = flat[rows + self._feat[pos]] <= self._thr[pos]
+            pos = 2 * pos - self._base + 2 - go_left
+
+        # Suma secuencial init + v1 + v2 ... (cumsum, no la suma por pares de np.sum)
+        out = np.empty((n, self.n_trees + 1))
+        out[:, 0] = self.init
+        out[:, 1:] = self._vals[pos + self._leaf_shift]
+        return np.cumsum(out, axis=1)[:, -1]
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.path.join(
+        os.path.dirname(__file__), "artifacts", "model.joblib"))
+    parser.add_argument("--output", default=None, help="Por defecto, junto al .joblib con extensión .npz")
+    parser.add_argument("--dataset", default="./data/training.parquet",
+                        help="Parquet de src/ml/dataset.py para verificar la paridad")
+    args = parser.parse_args()
+
+    import joblib
+
+    artifact = joblib.load(args.model)
+    model, scaler = artifact["model"], artifact.get("scaler")
+    output = args.output or os.path.splitext(args.model)[0] + ".npz"
+    export_model(model, scaler, output)
+
+    if os.path.exists(args.dataset):
+        from src.ml.dataset import load_training_set
+        X_check = load_training_set(args.dataset)[0]
+        source = args.dataset
+    else:
+        X_check = sample_matrix(model, scaler)
+        source = "muestra sintética"
+    try:
+        verify_export(output, model, scaler, X_check)
+    except Exception as e:
+        logger.error(f"Modelo compilado descartado: {e}")
+        os.remove(output)
+        sys.exit(1)
+    logger.info(f"Paridad con scikit-learn verificada en {len(X_check)} filas ({source})")
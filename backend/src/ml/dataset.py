@@ -0,0 +1,106 @@
+"""
+src/ml/dataset.py
+=================
+Dataset de entrenamiento point-in-time, escrito a Parquet.
+
+Uso:
+  python -m src.ml.dataset --db ./data/steamsense.duckdb --out ./data/training.parquet \
+      --stride-days 7 --horizon-days 30
+
+Una muestra por juego cada `stride_days` días. Las features son las que
+build_features habría dado en esa fecha (as_of), calculadas solo con el
+historial hasta as_of. Salen de una consulta con window functions
+(queries.get_training_inputs) y de build_features_batch. El label mira los
+`horizon_days` siguientes:
+
+    label = 100 × min(precio en as_of, mínimo de los próximos horizon_days) / precio en as_of
+
+100 = no hubo mejor precio en el horizonte (buen momento para comprar);
+40 = el precio bajó un 60% en ese lapso. Las muestras con precio 0 se descartan.
+
+train.py lee el Parquet, así que iterar sobre el modelo no vuelve a recorrer DuckDB.
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.ml.features import FEATURE_ORDER, build_features_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = "./data/training.parquet"
+_PARAMS = ("stride_days", "horizon_days", "min_records")
+
+
+def build_training_set(con, stride_days: int = 7, horizon_days: int = 30,
+                       min_records: int = 10) -> pa.Table:
+    """Tabla con game_id, as_of, las columnas de FEATURE_ORDER y label."""
+    from src.db import queries
+
+    inputs = queries.get_training_inputs(con, stride_days, horizon_days, min_records)
+    batch = build_features_batch(inputs)
+
+    current = batch["_current_price"]
+    future = np.ma.filled(inputs["future_min_price"], np.nan).astype(float)
+    best = np.fmin(current, future)           # sin cambios en el horizonte → precio actual
+    keep = current > 0
+    label = 100 * best[keep] / current[keep]
+
+    columns = {
+        "game_id": pa.array(batch["game_id"][keep], pa.string()),
+        "as_of":   pa.array(np.ma.getdata(inputs["as_of"])[keep].astype("datetime64[us]")),
+        **{k: pa.array(np.asarray(batch[k], dtype=float)[keep]) for k in FEATURE_ORDER},
+        "label":   pa.array(label),
+    }
+    meta = {"stride_days": str(stride_days), "horizon_days": str(horizon_days),
+            "min_records": str(min_records)}
+    return pa.table(columns).replace_schema_metadata(meta)
+
+
+def write_training_set(con, path: str = DEFAULT_PATH, **kwargs) -> int:
+    """Genera el dataset y lo escribe en `path`. Retorna las muestras escritas."""
+    table = build_training_set(con, **kwargs)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(table, path)
+    logger.info(f"Dataset de entrenamiento: {table.num_rows} muestras, "
+                f"{len(set(table.column('game_id').to_pylist()))} juegos → {path}")
+    return table.num_rows
+
+
+def read_params(path: str) -> dict:
+    """Parámetros con que se generó el Parquet ({stride_days, horizon_days, min_records})."""
+    meta = pq.read_schema(path).metadata or {}
+    return {k.decode(): int(v) for k, v in meta.items() if k.decode() in _PARAMS}
+
+
+def load_training_set(path: str = DEFAULT_PATH) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(X en FEATURE_ORDER, y, game_id por muestra) desde el Parquet."""
+    table = pq.read_table(path, columns=["game_id", *FEATURE_ORDER, "label"])
+    X = np.column_stack([table.column(k).to_numpy() for k in FEATURE_ORDER]) \
+        if table.num_rows else np.empty((0, len(FEATURE_ORDER)))
+    return X, table.column("label").to_numpy(), table.column("game_id").to_numpy(zero_copy_only=False)
+
+
+if __name__ == "__main__":
+    import duckdb
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="./data/steamsense.duckdb")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--stride-days", type=int, default=7)
+    parser.add_argument("--horizon-days", type=int, default=30)
+    parser.add_argument("--min-records", type=int, default=10)
+    args = parser.parse_args()
+
+    con = duckdb.connect(args.db, read_only=True)
+    try:
+        write_training_set(con, args.out, stride_days=args.stride_days,
+                           horizon_days=args.horizon_days, min_records=args.min_records)
+    finally:
+        con.close()
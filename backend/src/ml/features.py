@@ -14,6 +14,11 @@ Features extraídas:
   - current_month           → mes actual (1–12) para detectar estacionalidad
   - days_since_last_sale    → días desde la última vez que hubo descuento
   - sale_frequency          → proporción de registros que tuvieron descuento
+
+build_features trabaja con un juego; build_features_batch calcula las mismas
+features para todo el catálogo desde queries.get_feature_inputs (una consulta)
+o desde game_feature_state (queries.get_feature_state), que la ingesta mantiene
+al día y se lee sin recorrer el historial (build_features_from_state).
 """
 
 import logging
@@ -24,6 +29,19 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+FEATURE_ORDER = [
+    "current_discount_pct",
+    "days_since_min_price",
+    "price_vs_avg_ratio",
+    "max_historical_discount",
+    "avg_discount_q4",
+    "avg_discount_summer",
+    "current_month",
+    "days_since_last_sale",
+    "sale_frequency",
+    "price_trend_slope",
+]
+
 
 def build_features(stats: dict, history: list[dict], seasonal: list[dict]) -> Optional[dict]:
     """
@@ -117,16 +135,128 @@ def features_to_vector(features: dict) -> np.ndarray:
     Convierte el dict de features al vector ordenado que espera el modelo.
     El orden debe coincidir exactamente con el que se usó en train.py.
     """
-    FEATURE_ORDER = [
-        "current_discount_pct",
-        "days_since_min_price",
-        "price_vs_avg_ratio",
-        "max_historical_discount",
-        "avg_discount_q4",
-        "avg_discount_summer",
-        "current_month",
-        "days_since_last_sale",
-        "sale_frequency",
-        "price_trend_slope",
-    ]
     return np.array([features.get(k, 0) for k in FEATURE_ORDER], dtype=float)
+
+
+# ── Catálogo completo ─────────────────────────────────────────────────────────
+
+# Features con valor entero en build_features (el resto son float)
+_INT_FEATURES = ("current_discount_pct", "current_month", "days_since_last_sale")
+_META = ("_current_price", "_min_price", "_max_price", "_avg_price")
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """round() de Python elemento a elemento: np.round no redondea igual en los bordes."""
+    return np.fromiter((round(v, ndigits) for v in values.tolist()), float, len(values))
+
+
+def _days(now: np.datetime64, ts: np.ndarray) -> np.ndarray:
+    """(now - ts).days de timedelta: días completos, redondeando hacia abajo."""
+    return (now - ts.astype("datetime64[us]")) // np.timedelta64(1, "D")
+
+
+def build_features_batch(inputs: dict, now: Optional[datetime] = None) -> dict:
+    """
+    Versión vectorizada de build_features para muchos juegos a la vez.
+
+    Args:
+        inputs: Resultado de queries.get_feature_inputs() (una fila por juego)
+                o de queries.get_training_inputs() (una fila por juego y fecha,
+                con la columna as_of como instante de referencia)
+        now:    Instante de referencia (UTC) si inputs no trae as_of; por defecto, ahora
+
+    Returns:
+        {"game_id": array, <feature>: array, ...} con las mismas claves y los
+        mismos valores que build_features daría juego por juego. Las columnas
+        son arrays paralelos; features_matrix() arma la matriz del modelo y
+        batch_row() el dict de un juego.
+    """
+    def col(k: str) -> np.ndarray:
+        return np.ma.getdata(inputs[k])
+
+    game_ids = np.asarray(col("game_id"), dtype=object)
+    n = len(game_ids)
+
+    if "as_of" in inputs:
+        # Dataset de entrenamiento: cada fila se evalúa en su propia fecha (UTC)
+        local_now = utc_now = col("as_of").astype("datetime64[us]")
+        month = local_now.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    else:
+        now = now or datetime.now(timezone.utc)
+        # days_since_min_price se calcula en queries con la hora local naive
+        local_now = np.datetime64(now.astimezone().replace(tzinfo=None), "us")
+        utc_now = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), "us")
+        month = np.full(n, now.month, dtype=np.int64)
+
+    current_price = col("last_price").astype(float)
+    current_cut = col("last_cut").astype(np.int64)
+    # Los agregados pasan por queries._f (4 decimales); 0 → valor por defecto, como `or`
+    min_price = _round(col("min_price").astype(float), 4)
+    max_price = _round(col("max_price").astype(float), 4)
+    max_price = np.where(max_price != 0, max_price, current_price)
+    avg_price = _round(col("avg_price").astype(float), 4)
+    avg_price = np.where(avg_price != 0, avg_price, current_price)
+    max_discount = col("max_discount").astype(float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_vs_avg = np.where(avg_price > 0, current_price / avg_price, 1.0)
+
+    days_since_min = np.maximum(0, _days(local_now, col("min_price_ts"))).astype(float)
+    days_since_min[days_since_min == 0] = 365
+
+    total = col("total_records").astype(float)
+    sale_frequency = col("sale_records") / total
+
+    sale_ts = inputs["last_sale_ts"]
+    days_since_sale = np.where(np.ma.getmaskarray(sale_ts), 9999,
+                               _days(utc_now, np.ma.getdata(sale_ts)))
+
+    points = col("trend_points")
+    slope = np.ma.filled(inputs["trend_slope"], np.nan).astype(float)
+    slope = np.where(points >= 5, np.nan_to_num(slope), 0.0)
+
+    return {
+        "game_id":                 game_ids,
+        "current_discount_pct":    current_cut,
+        "days_since_min_price":    np.minimum(days_since_min, 730),
+        "price_vs_avg_ratio":      _round(price_vs_avg, 4),
+        "max_historical_discount": max_discount,
+        "avg_discount_q4":         _round(col("avg_cut_q4").astype(float), 4),
+        "avg_discount_summer":     _round(col("avg_cut_summer").astype(float), 4),
+        "current_month":           month,
+        "days_since_last_sale":    np.minimum(days_since_sale, 730).astype(np.int64),
+        "sale_frequency":          _round(sale_frequency, 4),
+        "price_trend_slope":       _round(slope, 6),
+        "_current_price":          current_price,
+        "_min_price":              min_price,
+        "_max_price":              max_price,
+        "_avg_price":              avg_price,
+    }
+
+
+def build_features_from_state(state: dict, now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    build_features de un juego leyendo sus agregados acumulados
+    (queries.get_feature_state(con, [game_id])) en lugar del historial:
+    tiempo constante sin importar cuántos registros tenga. None si no hay fila.
+    """
+    if not len(state["game_id"]):
+        return None
+    return batch_row(build_features_batch(state, now), 0)
+
+
+def features_matrix(batch: dict) -> np.ndarray:
+    """Matriz (N × features) en FEATURE_ORDER: features_to_vector para todo el lote."""
+    n = len(batch["game_id"])
+    if not n:
+        return np.empty((0, len(FEATURE_ORDER)))
+    return np.column_stack([np.asarray(batch[k], dtype=float) for k in FEATURE_ORDER])
+
+
+def batch_row(batch: dict, i: int) -> dict:
+    """Dict de features del juego i del lote, igual al que retorna build_features."""
+    out = {}
+    for k in (*FEATURE_ORDER, *_META):
+        v = batch[k][i]
+        out[k] = int(v) if k in _INT_FEATURES else float(v)
+    return out
@@ -1,11 +1,17 @@
 """
 src/ml/model.py
 ===============
-Carga el modelo ML serializado y expone predict().
+Carga el modelo ML serializado y expone predict() (un juego) y
+predict_many() (matriz N × features, vectorizado).
 Si no hay modelo entrenado, usa una heurística de fallback
 para que la app funcione desde el día 1.
 
-El modelo entrenado se guarda en src/ml/artifacts/model.joblib
+El modelo entrenado se guarda en src/ml/artifacts/model.joblib, y train.py
+exporta además model.npz (src/ml/compiled.py): el mismo ensemble como arrays
+NumPy. Si model.npz existe y no es más viejo que el joblib, se carga ese y la
+API no importa scikit-learn ni joblib al arrancar. El evaluador compilado gana
+en filas sueltas pero pierde en lotes grandes (≈2x más lento con 10k filas):
+predict_many usa el joblib desde SKLEARN_BATCH_MIN_ROWS filas si está disponible.
 """
 
 import logging
@@ -18,6 +24,37 @@ import numpy as np
 logger = logging.getLogger(__name__)
 
 ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), "artifacts", "model.joblib")
+COMPILED_PATH = os.path.splitext(ARTIFACT_PATH)[0] + ".npz"
+
+# Desde este tamaño de lote scikit-learn es más rápido que CompiledGBR
+# (python -m benchmarks.bench_model: empatan cerca de 200 filas)
+SKLEARN_BATCH_MIN_ROWS = 256
+
+# Razones de _interpret / _interpret_many
+_REASON_BIG_SALE    = "Descuento del {cut}% — precio cercano a su mínimo histórico."
+_REASON_MULTIPLE    = "Múltiples indicadores sugieren este es un buen momento de compra."
+_REASON_FAVORABLE   = "Las condiciones son favorables. Probablemente no habrá un mejor precio pronto."
+_REASON_SEASON_SOON = "Espera unos días — la temporada de rebajas de fin de año está cerca."
+_REASON_NEAR_AVG    = "El precio está cerca del promedio. Podrías obtenerlo más barato."
+_REASON_NOT_ON_SALE = "El juego no está en rebaja. Históricamente suele tener mejores descuentos."
+_REASON_WEAK_SALE   = "Este descuento es menor que los descuentos históricos típicos."
+
+
+def _round1(values: np.ndarray) -> np.ndarray:
+    """round(score, 1) de Python elemento a elemento (np.round difiere en los bordes)."""
+    return np.fromiter((round(v, 1) for v in values.tolist()), float, len(values))
+
+
+@dataclass
+class BatchPrediction:
+    """Resultado de predict_many: arrays paralelos, una posición por fila de X."""
+    score: np.ndarray       # (N,) float, 0–100
+    signal: np.ndarray      # (N,) "BUY" | "WAIT"
+    reason: np.ndarray      # (N,) str
+    confidence: np.ndarray  # (N,) float
+
+    def __len__(self) -> int:
+        return len(self.score)
 
 
 @dataclass
@@ -32,15 +69,21 @@ class PredictionResult:
 class SteamPriceModel:
     """
     Wrapper del modelo ML.
-    Primero intenta cargar el joblib; si no existe, usa la heurística.
+    Primero intenta cargar model.npz, luego el joblib; si no hay ninguno, usa la heurística.
     """
 
     def __init__(self):
         self._model = None
         self._scaler = None
+        self._compiled = False
+        # joblib para lotes grandes cuando se cargó el .npz: None = sin intentar,
+        # False = no disponible, (modelo, scaler) ya cargado
+        self._batch_model = None
         self._load()
 
     def _load(self):
+        if self._load_compiled():
+            return
         if not os.path.exists(ARTIFACT_PATH):
             logger.warning(
                 f"Modelo no encontrado en {ARTIFACT_PATH}. "
@@ -56,6 +99,26 @@ class SteamPriceModel:
         except Exception as e:
             logger.error(f"Error cargando modelo: {e}. Usando heurística.")
 
+    def _load_compiled(self) -> bool:
+        """model.npz si existe y no quedó atrás de un joblib reentrenado."""
+        if not os.path.exists(COMPILED_PATH):
+            return False
+        if os.path.exists(ARTIFACT_PATH) and os.path.getmtime(COMPILED_PATH) < os.path.getmtime(ARTIFACT_PATH):
+            logger.warning(f"{COMPILED_PATH} es anterior al joblib; se ignora. "
+                           "Regenéralo con python -m src.ml.compiled")
+            return False
+        try:
+            from src.ml.compiled import CompiledGBR
+            # Escala internamente: _scaler queda en None
+            self._model = CompiledGBR.load(COMPILED_PATH)
+            self._compiled = True
+            logger.info(f"Modelo ML compilado cargado desde artifacts/ "
+                        f"({self._model.n_trees} árboles)")
+            return True
+        except Exception as e:
+            logger.error(f"Error cargando modelo compilado: {e}. Probando con el joblib.")
+            return False
+
     def predict(self, features: dict) -> PredictionResult:
         """
         Genera una predicción dado el dict de features.
@@ -70,6 +133,46 @@ class SteamPriceModel:
         else:
             return self._heuristic(features)
 
+    def predict_many(self, X: np.ndarray) -> BatchPrediction:
+        """
+        Predicción para una matriz (N × features) en FEATURE_ORDER, p.ej. la de
+        features.features_matrix(). Mismo resultado que predict() fila por fila.
+        """
+        from src.ml.features import FEATURE_ORDER
+
+        X = np.asarray(X, dtype=float).reshape(-1, len(FEATURE_ORDER))
+        if self._model is not None and len(X):
+            try:
+                model, scaler = self._model_for_batch(len(X))
+                Xs = scaler.transform(X) if scaler else X
+                score = np.clip(np.asarray(model.predict(Xs), dtype=float), 0.0, 100.0)
+                signal, reason = self._interpret_many(score, X)
+                return BatchPrediction(score=_round1(score), signal=signal, reason=reason,
+                                       confidence=np.full(len(X), 0.85))
+            except Exception as e:
+                logger.error(f"Error en predicción con modelo: {e}. Fallback a heurística.")
+        return self._heuristic_many(X)
+
+    def _model_for_batch(self, rows: int) -> tuple:
+        """
+        (modelo, scaler) para un lote de `rows` filas. Con el .npz cargado y
+        rows >= SKLEARN_BATCH_MIN_ROWS usa el joblib (se carga una vez, la primera
+        vez que hace falta): mismas predicciones, pero recorre los árboles más rápido.
+        """
+        if not self._compiled or rows < SKLEARN_BATCH_MIN_ROWS:
+            return self._model, self._scaler
+        if self._batch_model is None:
+            self._batch_model = False
+            if os.path.exists(ARTIFACT_PATH):
+                try:
+                    import joblib
+                    artifact = joblib.load(ARTIFACT_PATH)
+                    self._batch_model = (artifact["model"], artifact["scaler"])
+                    logger.info("Modelo joblib cargado para predicciones en lote")
+                except Exception as e:
+                    logger.warning(f"Sin joblib para lotes grandes ({e}); se usa el modelo compilado")
+        return self._batch_model or (self._model, self._scaler)
+
     def _predict_with_model(self, vector: np.ndarray, features: dict) -> PredictionResult:
         try:
             X = vector.reshape(1, -1)
@@ -161,6 +264,42 @@ class SteamPriceModel:
             features_used=features,
         )
 
+    def _heuristic_many(self, X: np.ndarray) -> BatchPrediction:
+        """_heuristic vectorizado: mismas reglas sobre las columnas de X."""
+        (cut, days_since_min, price_ratio, _, _, _,
+         month, days_since_sale, sale_freq, trend) = X.T
+
+        score = np.full(len(X), 50.0)
+        score += np.select([cut >= 75, cut >= 50, cut >= 25, cut > 0], [35, 25, 12, 5], 0)
+        score += np.select([price_ratio < 0.6, price_ratio < 0.8, price_ratio > 1.1], [15, 8, -8], 0)
+        score += np.select([days_since_min < 30, days_since_min < 90], [20, 10], 0)
+        score += np.select([days_since_sale < 14, (days_since_sale > 300) & (sale_freq > 0.2)],
+                           [-5, 10], 0)
+        score += np.select([np.isin(month, (11, 12)), np.isin(month, (6, 7))], [8, 6], 0)
+        score += np.select([trend < -0.01, trend > 0.01], [5, -5], 0)
+
+        score = np.clip(score, 0.0, 100.0)
+        signal, reason = self._interpret_many(score, X)
+        return BatchPrediction(score=_round1(score), signal=signal, reason=reason,
+                               confidence=np.full(len(X), 0.6))
+
+    @staticmethod
+    def _interpret_many(score: np.ndarray, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """_interpret vectorizado. X en FEATURE_ORDER (descuento = columna 0, mes = columna 6)."""
+        cut, month = X[:, 0], X[:, 6]
+        signal = np.where(score >= 55, "BUY", "WAIT").astype(object)
+        big_sale = (score >= 75) & (cut >= 50)
+        reason = np.select(
+            [big_sale, score >= 75, score >= 55,
+             (score >= 40) & np.isin(month, (10, 11)), score >= 40, cut == 0],
+            ["", _REASON_MULTIPLE, _REASON_FAVORABLE,
+             _REASON_SEASON_SOON, _REASON_NEAR_AVG, _REASON_NOT_ON_SALE],
+            _REASON_WEAK_SALE,
+        ).astype(object)
+        for i in np.flatnonzero(big_sale):
+            reason[i] = _REASON_BIG_SALE.format(cut=int(cut[i]))
+        return signal, reason
+
     @staticmethod
     def _interpret(score: float, features: dict) -> tuple[str, str]:
         """Convierte el score numérico a señal + razón legible."""
@@ -170,24 +309,24 @@ class SteamPriceModel:
         if score >= 75:
             signal = "BUY"
             if cut >= 50:
-                reason = f"Descuento del {cut}% — precio cercano a su mínimo histórico."
+                reason = _REASON_BIG_SALE.format(cut=cut)
             else:
-                reason = "Múltiples indicadores sugieren este es un buen momento de compra."
+                reason = _REASON_MULTIPLE
         elif score >= 55:
             signal = "BUY"
-            reason = "Las condiciones son favorables. Probablemente no habrá un mejor precio pronto."
+            reason = _REASON_FAVORABLE
         elif score >= 40:
             signal = "WAIT"
             if month in (10, 11):
-                reason = "Espera unos días — la temporada de rebajas de fin de año está cerca."
+                reason = _REASON_SEASON_SOON
             else:
-                reason = "El precio está cerca del promedio. Podrías obtenerlo más barato."
+                reason = _REASON_NEAR_AVG
         else:
             signal = "WAIT"
             if cut == 0:
-                reason = "El juego no está en rebaja. Históricamente suele tener mejores descuentos."
+                reason = _REASON_NOT_ON_SALE
             else:
-                reason = "Este descuento es menor que los descuentos históricos típicos."
+                reason = _REASON_WEAK_SALE
 
         return signal, reason
 
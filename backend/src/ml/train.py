@@ -5,9 +5,13 @@ Script standalone para entrenar/reentrenar el modelo ML.
 
 Uso:
   python -m src.ml.train --db ./data/steamsense.duckdb
+  python -m src.ml.train --rebuild --stride-days 7 --horizon-days 30
 
-Lee datos de DuckDB, construye features para todos los juegos,
-entrena un modelo de regresión y serializa en artifacts/model.joblib.
+Genera (o reutiliza) el dataset point-in-time en Parquet (src/ml/dataset.py),
+entrena un modelo de regresión y serializa en artifacts/model.joblib. Después
+lo exporta a artifacts/model.npz (src/ml/compiled.py), que es lo que carga la API.
+El label es el precio mínimo de los próximos --horizon-days relativo al
+precio actual (100 = no hubo mejor precio).
 
 Requiere scikit-learn y joblib (incluidos en requirements.txt).
 """
@@ -17,71 +21,53 @@ import logging
 import os
 import sys
 
+from src.ml.dataset import DEFAULT_PATH, load_training_set, read_params, write_training_set
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("train")
 
 
-def train(db_path: str, output_path: str):
-    import duckdb
+def train(db_path: str, output_path: str, dataset_path: str = DEFAULT_PATH,
+          rebuild: bool = False, stride_days: int = 7, horizon_days: int = 30):
     import numpy as np
     import joblib
     from sklearn.ensemble import GradientBoostingRegressor
     from sklearn.preprocessing import StandardScaler
-    from sklearn.model_selection import train_test_split
+    from sklearn.model_selection import GroupShuffleSplit
     from sklearn.metrics import mean_absolute_error, r2_score
 
-    from src.ml.features import build_features, features_to_vector
-    from src.db import queries
-
-    logger.info(f"Conectando a DuckDB: {db_path}")
-    con = duckdb.connect(db_path)
-
-    # Obtener todos los game_ids que tienen historial
-    games = con.execute("""
-        SELECT DISTINCT game_id FROM price_history
-        GROUP BY game_id HAVING COUNT(*) >= 10
-    """).fetchdf()
+    # El dataset se genera una vez (point-in-time, ver src/ml/dataset.py); las
+    # siguientes corridas con los mismos parámetros leen el Parquet sin tocar DuckDB
+    wanted = {"stride_days": stride_days, "horizon_days": horizon_days}
+    stale = os.path.exists(dataset_path) and any(
+        read_params(dataset_path).get(k) != v for k, v in wanted.items())
+    if rebuild or stale or not os.path.exists(dataset_path):
+        import duckdb
 
-    logger.info(f"Juegos con historial suficiente: {len(games)}")
+        logger.info(f"Conectando a DuckDB: {db_path}")
+        con = duckdb.connect(db_path, read_only=True)
+        try:
+            write_training_set(con, dataset_path, stride_days=stride_days,
+                               horizon_days=horizon_days)
+        finally:
+            con.close()
+    else:
+        logger.info(f"Usando dataset existente: {dataset_path} (--rebuild para regenerarlo)")
 
-    X_rows = []
-    y_rows = []
+    X, y, groups = load_training_set(dataset_path)
 
-    for game_id in games["game_id"]:
-        try:
-            stats = queries.get_price_stats(con, game_id)
-            history = queries.get_price_history(con, game_id)
-            seasonal = queries.get_seasonal_patterns(con, game_id)
-
-            if not stats or not history:
-                continue
-
-            # El "label" es el descuento máximo que tuvo el juego
-            # (proxy de qué tan bien le fue comprando en ese momento)
-            max_cut = float(stats.get("max_discount") or 0)
-
-            # Simular features en diferentes puntos del tiempo (data augmentation)
-            for i in range(len(history) - 1, max(len(history) - 10, 0), -2):
-                partial_history = history[:i+1]
-                feats = build_features(stats, partial_history, seasonal)
-                if feats:
-                    X_rows.append(features_to_vector(feats))
-                    y_rows.append(max_cut)
-
-        except Exception as e:
-            logger.warning(f"Error procesando {game_id}: {e}")
-            continue
-
-    if len(X_rows) < 20:
-        logger.error(f"Datos insuficientes para entrenar ({len(X_rows)} muestras). Necesitas más datos en DuckDB.")
+    if len(X) < 20:
+        logger.error(f"Datos insuficientes para entrenar ({len(X)} muestras). Necesitas más datos en DuckDB.")
         sys.exit(1)
 
-    X = np.array(X_rows)
-    y = np.array(y_rows)
+    logger.info(f"Dataset: {X.shape[0]} muestras, {X.shape[1]} features, "
+                f"{len(np.unique(groups))} juegos")
 
-    logger.info(f"Dataset: {X.shape[0]} muestras, {X.shape[1]} features")
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Split por juego: las muestras de un mismo juego en fechas vecinas son casi
+    # iguales, así que mezclarlas entre train y test inflaría las métricas
+    splitter = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+    train_idx, test_idx = next(splitter.split(X, y, groups))
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
 
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
@@ -106,7 +92,24 @@ def train(db_path: str, output_path: str):
     joblib.dump({"model": model, "scaler": scaler}, output_path)
     logger.info(f"Modelo guardado en: {output_path}")
 
-    con.close()
+    export_compiled(model, scaler, X_test, os.path.splitext(output_path)[0] + ".npz")
+
+
+def export_compiled(model, scaler, X_check, path: str):
+    """
+    Exporta a .npz y verifica que CompiledGBR dé exactamente lo mismo que el
+    modelo sobre X_check (sin escalar). Si no, borra el .npz y la API usa el joblib.
+    """
+    from src.ml.compiled import export_model, verify_export
+
+    try:
+        export_model(model, scaler, path)
+        verify_export(path, model, scaler, X_check)
+        logger.info(f"Modelo compilado verificado en {len(X_check)} muestras: {path}")
+    except Exception as e:
+        logger.error(f"No se pudo exportar el modelo compilado: {e}")
+        if os.path.exists(path):
+            os.remove(path)
 
 
 if __name__ == "__main__":
@@ -115,5 +118,9 @@ if __name__ == "__main__":
     parser.add_argument("--output", default=os.path.join(
         os.path.dirname(__file__), "artifacts", "model.joblib"
     ))
+    parser.add_argument("--dataset", default=DEFAULT_PATH, help="Parquet del dataset de entrenamiento")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerar el dataset desde DuckDB")
+    parser.add_argument("--stride-days", type=int, default=7, help="Días entre muestras de un juego")
+    parser.add_argument("--horizon-days", type=int, default=30, help="Horizonte del label (días)")
     args = parser.parse_args()
-    train(args.db, args.output)
+    train(args.db, args.output, args.dataset, args.rebuild, args.stride_days, args.horizon_days)
@@ -9,7 +9,7 @@ from fastapi.responses import RedirectResponse
 from config import get_settings
 from src.api.steam_auth import get_openid_redirect_url, verify_openid_response, create_jwt
 from src.api.steam_client import get_steam_client
-from src.db.connection import get_db
+from src.db.writer import get_writer
 from src.db import user_queries
 
 logger = logging.getLogger(__name__)
@@ -48,8 +48,8 @@ async def steam_callback(request: Request):
     profile_url  = profile.get("profileurl", "") if profile else ""
 
     # Guardar/actualizar usuario en DB
-    con = get_db()
-    user_queries.upsert_user(con, steam_id, display_name, avatar_url, profile_url)
+    await get_writer().run(user_queries.upsert_user, steam_id, display_name,
+                           avatar_url, profile_url)
 
     # Emitir JWT
     token = create_jwt(steam_id, display_name, avatar_url)
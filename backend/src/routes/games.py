@@ -1,11 +1,18 @@
 """
 src/routes/games.py
 """
+import asyncio
+import base64
+import json
 import logging
+from datetime import datetime
+from typing import Literal, Optional
+
 from fastapi import APIRouter, HTTPException, Query
-from src.db.connection import get_db
+from src.db.connection import db_cursor
 from src.db import queries
-from src.api.client import ITADClient
+from src.api.client import get_client
+from src.services import search_index
 from config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -13,55 +20,99 @@ settings = get_settings()
 router = APIRouter(prefix="/games", tags=["games"])
 
 
+def _known_games(game_ids: list[str]) -> dict[str, dict]:
+    with db_cursor() as con:
+        return queries.get_games_by_ids(con, game_ids)
+
+
 @router.get("/search")
-async def search_games(q: str, limit: int = Query(20, ge=1, le=50)):
-    """Busca juegos por nombre en ITAD. Enriquece con appid desde DB local si existe."""
+async def search_games(
+    q: str,
+    limit: int = Query(20, ge=1, le=50),
+    remote: bool = Query(False, description="Consultar ITAD aunque haya resultados locales"),
+):
+    """
+    Busca juegos por nombre. Primero en el índice local de títulos (juegos ya
+    rastreados, con appid); solo si no hay resultados se consulta ITAD.
+    """
     if not q or len(q.strip()) < 2:
         return []
+    index = search_index.get_index()
+    if not remote:
+        await index.refresh_if_stale()
+        local = index.search(q, limit=limit)
+        if local:
+            return [{"id": g["id"], "slug": g["slug"], "title": g["title"],
+                     "type": None, "appid": g["appid"]} for g in local]
     try:
-        async with ITADClient(settings.itad_api_key) as client:
-            results = await client.search_games(q.strip(), limit=limit)
-
-        # FIX: enriquecer resultados con appid desde nuestra DB local.
-        # Así el frontend puede mostrar la imagen de Steam en el dropdown.
-        con = get_db()
-        enriched = []
-        for r in results:
-            appid = None
-            try:
-                game = queries.get_game(con, r.id)
-                if game:
-                    appid = game.get("appid")
-            except Exception:
-                pass
-            enriched.append({
-                "id":    r.id,
-                "slug":  r.slug,
-                "title": r.title,
-                "type":  r.type,
-                "appid": appid,
-            })
-        return enriched
+        results = await get_client().search_games(q.strip(), limit=limit)
+
+        # Enriquecer con appid desde la DB local (una sola consulta para todo el lote),
+        # así el frontend puede mostrar la imagen de Steam en el dropdown.
+        known = await asyncio.to_thread(_known_games, [r.id for r in results])
+        return [{
+            "id":    r.id,
+            "slug":  r.slug,
+            "title": r.title,
+            "type":  r.type,
+            "appid": (known.get(r.id) or {}).get("appid"),
+        } for r in results]
 
     except Exception as e:
         logger.error(f"Search error: {e}")
         return []
 
 
+def _encode_cursor(sort: str, after: tuple) -> str:
+    key, game_id = after
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps({"s": sort, "k": key, "id": game_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(sort: str, token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        if data["s"] != sort:
+            raise ValueError("sort distinto")
+        key = data["k"]
+        if sort == "last_seen":
+            key = datetime.fromisoformat(key)
+        return key, str(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor 'after' inválido para este orden")
+
+
 @router.get("")
-def list_games(limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    con = get_db()
-    return {"games": queries.list_games(con, limit=limit, offset=offset)}
+def list_games(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    sort: Literal["records", "title", "last_seen", "max_discount", "score"] = Query("records"),
+    after: Optional[str] = Query(None, description="Cursor 'next' de la página anterior"),
+):
+    """
+    Listado paginado de juegos. Para recorrer páginas pasar `after` con el valor
+    `next` de la respuesta anterior (keyset); `offset` se mantiene por compatibilidad.
+    """
+    cursor = _decode_cursor(sort, after) if after else None
+    with db_cursor() as con:
+        games, next_after = queries.list_games_page(con, limit=limit, sort=sort,
+                                                    after=cursor, offset=offset)
+    return {
+        "games": games,
+        "next":  _encode_cursor(sort, next_after) if next_after else None,
+    }
 
 
 @router.get("/{game_id}")
 def get_game(game_id: str):
-    con = get_db()
-    game = queries.get_game(con, game_id)
-    if not game:
+    with db_cursor() as con:
+        bundle = queries.get_game_bundle(con, game_id)
+    if not bundle:
         raise HTTPException(status_code=404, detail="Game not found")
-    stats    = queries.get_price_stats(con, game_id)
-    seasonal = queries.get_seasonal_patterns(con, game_id)
+    game, stats, seasonal = bundle["game"], bundle["stats"], bundle["seasonal"]
     return {
         "id":                game["id"],
         "title":             game["title"],
@@ -76,41 +127,24 @@ def get_game(game_id: str):
 async def get_current_prices(game_id: str):
     """Precios actuales de todas las tiendas vía ITAD."""
     try:
-        async with ITADClient(settings.itad_api_key) as client:
-            import httpx
-            async with httpx.AsyncClient(timeout=15) as http:
-                r = await http.post(
-                    f"{settings.itad_base_url}/games/prices/v3",
-                    params={"country": settings.itad_country},
-                    json=[game_id],
-                    headers={
-                        "Authorization": f"Bearer {settings.itad_api_key}",
-                        "Content-Type": "application/json",
-                    }
-                )
-                if r.status_code != 200:
-                    logger.warning(f"ITAD prices/v3 HTTP {r.status_code}: {r.text[:200]}")
-                    return {"game_id": game_id, "prices": []}
-                data = r.json()
-
-            prices = []
-            items = data if isinstance(data, list) else data.get("list", [])
-            for item in items:
-                for deal in item.get("deals", []):
-                    shop        = deal.get("shop", {})
-                    price_obj   = deal.get("price", {})
-                    regular_obj = deal.get("regular", {})
-                    prices.append({
-                        "shop_name":   shop.get("name", "Unknown"),
-                        "shop_id":     shop.get("id"),
-                        "price_usd":   price_obj.get("amount", 0),
-                        "regular_usd": regular_obj.get("amount", 0),
-                        "cut_pct":     deal.get("cut", 0),
-                        "url":         deal.get("url", ""),
-                        "drm":         deal.get("drm", []),
-                    })
-            prices.sort(key=lambda x: x["price_usd"])
-            return {"game_id": game_id, "prices": prices}
+        items = await get_client().get_current_prices([game_id])
+        prices = []
+        for item in items:
+            for deal in item.get("deals", []):
+                shop        = deal.get("shop", {})
+                price_obj   = deal.get("price", {})
+                regular_obj = deal.get("regular", {})
+                prices.append({
+                    "shop_name":   shop.get("name", "Unknown"),
+                    "shop_id":     shop.get("id"),
+                    "price_usd":   price_obj.get("amount", 0),
+                    "regular_usd": regular_obj.get("amount", 0),
+                    "cut_pct":     deal.get("cut", 0),
+                    "url":         deal.get("url", ""),
+                    "drm":         deal.get("drm", []),
+                })
+        prices.sort(key=lambda x: x["price_usd"])
+        return {"game_id": game_id, "prices": prices}
 
     except Exception as e:
         logger.error(f"current-prices error para {game_id}: {e}")
@@ -119,11 +153,11 @@ async def get_current_prices(game_id: str):
 
 @router.get("/top/deals")
 def top_deals(limit: int = Query(12, ge=1, le=100)):  # FIX: le=50 → le=100
-    con = get_db()
-    return {"deals": queries.get_top_deals(con, limit=limit)}
+    with db_cursor() as con:
+        return {"deals": queries.get_top_deals(con, limit=limit)}
 
 
 @router.get("/top/buy")
 def top_buy_signals(limit: int = Query(12, ge=1, le=100)):  # FIX: le=50 → le=100
-    con = get_db()
-    return {"signals": queries.get_best_predictions(con, signal="BUY", limit=limit)}
\ No newline at end of file
+    with db_cursor() as con:
+        return {"signals": queries.get_best_predictions(con, signal="BUY", limit=limit)}
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+src/routes/jobs.py
+==================
+Estado de los trabajos en segundo plano (cola persistente de job_service).
+"""
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from src.services import job_service
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+_JobStatus = Literal["queued", "running", "done", "failed"]
+_ItemStatus = Literal["pending", "done", "skipped", "failed"]
+
+
+@router.get("")
+def list_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    status: Optional[_JobStatus] = None,
+    kind: Optional[str] = None,
+):
+    """Trabajos recientes, el más nuevo primero."""
+    return {"jobs": job_service.list_jobs(limit=limit, status=status, kind=kind)}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    """Estado, intentos, progreso (done_items/total_items) y resultado de un trabajo."""
+    job = job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/items")
+def get_job_items(
+    job_id: str,
+    status: Optional[_ItemStatus] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    """Checkpoints por ítem (appid, game_id...) con su último error."""
+    if not job_service.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id,
+            "items": job_service.get_job_items(job_id, status=status, limit=limit, offset=offset)}
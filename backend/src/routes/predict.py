@@ -4,10 +4,13 @@ src/routes/predict.py
 Endpoints de predicción ML.
 """
 
+import logging
+
 from fastapi import APIRouter, HTTPException, Query
 
-from src.services import predict_service
+from src.services import predict_service, refresh_scheduler
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/predict", tags=["predict"])
 
 
@@ -25,6 +28,7 @@ def predict(
     - reason: explicación legible
     - price_context: precio actual vs histórico
     """
+    refresh_scheduler.record_predict_hit(game_id)
     try:
         return predict_service.get_prediction(game_id, force_refresh=force_refresh)
     except ValueError as e:
@@ -36,23 +40,19 @@ def predict_batch(limit: int = Query(100, ge=1, le=500)):
     """
     Genera predicciones para todos los juegos que tienen historial suficiente.
     Necesario para poblar Hot Deals y BUY Signals.
+    500 si falla el lote completo (modelo o escritura).
     """
-    from src.db.connection import get_db
+    from src.db.connection import db_cursor
     from src.db import queries as q
 
-    con = get_db()
-    games = q.list_games(con, limit=limit, offset=0)
-    results = {"ok": 0, "skipped": 0, "errors": 0}
-
-    for game in games:
-        game_id = game["id"]
-        if not game.get("total_records") or game["total_records"] < 3:
-            results["skipped"] += 1
-            continue
-        try:
-            predict_service.get_prediction(game_id, force_refresh=False)
-            results["ok"] += 1
-        except Exception as e:
-            results["errors"] += 1
-
-    return {"status": "done", **results}
+    with db_cursor() as con:
+        games = q.list_games(con, limit=limit, offset=0)
+    ids = [g["id"] for g in games if (g.get("total_records") or 0) >= 3]
+    try:
+        done = predict_service.predict_games(ids, force_refresh=False)
+    except Exception as e:
+        logger.exception(f"Error en predicción batch de {len(ids)} juegos")
+        raise HTTPException(status_code=500, detail=f"Predicción batch falló: {e}")
+
+    return {"status": "done", "ok": len(done),
+            "skipped": len(games) - len(ids), "errors": len(ids) - len(done)}
@@ -5,7 +5,7 @@ Endpoints de historial y estadísticas de precios.
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
@@ -19,10 +19,19 @@ def price_history(
     game_id: str,
     since: Optional[datetime] = Query(None, description="Fecha inicio (ISO 8601)"),
     until: Optional[datetime] = Query(None, description="Fecha fin (ISO 8601)"),
+    resolution: Literal["raw", "daily", "weekly", "auto"] = Query(
+        "raw", description="raw = registros; daily/weekly = rollups; auto = según max_points"),
+    max_points: Optional[int] = Query(
+        None, ge=10, le=10_000, description="Máximo de puntos (reduce con LTTB)"),
 ):
-    """Historial completo de precios de un juego."""
+    """
+    Historial de precios de un juego.
+    En daily/weekly cada punto es un bucket: price_usd = mínimo del período,
+    cut_pct = mayor descuento, más price_max / price_avg / samples.
+    """
     try:
-        return price_service.get_game_history(game_id, since=since, until=until)
+        return price_service.get_game_history(game_id, since=since, until=until,
+                                              resolution=resolution, max_points=max_points)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -1,7 +1,12 @@
 """src/routes/stats.py — Dashboard stats"""
 from fastapi import APIRouter
-from src.db.connection import get_db
+from src.api.rate_limit import limiter_metrics
+from src.api.singleflight import singleflight_metrics
+from src.db.connection import db_cursor, pool_metrics
+from src.db.writer import writer_metrics
 from src.db import queries
+from src.services.lookup_service import lookup_metrics
+from src.services.search_index import get_index
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
@@ -9,5 +14,22 @@ router = APIRouter(prefix="/stats", tags=["stats"])
 @router.get("/overview")
 def overview():
     """Stats globales: total juegos, registros, señales."""
-    con = get_db()
-    return queries.get_overview_stats(con)
+    with db_cursor() as con:
+        return queries.get_overview_stats(con)
+
+
+@router.get("/db")
+def db_pool():
+    """Métricas del pool de cursores (lecturas) y del writer único (escrituras)."""
+    return {"pool": pool_metrics(), "writer": writer_metrics()}
+
+
+@router.get("/itad")
+def itad_rate_limit():
+    """
+    Limitador compartido de ITAD (req/s logrados, throttling 429/503, concurrencia)
+    aciertos del cache appid → ITAD, llamadas coalescidas (single-flight) y
+    búsquedas resueltas por el índice local de títulos sin llamar a ITAD.
+    """
+    return {**limiter_metrics(), "lookup_cache": lookup_metrics(),
+            "singleflight": singleflight_metrics(), "search_index": get_index().metrics()}
@@ -4,62 +4,81 @@ src/routes/sync.py
 Endpoints para sincronizar datos de precios desde ITAD y SteamSpy.
 """
 import logging
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks
-from src.services import sync_service
+from fastapi import APIRouter, HTTPException, Query
+from src.services import job_service, refresh_scheduler, sync_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/sync", tags=["sync"])
 
 
+_FULL_REFRESH = Query(False, description="Ignorar el último registro guardado y pedir todo el historial")
+
+
 @router.post("/game/{appid}")
-async def sync_game_by_appid(appid: int):
+async def sync_game_by_appid(appid: int, full_refresh: bool = _FULL_REFRESH):
     """Sincroniza un juego por Steam appid. Usado por EmptyStateWithSeed."""
-    result = await sync_service.sync_by_appid(appid)
+    result = await sync_service.sync_by_appid(appid, full_refresh=full_refresh)
     if result["status"] == "not_found":
         raise HTTPException(status_code=404, detail=f"appid {appid} no encontrado en ITAD")
+    if result["status"] == "failed":
+        raise HTTPException(status_code=502, detail=f"ITAD no devolvió el historial de appid {appid}")
     return result
 
 
 @router.post("/id/{game_id:path}")
-async def sync_game_by_id(game_id: str):
+async def sync_game_by_id(game_id: str, full_refresh: bool = _FULL_REFRESH):
     """Sincroniza un juego por ITAD game_id. Llamado desde GameSearch."""
-    result = await sync_service.sync_by_game_id(game_id)
+    result = await sync_service.sync_by_game_id(game_id, full_refresh=full_refresh)
+    if result["status"] == "failed":
+        raise HTTPException(status_code=502, detail=f"ITAD no devolvió el historial de {game_id}")
     return result
 
 
 @router.post("/top")
 async def sync_top_games(
-    background_tasks: BackgroundTasks,
     top_n: int = Query(100, ge=10, le=500),
+    full_refresh: bool = _FULL_REFRESH,
 ):
-    """Sincroniza los top N juegos de SteamSpy en segundo plano."""
-    background_tasks.add_task(sync_service.sync_top_games, top_n)
-    return {"status": "started", "message": f"Sincronizando top {top_n} juegos en segundo plano"}
+    """
+    Encola el sync de los top N juegos de SteamSpy (cola persistente, ver /jobs/{id}).
+    Incremental por defecto: cada juego pide solo lo posterior a su último registro.
+    Mientras haya un sync de top activo se devuelve ese mismo trabajo.
+    """
+    job = await job_service.enqueue("sync_top", {"top_n": top_n, "full_refresh": full_refresh},
+                                    dedupe_key="sync_top")
+    return {"status": job["status"], "job_id": job["id"], "deduplicated": job["deduplicated"],
+            "message": f"Sincronizando top {top_n} juegos en segundo plano"}
+
+
+@router.get("/status")
+def sync_status():
+    """Contadores por etapa (fetch/normalize/write) del último sync de top juegos."""
+    return sync_service.sync_status()
+
+
+@router.get("/schedule")
+def refresh_schedule(limit: int = Query(20, ge=1, le=200)):
+    """Presupuesto ITAD del scheduler de refresco y los próximos juegos por prioridad."""
+    return refresh_scheduler.scheduler_status(limit)
+
+
+@router.post("/tier")
+async def tier_history(hot_days: int = Query(None, ge=30, description="Días que quedan en DuckDB")):
+    """Mueve el historial anterior al horizonte caliente a Parquet (tier frío)."""
+    from config import get_settings
+    from src.db import queries
+    from src.db.writer import get_writer
+
+    settings = get_settings()
+    return await get_writer().run(
+        queries.tier_price_history, settings.cold_storage_path,
+        hot_days if hot_days is not None else settings.hot_history_days,
+    )
 
 
 @router.post("/predictions")
-async def generate_all_predictions(
-    background_tasks: BackgroundTasks,
-    limit: int = Query(200, ge=1, le=1000),
-):
-    """Genera predicciones ML para todos los juegos con historial suficiente."""
-    async def do_batch():
-        from src.db.connection import get_db
-        from src.db import queries
-        from src.services import predict_service
-        con = get_db()
-        games = queries.list_games(con, limit=limit, offset=0)
-        ok = skipped = errors = 0
-        for game in games:
-            if not game.get("total_records") or game["total_records"] < 3:
-                skipped += 1
-                continue
-            try:
-                predict_service.get_prediction(game["id"], force_refresh=False)
-                ok += 1
-            except Exception:
-                errors += 1
-        logger.info(f"Batch predictions done: {ok} ok / {skipped} skipped / {errors} errors")
-
-    background_tasks.add_task(do_batch)
-    return {"status": "started", "message": f"Generating predictions for up to {limit} games"}
+async def generate_all_predictions(limit: int = Query(200, ge=1, le=1000)):
+    """Encola predicciones ML para todos los juegos con historial suficiente."""
+    job = await job_service.enqueue("predictions", {"limit": limit}, dedupe_key="predictions")
+    return {"status": job["status"], "job_id": job["id"], "deduplicated": job["deduplicated"],
+            "message": f"Generating predictions for up to {limit} games"}
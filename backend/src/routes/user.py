@@ -7,13 +7,15 @@ FIXES sobre el original:
   - Wishlist: detecta perfil privado y retorna sync_meta con feedback
   - Library sync background: genera predicciones post-sync
 """
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from src.api.steam_auth import decode_jwt
 from src.api.steam_client import get_steam_client, _get_key
-from src.db.connection import get_db
+from src.db.connection import db_cursor
+from src.db.writer import get_writer
 from src.db import user_queries
-from src.services import sync_service
+from src.services import job_service, lookup_service, sync_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/me", tags=["user"])
@@ -36,74 +38,50 @@ def _check_steam_key():
         raise HTTPException(status_code=503, detail=str(e))
 
 
+# Lecturas de DuckDB de los handlers async: van a un thread, fuera del event loop
+def _read_library(steam_id: str) -> tuple[list, dict]:
+    with db_cursor() as con:
+        return (user_queries.get_user_library(con, steam_id),
+                user_queries.get_library_stats(con, steam_id))
+
+
+def _read_wishlist(steam_id: str) -> list:
+    with db_cursor() as con:
+        return user_queries.get_user_wishlist_with_prices(con, steam_id)
+
+
 @router.get("/library")
 async def get_library(request: Request, sync: bool = False):
     steam_id = _get_steam_id(request)
-    con = get_db()
 
     if sync:
         try:
             steam = get_steam_client()
             games = await steam.get_owned_games(steam_id)
             if games:
-                n = user_queries.sync_user_library(con, steam_id, games)
+                n = await get_writer().run(user_queries.sync_user_library, steam_id, games)
                 logger.info(f"Sync directo: {n} juegos para {steam_id}")
             else:
                 logger.warning(f"get_owned_games retornó 0 juegos para {steam_id}")
         except Exception as e:
             logger.error(f"Error sync librería: {e}")
 
-    library = user_queries.get_user_library(con, steam_id)
-    stats   = user_queries.get_library_stats(con, steam_id)
+    library, stats = await asyncio.to_thread(_read_library, steam_id)
     return {"steam_id": steam_id, "stats": stats, "games": library}
 
 
 @router.post("/library/sync")
-async def sync_library(request: Request, background_tasks: BackgroundTasks):
+async def sync_library(request: Request):
     steam_id = _get_steam_id(request)
     _check_steam_key()
-
-    async def do_sync():
-        try:
-            con = get_db()
-            steam = get_steam_client()
-            games = await steam.get_owned_games(steam_id)
-            if games:
-                n = user_queries.sync_user_library(con, steam_id, games)
-                logger.info(f"Background sync OK: {n} juegos para {steam_id}")
-                # FIX: generar predicciones para juegos del usuario que ya tienen historial
-                await _generate_predictions_for_user(con, steam_id)
-            else:
-                logger.warning(f"Background sync: 0 juegos — perfil privado o key inválida")
-        except Exception as e:
-            logger.error(f"Background sync falló: {e}")
-
-    background_tasks.add_task(do_sync)
-    return {"status": "syncing", "message": "Library sync started"}
-
-
-async def _generate_predictions_for_user(con, steam_id: str):
-    """Genera predicciones para los juegos del usuario que tengan historial en DB."""
-    try:
-        from src.services import predict_service
-        library = user_queries.get_user_library(con, steam_id)
-        ok = 0
-        for g in library:
-            if g.get("game_id") and g.get("total_records", 0) >= 3:
-                try:
-                    predict_service.get_prediction(g["game_id"], force_refresh=False)
-                    ok += 1
-                except Exception:
-                    pass
-        logger.info(f"Predicciones generadas para {ok} juegos de {steam_id}")
-    except Exception as e:
-        logger.warning(f"Error generando predicciones post-sync: {e}")
+    job = await job_service.enqueue("library_sync", {"steam_id": steam_id},
+                                    dedupe_key=f"library_sync:{steam_id}")
+    return {"status": "syncing", "message": "Library sync started", "job_id": job["id"]}
 
 
 @router.get("/wishlist")
 async def get_wishlist(request: Request, sync: bool = False):
     steam_id = _get_steam_id(request)
-    con = get_db()
 
     # FIX: metadata de sync para informar al frontend qué pasó
     sync_meta = {
@@ -139,48 +117,57 @@ async def get_wishlist(request: Request, sync: bool = False):
                 sync_meta["items_found"] = 0
             else:
                 sync_meta["items_found"] = len(items)
-                n_imported = user_queries.sync_user_wishlist(con, steam_id, items)
+                n_imported = await get_writer().run(user_queries.sync_user_wishlist,
+                                                    steam_id, items)
                 sync_meta["items_imported"] = n_imported
                 sync_meta["synced"] = True
                 logger.info(f"Wishlist Steam: {len(items)} items, {n_imported} importados para {steam_id}")
 
-                # Sync precio + predicción para top 15 items
-                synced = 0
-                for item in items[:15]:
+                # Sync precio + predicción para top 15 items. Un lookup bulk
+                # resuelve sus appids de una vez; sync_by_appid los toma del cache.
+                top_items = [i for i in items[:15] if i.get("appid")]
+                try:
+                    await lookup_service.resolve_appids(
+                        [i["appid"] for i in top_items],
+                        titles={i["appid"]: i.get("title") for i in top_items})
+                except Exception as e:
+                    logger.debug(f"Wishlist lookup bulk error: {e}")
+                synced = []
+                for item in top_items:
                     if item.get("appid"):
                         try:
                             result = await sync_service.sync_by_appid(item["appid"])
-                            if result.get("inserted", 0) > 0:
-                                synced += 1
-                                from src.services import predict_service
-                                if result.get("game_id"):
-                                    try:
-                                        predict_service.get_prediction(result["game_id"], force_refresh=True)
-                                    except Exception:
-                                        pass
+                            if result.get("inserted", 0) > 0 and result.get("game_id"):
+                                synced.append(result["game_id"])
                         except Exception as e:
                             logger.debug(f"Wishlist item sync error appid={item['appid']}: {e}")
-                logger.info(f"Wishlist ITAD sync: {synced} juegos con datos nuevos")
+                if synced:
+                    from src.services import predict_service
+                    try:
+                        await asyncio.to_thread(predict_service.predict_games, synced, True)
+                    except Exception as e:
+                        logger.debug(f"Wishlist predicciones error: {e}")
+                logger.info(f"Wishlist ITAD sync: {len(synced)} juegos con datos nuevos")
 
         except Exception as e:
             logger.error(f"Error sync wishlist: {e}")
             sync_meta["error"] = f"Error inesperado: {str(e)[:100]}"
 
-    wishlist = user_queries.get_user_wishlist_with_prices(con, steam_id)
+    wishlist = await asyncio.to_thread(_read_wishlist, steam_id)
     return {"steam_id": steam_id, "wishlist": wishlist, "sync_meta": sync_meta}
 
 
 @router.get("/recommendations")
 def get_recommendations(request: Request, limit: int = 12):
     steam_id = _get_steam_id(request)
-    con = get_db()
-    recs = user_queries.get_recommendations(con, steam_id, limit=limit)
+    with db_cursor() as con:
+        recs = user_queries.get_recommendations(con, steam_id, limit=limit)
     return {"steam_id": steam_id, "recommendations": recs}
 
 
 @router.get("/owned/{appid}")
 def check_owned(request: Request, appid: int):
     steam_id = _get_steam_id(request)
-    con = get_db()
-    owned = appid in user_queries.get_user_owned_appids(con, steam_id)
+    with db_cursor() as con:
+        owned = appid in user_queries.get_user_owned_appids(con, steam_id)
     return {"appid": appid, "owned": owned}
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+src/services/downsample.py
+==========================
+Largest-Triangle-Three-Buckets (LTTB) para reducir series de precios a N puntos
+conservando la forma visual (picos de ofertas incluidos).
+
+Referencia: Steinarsson, "Downsampling Time Series for Visual Representation" (2013).
+"""
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Índices de los n_out puntos elegidos por LTTB (ordenados, incluyen primero y último).
+    x debe ser creciente. Si la serie ya tiene n_out puntos o menos, retorna todos.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets sobre los puntos interiores [1, n-1); el último "siguiente" es el punto final
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = edges[i + 1], edges[i + 2]
+        xc = x[nxt_start:nxt_end].mean()
+        yc = y[nxt_start:nxt_end].mean()
+
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - xc) * (ys - y[a]) - (x[a] - xs) * (yc - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
@@ -0,0 +1,335 @@
+"""
+src/services/job_service.py
+===========================
+Cola persistente de trabajos en segundo plano sobre DuckDB (tablas jobs / job_items).
+
+Reemplaza a BackgroundTasks para /sync/top, /sync/predictions y /me/library/sync
+(y ejecuta los refrescos de refresh_scheduler):
+  - el trabajo queda en la tabla antes de responder → sobrevive reinicios
+  - cada ítem (appid, game_id, steam_id) se marca al terminar → al reanudar tras
+    una caída solo se procesan los pendientes
+  - fallos → reintento con backoff exponencial hasta JOB_MAX_ATTEMPTS
+  - dedupe_key: encolar dos veces lo mismo devuelve el trabajo ya activo
+  - progreso y resultado en GET /jobs/{id}
+
+El worker corre en el proceso de la API: DuckDB permite un solo proceso con el
+archivo abierto en escritura, así que un worker aparte no podría escribir
+mientras la API está arriba. Lo que se desacopla es el ciclo de vida del request.
+
+Uso:
+    job = await enqueue("sync_top", {"top_n": 100}, dedupe_key="sync_top")
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from config import get_settings
+from src.db import job_queries
+from src.db.connection import db_cursor
+from src.db.writer import get_writer
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Ítems de predicción procesados por checkpoint
+PREDICTION_CHUNK = 500
+_MAX_BACKOFF_S = 3600
+
+
+def _read(fn, *args, **kwargs):
+    """fn(con, ...) con un cursor del pool (para asyncio.to_thread)."""
+    with db_cursor() as con:
+        return fn(con, *args, **kwargs)
+
+
+class JobContext:
+    """
+    Vista del trabajo en curso para su handler: ítems pendientes y checkpoints.
+    El handler corre en el event loop de la API: las lecturas van a un thread.
+    """
+
+    def __init__(self, job: dict):
+        self.job = job
+        self.id = job["id"]
+        self.params = job.get("params") or {}
+        self.failed = 0
+
+    async def has_items(self) -> bool:
+        return await asyncio.to_thread(_read, job_queries.count_job_items, self.id) > 0
+
+    async def add_items(self, items: list[tuple[str, Optional[str]]]):
+        await get_writer().run(job_queries.add_job_items, self.id, items)
+
+    async def pending_items(self) -> list[dict]:
+        return await asyncio.to_thread(_read, job_queries.get_pending_items, self.id)
+
+    async def mark(self, seqs: list[int], status: str, error: Optional[str] = None):
+        if status == "failed":
+            self.failed += len(seqs)
+        await get_writer().run(job_queries.mark_job_items, self.id, seqs, status, error)
+
+
+Handler = Callable[[JobContext], Awaitable[dict]]
+HANDLERS: dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# ── API ───────────────────────────────────────────────────────────────────────
+
+_wake: Optional[asyncio.Event] = None
+_workers: list[asyncio.Task] = []
+_stopping = False
+
+
+async def enqueue(kind: str, params: Optional[dict] = None,
+                  dedupe_key: Optional[str] = None) -> dict:
+    """Registra un trabajo y despierta al worker. Retorna la fila de jobs."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    job = await get_writer().run(job_queries.create_job, uuid.uuid4().hex, kind,
+                                 params or {}, settings.job_max_attempts, dedupe_key)
+    if _wake is not None:
+        _wake.set()
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with db_cursor() as con:
+        job = job_queries.get_job(con, job_id)
+        if job:
+            job["items"] = job_queries.get_job_item_counts(con, job_id)
+    return job
+
+
+def list_jobs(limit: int = 50, status: Optional[str] = None, kind: Optional[str] = None) -> list[dict]:
+    with db_cursor() as con:
+        return job_queries.list_jobs(con, limit=limit, status=status, kind=kind)
+
+
+def get_job_items(job_id: str, status: Optional[str] = None,
+                  limit: int = 100, offset: int = 0) -> list[dict]:
+    with db_cursor() as con:
+        return job_queries.get_job_items(con, job_id, status=status, limit=limit, offset=offset)
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+
+def _backoff(attempts: int) -> float:
+    return min(_MAX_BACKOFF_S, settings.job_retry_base_seconds * 2 ** max(0, attempts - 1))
+
+
+async def _retry_or_fail(job: dict, error: str):
+    writer = get_writer()
+    if job["attempts"] < job["max_attempts"]:
+        delay = _backoff(job["attempts"])
+        await writer.run(job_queries.retry_job, job["id"], delay, error, job["max_attempts"])
+        logger.warning(f"Trabajo {job['kind']} {job['id']}: intento {job['attempts']} falló "
+                       f"({error}) — reintento en {delay:.0f}s")
+    else:
+        await writer.run(job_queries.finish_job, job["id"], "failed", None, error)
+        logger.error(f"Trabajo {job['kind']} {job['id']} falló tras {job['attempts']} intentos: {error}")
+
+
+async def _run_job(job: dict):
+    fn = HANDLERS.get(job["kind"])
+    if fn is None:
+        await get_writer().run(job_queries.finish_job, job["id"], "failed", None,
+                               f"Tipo de trabajo desconocido: {job['kind']}")
+        return
+    ctx = JobContext(job)
+    logger.info(f"Trabajo {job['kind']} {job['id']} — intento {job['attempts']}/{job['max_attempts']}")
+    try:
+        result = await fn(ctx)
+    except asyncio.CancelledError:
+        # Apagado: el trabajo queda 'running' y se reencola al arrancar
+        raise
+    except Exception as e:
+        await _retry_or_fail(job, str(e)[:500])
+        return
+    if ctx.failed and job["attempts"] < job["max_attempts"]:
+        await _retry_or_fail(job, f"{ctx.failed} ítems fallidos")
+        return
+    await get_writer().run(job_queries.finish_job, job["id"], "done", result, None)
+    logger.info(f"Trabajo {job['kind']} {job['id']} terminado")
+
+
+async def _worker_loop(n: int):
+    # _stopping además de cancel(): en Python 3.11 wait_for se traga la cancelación
+    # si _wake se marca en el mismo instante (p.ej. un enqueue justo antes de apagar)
+    while not _stopping:
+        try:
+            job = await get_writer().run(job_queries.claim_next_job)
+        except Exception as e:
+            logger.error(f"Worker {n}: no se pudo reclamar trabajo: {e}")
+            job = None
+        if job is None:
+            _wake.clear()
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=settings.job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _run_job(job)
+
+
+async def start_job_worker():
+    """Reencola lo que quedó corriendo tras una caída y lanza los workers."""
+    global _wake, _stopping
+    _stopping = False
+    requeued = await get_writer().run(job_queries.requeue_running_jobs)
+    if requeued:
+        logger.info(f"Trabajos reanudados tras reinicio: {requeued}")
+    _wake = asyncio.Event()
+    for n in range(settings.job_workers):
+        _workers.append(asyncio.create_task(_worker_loop(n), name=f"job-worker-{n}"))
+    logger.info(f"Cola de trabajos iniciada ({settings.job_workers} worker/s)")
+
+
+async def stop_job_worker():
+    global _stopping
+    _stopping = True
+    if _wake is not None:
+        _wake.set()
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+# ── Handlers ──────────────────────────────────────────────────────────────────
+
+@handler("sync_top")
+async def _sync_top(ctx: JobContext) -> dict:
+    """Sync de top N de SteamSpy con checkpoint por appid."""
+    from src.api.steam_client import get_steam_client
+    from src.services import sync_service
+
+    if not settings.itad_api_key:
+        raise ValueError("ITAD_API_KEY no configurada")
+    if not await ctx.has_items():
+        apps = await sync_service.get_top_apps(await get_steam_client().http(),
+                                               ctx.params.get("top_n", 100))
+        if not apps:
+            raise RuntimeError("SteamSpy no devolvió juegos")
+        await ctx.add_items([(str(a), name) for a, name in apps.items()])
+
+    pending = await ctx.pending_items()
+    seq_of = {int(it["item"]): it["seq"] for it in pending}
+    reported: set[int] = set()
+
+    async def checkpoint(appids: list[int], status: str, error: Optional[str]):
+        reported.update(appids)
+        await ctx.mark([seq_of[a] for a in appids if a in seq_of], status, error)
+
+    summary = await sync_service.sync_apps(
+        {int(it["item"]): it["label"] for it in pending},
+        full_refresh=bool(ctx.params.get("full_refresh")),
+        checkpoint=checkpoint,
+    )
+    # Appids que fallaron dentro de una etapa del pipeline
+    lost = [seq for a, seq in seq_of.items() if a not in reported]
+    if lost:
+        await ctx.mark(lost, "failed", "error en el pipeline")
+    summary.pop("synced", None)
+    summary.pop("pipeline", None)
+    return summary
+
+
+@handler("predictions")
+async def _predictions(ctx: JobContext) -> dict:
+    """Predicciones en lote (predict_games) para juegos con historial, checkpoint cada PREDICTION_CHUNK."""
+    from src.db import queries
+    from src.services import predict_service
+
+    if not await ctx.has_items():
+        games = await asyncio.to_thread(_read, queries.list_games,
+                                        limit=ctx.params.get("limit", 200), offset=0)
+        items = [(g["id"], g.get("title")) for g in games if (g.get("total_records") or 0) >= 3]
+        if not items:
+            return {"ok": 0, "errors": 0}
+        await ctx.add_items(items)
+
+    def predict_chunk(chunk: list[dict]) -> tuple[list[int], list[int]]:
+        try:
+            done = set(predict_service.predict_games([it["item"] for it in chunk]))
+        except Exception as e:
+            logger.error(f"Predicciones en lote: {e}")
+            done = set()
+        ok = [it["seq"] for it in chunk if it["item"] in done]
+        failed = [it["seq"] for it in chunk if it["item"] not in done]
+        return ok, failed
+
+    pending = await ctx.pending_items()
+    n_ok = n_err = 0
+    for i in range(0, len(pending), PREDICTION_CHUNK):
+        ok, failed = await asyncio.to_thread(predict_chunk, pending[i:i + PREDICTION_CHUNK])
+        await ctx.mark(ok, "done")
+        await ctx.mark(failed, "failed", "predicción falló")
+        n_ok += len(ok)
+        n_err += len(failed)
+    logger.info(f"Batch predictions done: {n_ok} ok / {n_err} errors")
+    return {"ok": n_ok, "errors": n_err}
+
+
+@handler("library_sync")
+async def _library_sync(ctx: JobContext) -> dict:
+    """Librería Steam del usuario + predicciones de sus juegos con historial."""
+    from src.api.steam_client import get_steam_client
+    from src.db import user_queries
+    from src.services import predict_service
+
+    steam_id = ctx.params["steam_id"]
+    if not await ctx.has_items():
+        await ctx.add_items([(steam_id, None)])
+    pending = await ctx.pending_items()
+    if not pending:
+        return {"games": 0}
+
+    games = await get_steam_client().get_owned_games(steam_id)
+    if not games:
+        logger.warning(f"Sync librería: 0 juegos — perfil privado o key inválida")
+        await ctx.mark([pending[0]["seq"]], "skipped", "sin juegos visibles")
+        return {"games": 0, "predictions": 0}
+    n = await get_writer().run(user_queries.sync_user_library, steam_id, games)
+    predictions = await asyncio.to_thread(predict_service.predict_user_library, steam_id)
+    await ctx.mark([pending[0]["seq"]], "done")
+    logger.info(f"Sync librería OK: {n} juegos para {steam_id}")
+    return {"games": n, "predictions": predictions}
+
+
+@handler("refresh")
+async def _refresh(ctx: JobContext) -> dict:
+    """Refresco programado (refresh_scheduler): historial de juegos conocidos, checkpoint por game_id."""
+    from src.db import queries
+    from src.services import sync_service
+
+    if not await ctx.has_items():
+        await ctx.add_items([(gid, None) for gid in ctx.params.get("game_ids", [])])
+    pending = await ctx.pending_items()
+    seq_of = {it["item"]: it["seq"] for it in pending}
+    games = await asyncio.to_thread(_read, queries.get_games_by_ids, list(seq_of))
+    gone = [seq for gid, seq in seq_of.items() if gid not in games]
+    if gone:
+        await ctx.mark(gone, "skipped", "juego eliminado")
+    reported: set[str] = set()
+
+    async def checkpoint(game_ids: list[str], status: str, error: Optional[str]):
+        reported.update(game_ids)
+        await ctx.mark([seq_of[g] for g in game_ids if g in seq_of], status, error)
+
+    summary = await sync_service.sync_games(list(games.values()), checkpoint=checkpoint)
+    lost = [seq_of[g] for g in games if g not in reported]
+    if lost:
+        await ctx.mark(lost, "failed", "error en el pipeline")
+    summary.pop("synced", None)
+    summary.pop("pipeline", None)
+    summary.pop("not_in_itad", None)
+    return summary
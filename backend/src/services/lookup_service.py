@@ -0,0 +1,149 @@
+"""
+src/services/lookup_service.py
+==============================
+Resolución Steam appid → ITAD game_id con cache persistente (itad_lookup_cache).
+
+  - aciertos vigentes ITAD_LOOKUP_TTL_DAYS; "no existe" ITAD_LOOKUP_MISS_TTL_HOURS
+  - los errores de red no se cachean (se reintenta en el próximo sync)
+  - varios appids → un POST /lookup/id/shop/61/v1 por cada BULK_CHUNK appids;
+    título y slug salen de la tabla games o de los títulos que trae el llamador;
+    el bulk no trae slug, así que un juego nuevo queda con slug None (upsert_game
+    no pisa un slug existente con None)
+  - las lecturas de DuckDB corren en un thread, fuera del event loop
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from config import get_settings
+from src.api.client import get_client
+from src.db import queries
+from src.db.connection import db_cursor
+from src.db.writer import get_writer
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+BULK_CHUNK = 200
+
+_stats = {
+    "cache_hits":     0,
+    "cache_negative": 0,   # "no existe" vigentes: no se vuelve a consultar a ITAD
+    "bulk_requests":  0,
+    "single_lookups": 0,
+    "info_lookups":   0,
+    "not_found":      0,   # nuevos "no existe" guardados
+    "errors":         0,   # appids sin resolver por error (no cacheados)
+}
+
+
+def lookup_metrics() -> dict:
+    return dict(_stats)
+
+
+def _read_cache(appids: list[int]) -> dict[int, Optional[tuple[str, Optional[str], str]]]:
+    with db_cursor() as con:
+        cached = queries.get_cached_lookups(con, appids, settings.itad_lookup_ttl_days,
+                                            settings.itad_lookup_miss_ttl_hours)
+    negative = sum(1 for v in cached.values() if v is None)
+    _stats["cache_negative"] += negative
+    _stats["cache_hits"] += len(cached) - negative
+    return cached
+
+
+def _known_games(game_ids: list[str]) -> dict[str, dict]:
+    with db_cursor() as con:
+        return queries.get_games_by_ids(con, game_ids)
+
+
+async def _store(fresh: dict[int, Optional[tuple[str, str, str]]]):
+    if not fresh:
+        return
+    _stats["not_found"] += sum(1 for v in fresh.values() if v is None)
+    try:
+        await get_writer().run(queries.upsert_lookup_cache, fresh)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el cache de lookup: {e}")
+
+
+async def resolve_appid(appid: int) -> Optional[tuple[str, str, str]]:
+    """(game_id, slug, title) de un appid, usando el cache. None si ITAD no lo conoce."""
+    appid = int(appid)
+    cached = await asyncio.to_thread(_read_cache, [appid])
+    if appid in cached:
+        return cached[appid]
+    _stats["single_lookups"] += 1
+    game, definitive = await get_client().lookup_game_status(appid)
+    if definitive:
+        await _store({appid: game})
+    else:
+        _stats["errors"] += 1
+    return game
+
+
+async def resolve_appids(appids: list[int],
+                         titles: Optional[dict[int, str]] = None) -> dict[int, Optional[tuple[str, str, str]]]:
+    """
+    Resuelve un lote de appids. Retorna {appid: (game_id, slug, title) | None};
+    los appids que fallaron por error no aparecen.
+    `titles` (appid → nombre, p.ej. de SteamSpy o la wishlist) evita pedir
+    /games/info para juegos nuevos.
+    """
+    titles = titles or {}
+    appids = list(dict.fromkeys(int(a) for a in appids))
+    result = await asyncio.to_thread(_read_cache, appids)
+    pending = [a for a in appids if a not in result]
+    if not pending:
+        return result
+
+    client = get_client()
+    ids: dict[int, Optional[str]] = {}
+    fallback: list[int] = []
+    for i in range(0, len(pending), BULK_CHUNK):
+        chunk = pending[i:i + BULK_CHUNK]
+        _stats["bulk_requests"] += 1
+        found = await client.lookup_appids_bulk(chunk)
+        if found is None:
+            fallback.extend(chunk)
+        else:
+            ids.update(found)
+
+    fresh: dict[int, Optional[tuple[str, str, str]]] = {}
+    known = await asyncio.to_thread(_known_games, [g for g in ids.values() if g])
+    need_info = []
+    for appid, gid in ids.items():
+        if gid is None:
+            fresh[appid] = None
+        elif gid in known:
+            fresh[appid] = (gid, known[gid].get("slug"), known[gid]["title"])
+        elif titles.get(appid):
+            fresh[appid] = (gid, None, titles[appid])
+        else:
+            need_info.append((appid, gid))
+
+    # Sin título conocido → /games/info; si el bulk falló → lookup individual.
+    # La concurrencia real la limita el limitador global de ITAD.
+    if need_info:
+        _stats["info_lookups"] += len(need_info)
+        infos = await asyncio.gather(*(client.get_game_info(gid) for _, gid in need_info))
+        for (appid, gid), info in zip(need_info, infos):
+            if info:
+                fresh[appid] = info
+            else:
+                # Sin título no se cachea ni se sincroniza: se reintenta en el próximo sync
+                _stats["errors"] += 1
+    if fallback:
+        _stats["single_lookups"] += len(fallback)
+        found = await asyncio.gather(*(client.lookup_game_status(a) for a in fallback))
+        for appid, (game, definitive) in zip(fallback, found):
+            if definitive:
+                fresh[appid] = game
+            else:
+                _stats["errors"] += 1
+
+    await _store(fresh)
+    result.update(fresh)
+    logger.info(f"Lookup ITAD: {len(appids)} appids — {len(appids) - len(pending)} desde cache, "
+                f"{len(fresh)} resueltos ({sum(1 for v in fresh.values() if v is None)} sin ITAD)")
+    return result
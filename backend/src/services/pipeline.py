@@ -0,0 +1,196 @@
+"""
+src/services/pipeline.py
+========================
+Pipeline async por etapas conectadas con asyncio.Queue acotadas.
+
+Cada etapa tiene N workers que toman un ítem de su cola de entrada, lo procesan
+(`fn(item)` async) y ponen el resultado en la cola de la etapa siguiente.
+Las colas acotadas dan backpressure: si la escritura se atrasa, el fetch se
+frena en vez de acumular respuestas en memoria.
+
+Una etapa con `batch_size` acumula ítems y llama a fn(lista) cuando la suma de
+`size(item)` llega a batch_size, o tras `flush_after` segundos sin ítems nuevos.
+
+Uso:
+    p = Pipeline("sync", queue_size=32)
+    p.stage("lookup", lookup, concurrency=8)
+    p.stage("fetch",  fetch,  concurrency=4)
+    p.stage("write",  write,  batch_size=5000, size=lambda it: it["rows"])
+    await p.run(appids)
+    p.metrics()
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """Una etapa del pipeline y sus contadores."""
+
+    def __init__(self, name: str, fn: Callable[..., Awaitable], concurrency: int = 1,
+                 batch_size: Optional[int] = None, size: Optional[Callable] = None,
+                 flush_after: float = 0.5):
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.size = size or (lambda _: 1)
+        self.flush_after = flush_after
+        self.queue: Optional[asyncio.Queue] = None
+        # contadores
+        self.items_in = 0
+        self.items_out = 0
+        self.calls = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def metrics(self) -> dict:
+        """
+        items_per_s: ítems procesados / tiempo de vida de la etapa.
+        utilization: tiempo en fn / (tiempo de vida × workers). La etapa cuello de
+        botella tiene utilización ~1 y la cola de entrada llena.
+        """
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "stage":       self.name,
+            "concurrency": self.concurrency,
+            "in":          self.items_in,
+            "out":         self.items_out,
+            "calls":       self.calls,
+            "errors":      self.errors,
+            "busy_s":      round(self.busy, 3),
+            "items_per_s": round(self.items_in / elapsed, 2) if elapsed > 0 else 0.0,
+            "utilization": round(self.busy / (elapsed * self.concurrency), 3) if elapsed > 0 else 0.0,
+            "queued":      self.queue.qsize() if self.queue is not None else 0,
+        }
+
+    async def _call(self, arg):
+        self.calls += 1
+        t0 = time.monotonic()
+        try:
+            return await self.fn(arg)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Pipeline etapa '{self.name}': {e}")
+            return None
+        finally:
+            self.busy += time.monotonic() - t0
+
+    async def _emit(self, result, outq: Optional[asyncio.Queue]):
+        if result is None or outq is None:
+            return
+        self.items_out += 1
+        await outq.put(result)
+
+    async def _worker(self, outq: Optional[asyncio.Queue]):
+        while True:
+            item = await self.queue.get()
+            if item is _DONE:
+                return
+            self.items_in += 1
+            await self._emit(await self._call(item), outq)
+
+    async def _batch_worker(self, outq: Optional[asyncio.Queue]):
+        buf, size = [], 0
+
+        async def flush():
+            nonlocal buf, size
+            if buf:
+                batch, buf, size = buf, [], 0
+                await self._emit(await self._call(batch), outq)
+
+        while True:
+            try:
+                if buf:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=self.flush_after)
+                else:
+                    item = await self.queue.get()
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if item is _DONE:
+                await flush()
+                return
+            self.items_in += 1
+            buf.append(item)
+            size += self.size(item)
+            if size >= self.batch_size:
+                await flush()
+
+
+class Pipeline:
+    def __init__(self, name: str, queue_size: int = 32):
+        self.name = name
+        self.queue_size = max(1, queue_size)
+        self.stages: list[Stage] = []
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def stage(self, name: str, fn: Callable[..., Awaitable], concurrency: int = 1,
+              batch_size: Optional[int] = None, size: Optional[Callable] = None,
+              flush_after: float = 0.5) -> "Pipeline":
+        self.stages.append(Stage(name, fn, concurrency, batch_size, size, flush_after))
+        return self
+
+    async def run(self, items: Iterable):
+        """Alimenta `items` a la primera etapa y espera a que todas terminen."""
+        if not self.stages:
+            return
+        self.started = time.monotonic()
+        for st in self.stages:
+            st.queue = asyncio.Queue(maxsize=self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._run_stage(i))
+            for i in range(len(self.stages))
+        ]
+        try:
+            first = self.stages[0]
+            for item in items:
+                await first.queue.put(item)
+            for _ in range(first.concurrency):
+                await first.queue.put(_DONE)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+        finally:
+            self.finished = time.monotonic()
+
+    async def _run_stage(self, i: int):
+        st = self.stages[i]
+        nxt = self.stages[i + 1] if i + 1 < len(self.stages) else None
+        outq = nxt.queue if nxt else None
+        worker = st._batch_worker if st.batch_size else st._worker
+
+        st.started = time.monotonic()
+        await asyncio.gather(*(worker(outq) for _ in range(st.concurrency)))
+        st.finished = time.monotonic()
+        # Cuando todos los workers terminaron, se cierra la etapa siguiente
+        if nxt:
+            for _ in range(nxt.concurrency):
+                await outq.put(_DONE)
+
+    def metrics(self) -> dict:
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "pipeline":  self.name,
+            "running":   self.started is not None and self.finished is None,
+            "elapsed_s": round(elapsed, 3),
+            "stages":    [st.metrics() for st in self.stages],
+        }
@@ -5,9 +5,11 @@ import logging
 import math
 from typing import Optional
 
-from src.db import queries
-from src.db.connection import get_db
-from src.ml.features import build_features
+from src.db import queries, user_queries
+from src.db.connection import db_cursor
+from src.db.writer import get_writer, log_failure
+from src.ml.features import (batch_row, build_features_batch, build_features_from_state,
+                              features_matrix)
 from src.ml.model import get_model, PredictionResult
 
 logger = logging.getLogger(__name__)
@@ -21,48 +23,105 @@ def _san(v):
 
 
 def get_prediction(game_id: str, force_refresh: bool = False) -> dict:
-    con = get_db()
+    with db_cursor() as con:
+        return _get_prediction(con, game_id, force_refresh)
 
-    game = queries.get_game(con, game_id)
-    if not game:
-        raise ValueError(f"Juego no encontrado: {game_id}")
 
+def _get_prediction(con, game_id: str, force_refresh: bool) -> dict:
     # Try cache first
     if not force_refresh:
         cached = queries.get_cached_prediction(con, game_id, CACHE_MAX_AGE_HOURS)
         if cached:
             logger.debug(f"Cache hit para game_id={game_id}")
-            # Still need price context — fetch it fresh
-            stats = queries.get_price_stats(con, game_id)
-            history = queries.get_price_history(con, game_id)
-            last = history[-1] if history else {}
-            return _format_from_cache(game, cached, stats, last)
+            # Still need price context — fetch it fresh (sin historial: basta el último registro)
+            bundle = queries.get_game_bundle(con, game_id)
+            if not bundle:
+                raise ValueError(f"Juego no encontrado: {game_id}")
+            return _format_from_cache(bundle["game"], cached, bundle["stats"], bundle["last"])
 
-    # Full recalculation
-    stats    = queries.get_price_stats(con, game_id)
-    history  = queries.get_price_history(con, game_id)
-    seasonal = queries.get_seasonal_patterns(con, game_id)
-
-    if not history or len(history) < 3:
-        raise ValueError(f"Historial insuficiente ({len(history or [])} registros). Mínimo 3.")
+    # Full recalculation: features desde game_feature_state (sin leer el historial)
+    game = queries.get_game(con, game_id)
+    if not game:
+        raise ValueError(f"Juego no encontrado: {game_id}")
+    state = queries.get_feature_state(con, [game_id], min_records=0)
+    total = int(state["total_records"][0]) if len(state["game_id"]) else 0
+    if total < 3:
+        raise ValueError(f"Historial insuficiente ({total} registros). Mínimo 3.")
 
-    features = build_features(stats, history, seasonal)
+    features = build_features_from_state(state)
     if not features:
         raise ValueError("No se pudieron construir features de predicción")
 
     model  = get_model()
     result: PredictionResult = model.predict(features)
 
-    queries.upsert_prediction(
-        con, game_id=game_id, score=result.score, signal=result.signal,
-        reason=result.reason,
+    # La respuesta no espera al COMMIT: el writer agrupa las predicciones encoladas
+    fut = get_writer().submit(
+        queries.upsert_prediction, game_id=game_id, score=result.score,
+        signal=result.signal, reason=result.reason,
         features={k: v for k, v in features.items() if not k.startswith("_")},
     )
+    log_failure(fut, f"upsert_prediction game_id={game_id}")
 
     return _format_response(game, result.score, result.signal, result.reason,
                             result.confidence, features, from_cache=False)
 
 
+def predict_games(game_ids: list[str], force_refresh: bool = False) -> list[str]:
+    """
+    Predicciones en lote: features de todos los juegos desde game_feature_state
+    (build_features_batch), model.predict_many sobre la matriz y un solo upsert
+    en predictions_cache. Sin force_refresh, los juegos con predicción en cache
+    vigente no se recalculan.
+
+    Retorna los game_id que quedan con predicción (nueva o de cache); los que
+    faltan no tienen historial suficiente (3+ registros).
+    """
+    game_ids = list(dict.fromkeys(game_ids))
+    if not game_ids:
+        return []
+    with db_cursor() as con:
+        fresh = set() if force_refresh else queries.get_fresh_prediction_ids(
+            con, game_ids, CACHE_MAX_AGE_HOURS)
+        todo = [g for g in game_ids if g not in fresh]
+        inputs = queries.get_feature_state(con, todo) if todo else None
+    if not todo:
+        return game_ids
+
+    batch = build_features_batch(inputs)
+    preds = get_model().predict_many(features_matrix(batch))
+    rows = []
+    for i, gid in enumerate(batch["game_id"]):
+        features = batch_row(batch, i)
+        rows.append({
+            "game_id":  gid,
+            "score":    float(preds.score[i]),
+            "signal":   preds.signal[i],
+            "reason":   preds.reason[i],
+            "features": {k: v for k, v in features.items() if not k.startswith("_")},
+        })
+    get_writer().run_sync(queries.upsert_predictions, rows)
+
+    done = fresh | {r["game_id"] for r in rows}
+    logger.debug(f"Predicciones en lote: {len(rows)} calculadas, {len(fresh)} desde cache")
+    return [g for g in game_ids if g in done]
+
+
+def predict_user_library(steam_id: str) -> int:
+    """Genera predicciones para los juegos del usuario que tengan historial en DB."""
+    with db_cursor() as con:
+        library = user_queries.get_user_library(con, steam_id)
+    ids = [g["game_id"] for g in library
+           if g.get("game_id") and g.get("total_records", 0) >= 3]
+    try:
+        ok = len(predict_games(ids))
+    except Exception as e:
+        logger.error(f"Predicciones de la librería de {steam_id}: {e}")
+        ok = 0
+    logger.info(f"Predicciones generadas para {ok} juegos de {steam_id}")
+    return ok
+
+
 def _format_from_cache(game: dict, cached: dict, stats: Optional[dict], last_record: dict) -> dict:
     current_price = _san(float(last_record.get("price_usd", 0) or 0)) or 0
     cut_pct       = int(last_record.get("cut_pct", 0) or 0)
@@ -2,61 +2,97 @@
 src/services/price_service.py
 """
 import logging
-import math
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
+import numpy as np
+
 from src.db import queries
-from src.db.connection import get_db
+from src.db.connection import db_cursor
+from src.services.downsample import lttb
 
 logger = logging.getLogger(__name__)
 
 
-def _clean(d: dict) -> dict:
-    return {k: (None if isinstance(v, float) and (math.isnan(v) or math.isinf(v)) else v)
-            for k, v in d.items()}
+DEFAULT_MAX_POINTS = 1000
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _pick_resolution(summary: Optional[dict], max_points: int,
+                     since: Optional[datetime], until: Optional[datetime]) -> str:
+    """
+    Resolución más fina que cabe en max_points: raw si el juego tiene pocos
+    registros, daily si la ventana tiene menos días que puntos, si no weekly.
+    """
+    if not summary or (summary.get("total_records") or 0) <= max_points:
+        return "raw"
+    start = since or summary.get("first_seen")
+    end   = until or summary.get("last_seen")
+    if start and end and (end - start).days + 1 <= max_points:
+        return "daily"
+    return "weekly"
 
 
 def get_game_history(game_id: str, since: Optional[datetime] = None,
-                     until: Optional[datetime] = None) -> dict:
-    con = get_db()
-    game = queries.get_game(con, game_id)
-    if not game:
-        raise ValueError(f"Juego no encontrado: {game_id}")
+                     until: Optional[datetime] = None, resolution: str = "raw",
+                     max_points: Optional[int] = None) -> dict:
+    """
+    Historial de precios para gráficos.
+      resolution: raw | daily | weekly | auto (elige según max_points)
+      max_points: si la serie tiene más puntos, se reduce con LTTB
+    Solo se construyen dicts para los puntos que se devuelven.
+    """
+    since, until = _naive_utc(since), _naive_utc(until)
+    if resolution == "auto" and not max_points:
+        max_points = DEFAULT_MAX_POINTS
 
-    history = queries.get_price_history(con, game_id, since=since, until=until)
+    with db_cursor() as con:
+        game = queries.get_game(con, game_id)
+        if not game:
+            raise ValueError(f"Juego no encontrado: {game_id}")
+        if resolution == "auto":
+            summary = queries.get_price_summary(con, game_id)
+            resolution = _pick_resolution(summary, max_points, since, until)
+        series = queries.get_price_series(con, game_id, resolution, since=since, until=until)
 
-    cleaned = []
-    for record in history:
-        r = _clean(record)
-        ts = r.get("timestamp")
-        if isinstance(ts, datetime):
-            r["timestamp"] = ts.isoformat()
-        cleaned.append(r)
+    total = len(series["timestamp"])
+    if max_points and total > max_points:
+        x = series["timestamp"].astype("datetime64[s]").astype(np.float64)
+        idx = lttb(x, series["price_usd"], max_points)
+        series = {k: v[idx] for k, v in series.items()}
+
+    series["timestamp"] = np.datetime_as_string(series["timestamp"], unit="s")
+    keys = list(series)
+    history = [dict(zip(keys, row)) for row in zip(*(series[k].tolist() for k in keys))]
 
     # Return empty history without raising — game page handles it gracefully
     return {
-        "game_id": game_id,
-        "title":   game.get("title"),
-        "appid":   game.get("appid"),
-        "count":   len(cleaned),
-        "history": cleaned,
+        "game_id":      game_id,
+        "title":        game.get("title"),
+        "appid":        game.get("appid"),
+        "resolution":   resolution,
+        "total_points": total,
+        "count":        len(history),
+        "history":      history,
     }
 
 
 def get_game_stats(game_id: str) -> dict:
-    con = get_db()
-    game = queries.get_game(con, game_id)
-    if not game:
+    with db_cursor() as con:
+        bundle = queries.get_game_bundle(con, game_id)
+    if not bundle:
         raise ValueError(f"Juego no encontrado: {game_id}")
-
-    stats    = queries.get_price_stats(con, game_id)
-    seasonal = queries.get_seasonal_patterns(con, game_id)
+    game, stats, seasonal = bundle["game"], bundle["stats"], bundle["seasonal"]
 
     return {
         "game_id":          game_id,
         "title":            game.get("title"),
         "appid":            game.get("appid"),
-        "stats":            _clean(stats) if stats else None,
-        "seasonal_patterns": [_clean(s) for s in seasonal],
+        "stats":            stats,
+        "seasonal_patterns": seasonal,
     }
@@ -0,0 +1,203 @@
+"""
+src/services/refresh_scheduler.py
+=================================
+Scheduler de refresco: reparte un presupuesto fijo de requests a ITAD por hora
+(REFRESH_BUDGET_PER_HOUR) entre los juegos que más ganan con un refresco.
+
+Cada REFRESH_INTERVAL_SECONDS arma una cola de prioridad con los juegos
+rastreados cuyos datos tienen al menos REFRESH_MIN_AGE_HOURS y encola un
+trabajo 'refresh' con los primeros (un request de historial por juego):
+
+    prioridad = antigüedad (días) × demanda × temporada
+
+  - antigüedad: desde GREATEST(last_seen del historial, último refresco)
+  - demanda:    1 + 2·wishlists + owners + ln(1 + hits recientes de /predict)
+  - temporada:  × SALE_SEASON_BOOST dentro de una rebaja de Steam conocida (o en
+                los SALE_LEAD_DAYS previos), × (1 + descuento histórico del juego
+                en el mes actual)
+
+Los hits de /predict se cuentan en memoria con decaimiento exponencial (vida
+media PREDICT_HITS_HALF_LIFE_H): se pierden al reiniciar, lo que solo afecta
+al orden de los primeros refrescos. Lo ya gastado en la última hora se lee
+de la tabla jobs, así que un reinicio no duplica el presupuesto.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from config import get_settings
+from src.db import queries
+from src.db.connection import db_cursor
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Rebajas de Steam recurrentes (aprox.): (nombre, (mes, día) inicio, (mes, día) fin)
+SALE_SEASONS = (
+    ("spring", (3, 14),  (3, 21)),
+    ("summer", (6, 26),  (7, 10)),
+    ("autumn", (11, 26), (12, 3)),
+    ("winter", (12, 19), (1, 2)),
+)
+SALE_LEAD_DAYS = 3
+SALE_SEASON_BOOST = 2.0
+PREDICT_HITS_HALF_LIFE_H = 24.0
+# Juegos sin ningún dato (nunca refrescados) cuentan con esta antigüedad
+_MAX_AGE_DAYS = 30.0
+
+
+# ── Demanda: hits de /predict ─────────────────────────────────────────────────
+
+_hits: dict[str, tuple[float, float]] = {}   # game_id → (hits decaídos, time.monotonic())
+_hits_lock = threading.Lock()
+
+
+def _decayed(value: float, since: float, now: float) -> float:
+    return value * 0.5 ** ((now - since) / 3600 / PREDICT_HITS_HALF_LIFE_H)
+
+
+def record_predict_hit(game_id: str):
+    """Cuenta una consulta a /predict/{game_id} (señal de demanda del juego)."""
+    now = time.monotonic()
+    with _hits_lock:
+        value, since = _hits.get(game_id, (0.0, now))
+        _hits[game_id] = (_decayed(value, since, now) + 1.0, now)
+
+
+def predict_hits() -> dict[str, float]:
+    now = time.monotonic()
+    with _hits_lock:
+        # Se descartan los que ya decayeron a nada para que el dict no crezca sin límite
+        for gid in [g for g, (v, t) in _hits.items() if _decayed(v, t, now) < 0.01]:
+            del _hits[gid]
+        return {gid: _decayed(v, t, now) for gid, (v, t) in _hits.items()}
+
+
+# ── Prioridad ─────────────────────────────────────────────────────────────────
+
+def sale_season(today: date) -> Optional[str]:
+    """Nombre de la rebaja de Steam en curso (o que empieza en SALE_LEAD_DAYS), si hay."""
+    for name, start, end in SALE_SEASONS:
+        for year in (today.year - 1, today.year, today.year + 1):
+            first = date(year, *start) - timedelta(days=SALE_LEAD_DAYS)
+            last = date(year + (1 if end < start else 0), *end)
+            if first <= today <= last:
+                return name
+    return None
+
+
+def _priority(game: dict, hits: float, now: datetime, season_boost: float) -> dict:
+    data_at = game["data_at"]
+    age_days = _MAX_AGE_DAYS if data_at is None else (now - data_at).total_seconds() / 86400
+    demand = 1 + 2 * game["wishlists"] + game["owners"] + math.log1p(hits)
+    season = season_boost * (1 + float(game["month_cut"]) / 100)
+    return {
+        "game_id":   game["game_id"],
+        "title":     game["title"],
+        "score":     round(age_days * demand * season, 4),
+        "age_days":  round(age_days, 2),
+        "demand":    round(demand, 3),
+        "season":    round(season, 3),
+        "wishlists": game["wishlists"],
+        "owners":    game["owners"],
+        "predict_hits": round(hits, 2),
+    }
+
+
+def build_queue(limit: int) -> list[dict]:
+    """Los `limit` juegos de mayor prioridad, de mayor a menor."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    boost = SALE_SEASON_BOOST if sale_season(now.date()) else 1.0
+    with db_cursor() as con:
+        games = queries.get_refresh_candidates(con, settings.refresh_min_age_hours, now.month)
+    hits = predict_hits()
+    ranked = (_priority(g, hits.get(g["game_id"], 0.0), now, boost) for g in games)
+    return heapq.nlargest(limit, ranked, key=lambda p: p["score"])
+
+
+def spent_last_hour() -> int:
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+    with db_cursor() as con:
+        return queries.get_refresh_spend(con, since)
+
+
+def _tick_allowance() -> int:
+    """Requests disponibles en este tick: la parte del presupuesto que toca, sin pasar del saldo horario."""
+    budget = settings.refresh_budget_per_hour
+    share = math.ceil(budget * settings.refresh_interval_seconds / 3600)
+    return max(0, min(share, budget - spent_last_hour()))
+
+
+# ── Bucle ─────────────────────────────────────────────────────────────────────
+
+_task: Optional[asyncio.Task] = None
+_state = {"ticks": 0, "last_tick": None, "last_job_id": None, "last_enqueued": 0}
+
+
+async def tick() -> Optional[dict]:
+    """Una vuelta del scheduler: encola el refresco de los juegos prioritarios."""
+    from src.services import job_service
+
+    _state["ticks"] += 1
+    _state["last_tick"] = datetime.now(timezone.utc).isoformat()
+    allowance = await asyncio.to_thread(_tick_allowance)
+    if allowance <= 0:
+        return None
+    queue = await asyncio.to_thread(build_queue, allowance)
+    if not queue:
+        return None
+    # dedupe: si el refresco anterior sigue activo no se encola (ni se gasta) otro
+    job = await job_service.enqueue("refresh", {"game_ids": [p["game_id"] for p in queue]},
+                                    dedupe_key="refresh")
+    if job["deduplicated"]:
+        return None
+    _state["last_job_id"] = job["id"]
+    _state["last_enqueued"] = len(queue)
+    logger.info(f"Refresco programado: {len(queue)} juegos encolados (job {job['id']})")
+    return job
+
+
+async def _loop():
+    while True:
+        try:
+            await tick()
+        except Exception as e:
+            logger.error(f"Scheduler de refresco: {e}")
+        await asyncio.sleep(settings.refresh_interval_seconds)
+
+
+def start_refresh_scheduler():
+    global _task
+    if not settings.itad_api_key or settings.refresh_budget_per_hour <= 0:
+        logger.info("Scheduler de refresco deshabilitado")
+        return
+    _task = asyncio.create_task(_loop(), name="refresh-scheduler")
+    logger.info(f"Scheduler de refresco iniciado ({settings.refresh_budget_per_hour} requests/h)")
+
+
+async def stop_refresh_scheduler():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def scheduler_status(limit: int = 20) -> dict:
+    """Presupuesto, última vuelta y los primeros `limit` juegos de la cola."""
+    today = datetime.now(timezone.utc).date()
+    return {
+        "running":          _task is not None and not _task.done(),
+        "budget_per_hour":  settings.refresh_budget_per_hour,
+        "spent_last_hour":  spent_last_hour(),
+        "interval_seconds": settings.refresh_interval_seconds,
+        "sale_season":      sale_season(today),
+        **_state,
+        "queue":            build_queue(limit),
+    }
@@ -0,0 +1,193 @@
+"""
+src/services/search_index.py
+============================
+Índice local de búsqueda por título/slug sobre la tabla games, en memoria.
+
+GET /games/search lo consulta primero y solo llama a ITAD si no hay resultados
+locales. Estructura:
+  - trigramas de cada palabra → ids de juegos (palabras de 3+ caracteres)
+  - prefijos de 1–2 caracteres de cada palabra → ids (consultas cortas)
+Cada palabra de la consulta debe aparecer en el título o el slug; se ordena por
+el título empieza con la consulta (la exacta primero) > prefijos de palabra
+> subcadena, y luego por título más corto.
+
+El sync marca el índice como desactualizado (invalidate) y se reconstruye en un
+thread en la próxima búsqueda, a lo sumo cada REBUILD_MIN_INTERVAL_S mientras
+un sync masivo siga agregando juegos.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from src.db import queries
+from src.db.connection import db_cursor
+
+logger = logging.getLogger(__name__)
+
+REBUILD_MIN_INTERVAL_S = 5.0
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """minúsculas, sin acentos, solo [0-9a-z] separados por un espacio."""
+    text = (text or "").lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text)
+                       if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def _trigrams(word: str) -> set[str]:
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class _Snapshot:
+    """
+    Estructuras inmutables de una construcción; se reemplazan en bloque.
+    Los ids internos siguen el orden (largo del título, título): entre juegos con
+    el mismo rango de coincidencia, id menor = mejor resultado, así cada nivel
+    se recorre en orden y corta al llegar a `limit`.
+    """
+
+    def __init__(self, rows: list[dict]):
+        keyed = []
+        for row in rows:
+            title = normalize(row.get("title") or "")
+            slug = normalize(row.get("slug") or "")
+            keyed.append((len(title), title, slug, row))
+        keyed.sort(key=lambda k: (k[0], k[1]))
+
+        self.docs = [row for *_, row in keyed]
+        self.titles = [title for _, title, _, _ in keyed]
+        self.texts = [f"{title} | {slug}" for _, title, slug, _ in keyed]
+        self.words: list[tuple[str, ...]] = []
+        self.grams: dict[str, set[int]] = {}
+        self.prefixes: dict[str, set[int]] = {}
+        for i, text in enumerate(self.texts):
+            words = tuple(dict.fromkeys(text.replace("|", " ").split()))
+            self.words.append(words)
+            for w in words:
+                for g in _trigrams(w):
+                    self.grams.setdefault(g, set()).add(i)
+                for n in (1, 2):
+                    if len(w) >= n:
+                        self.prefixes.setdefault(w[:n], set()).add(i)
+        # Títulos ordenados alfabéticamente → bisect para "empieza con"
+        self.by_title = sorted((t, i) for i, t in enumerate(self.titles))
+        self.sorted_titles = [t for t, _ in self.by_title]
+
+    def candidates(self, word: str) -> set[int]:
+        if len(word) < 3:
+            return self.prefixes.get(word, set())
+        postings = sorted((self.grams.get(g, set()) for g in _trigrams(word)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        found = set(postings[0])
+        for p in postings[1:]:
+            found &= p
+            if not found:
+                break
+        return found
+
+    def _starting_with(self, q: str, limit: int) -> list[int]:
+        lo = bisect.bisect_left(self.sorted_titles, q)
+        hi = bisect.bisect_left(self.sorted_titles, q + "\x7f", lo)
+        return heapq.nsmallest(limit, (i for _, i in self.by_title[lo:hi]))
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        q = normalize(query)
+        words = q.split()
+        if not words:
+            return []
+        # Nivel 1: el título empieza con la consulta (incluye la coincidencia exacta,
+        # que por ser el título más corto queda primero)
+        found = self._starting_with(q, limit)
+        if len(found) >= limit:
+            return [self.docs[i] for i in found]
+
+        ids: Optional[set[int]] = None
+        for w in sorted(words, key=len, reverse=True):     # la más selectiva primero
+            c = self.candidates(w)
+            ids = set(c) if ids is None else ids & c
+            if not ids:
+                break
+        if ids:
+            seen = set(found)
+            ordered = sorted(ids - seen)
+            # Nivel 2: cada palabra de la consulta es prefijo de una palabra del juego;
+            # nivel 3: subcadena. Trigramas/prefijos solo filtran, aquí se confirma.
+            prefix, inner = [], []
+            for i in ordered:
+                ws = self.words[i]
+                if all(any(tw.startswith(w) for tw in ws) for w in words):
+                    prefix.append(i)
+                    if len(found) + len(prefix) >= limit:
+                        break
+                elif len(inner) < limit and all(w in self.texts[i] for w in words):
+                    inner.append(i)
+            found += prefix + inner
+        return [self.docs[i] for i in found[:limit]]
+
+
+class TitleIndex:
+    def __init__(self):
+        self._snap = _Snapshot([])
+        self._dirty = True
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"builds": 0, "build_ms": 0.0, "queries": 0,
+                       "local_hits": 0, "misses": 0}
+
+    def invalidate(self):
+        self._dirty = True
+
+    def rebuild(self) -> int:
+        """Reconstruye desde games (bloqueante; llamar fuera del event loop)."""
+        with self._lock:
+            self._dirty = False      # antes de leer: un sync concurrente lo vuelve a marcar
+            t0 = time.perf_counter()
+            with db_cursor() as con:
+                rows = queries.list_game_titles(con)
+            self._snap = _Snapshot(rows)
+            self._built_at = time.monotonic()
+            self._stats["builds"] += 1
+            self._stats["build_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        logger.debug(f"Índice de títulos: {len(rows)} juegos en {self._stats['build_ms']} ms")
+        return len(rows)
+
+    async def refresh_if_stale(self):
+        if self._dirty and time.monotonic() - self._built_at >= REBUILD_MIN_INTERVAL_S:
+            try:
+                await asyncio.to_thread(self.rebuild)
+            except Exception as e:
+                logger.warning(f"No se pudo reconstruir el índice de títulos: {e}")
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        self._stats["queries"] += 1
+        results = self._snap.search(query, limit)
+        self._stats["local_hits" if results else "misses"] += 1
+        return results
+
+    def metrics(self) -> dict:
+        snap = self._snap
+        return {**self._stats, "games": len(snap.docs), "trigrams": len(snap.grams),
+                "stale": self._dirty}
+
+
+_index = TitleIndex()
+
+
+def get_index() -> TitleIndex:
+    return _index
+
+
+def invalidate():
+    """Llamar tras agregar o renombrar juegos."""
+    _index.invalidate()
@@ -3,119 +3,305 @@ src/services/sync_service.py
 """
 import asyncio
 import logging
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
 import httpx
+import pyarrow as pa
 from config import get_settings
-from src.api.client import ITADClient
+from src.api.client import get_client
+from src.api.history_parser import parse_history_columns
+from src.api.singleflight import SingleFlight
+from src.api.steam_client import get_steam_client
 from src.db import queries
-from src.db.connection import get_db
+from src.db.connection import db_cursor
+from src.db.writer import get_writer, log_failure
+from src.services import lookup_service, search_index
+from src.services.pipeline import Pipeline
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-async def get_top_appids(client: httpx.AsyncClient, top_n: int) -> list[int]:
+async def get_top_apps(client: httpx.AsyncClient, top_n: int) -> dict[int, str]:
+    """{appid: nombre} de SteamSpy, en orden; el nombre evita pedir /games/info a ITAD."""
     try:
         r = await client.get("https://steamspy.com/api.php",
                              params={"request": "top100forever"}, timeout=30)
         if r.status_code == 200:
-            appids = [int(k) for k in r.json().keys()][:top_n]
-            logger.info(f"SteamSpy: {len(appids)} appids obtenidos")
-            return appids
+            apps = {int(k): (v or {}).get("name") if isinstance(v, dict) else None
+                    for k, v in list(r.json().items())[:top_n]}
+            logger.info(f"SteamSpy: {len(apps)} appids obtenidos")
+            return apps
     except Exception as e:
         logger.error(f"Error en SteamSpy: {e}")
-    return []
+    return {}
 
 
-async def sync_by_appid(appid: int) -> dict:
-    """Sincroniza un juego por Steam appid. Usado por POST /sync/game/{appid}."""
-    con = get_db()
-    async with ITADClient(settings.itad_api_key) as client:
-        lookup = await client.lookup_game(appid)
-        if not lookup:
-            return {"appid": appid, "status": "not_found", "inserted": 0}
-        game_id, slug, title = lookup
-        try:
-            queries.upsert_game(con, game_id=game_id, slug=slug, title=title, appid=appid)
-        except Exception as e:
-            logger.debug(f"upsert_game skip appid={appid}: {e}")
-        records = await client.get_price_history(game_id, appid=appid)
-        if not records:
-            return {"game_id": game_id, "title": title, "appid": appid,
-                    "status": "no_history", "inserted": 0}
-        inserted = queries.upsert_price_records(con, [r.model_dump() for r in records])
-        logger.info(f"✓ {title} ({appid}): {inserted} registros")
-        return {"game_id": game_id, "title": title, "appid": appid,
-                "status": "ok", "inserted": inserted}
-
-
-async def sync_by_game_id(game_id: str) -> dict:
+def _since_param(watermark: Optional[datetime]) -> Optional[str]:
+    """
+    `since` para ITAD a partir del último registro guardado del juego.
+    None → ITADClient usa ITAD_HISTORY_SINCE (historial completo).
+    El margen de ITAD_SYNC_OVERLAP_HOURS recoge registros que ITAD publique tarde;
+    los repetidos los descarta ON CONFLICT.
+    """
+    if watermark is None:
+        return None
+    since = watermark - timedelta(hours=settings.itad_sync_overlap_hours)
+    return since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _history_since(game_ids: list[str], full_refresh: bool) -> dict[str, Optional[str]]:
+    """`since` por game_id (una sola consulta para todo el lote)."""
+    if full_refresh:
+        return {gid: None for gid in game_ids}
+    with db_cursor() as con:
+        marks = queries.get_history_watermarks(con, game_ids)
+    return {gid: _since_param(marks.get(gid)) for gid in game_ids}
+
+
+async def sync_by_appid(appid: int, full_refresh: bool = False) -> dict:
+    """
+    Sincroniza un juego por Steam appid. Usado por POST /sync/game/{appid}.
+    Por defecto solo pide a ITAD lo posterior al último registro guardado.
+    El appid se resuelve vía itad_lookup_cache (incluye "no existe" recientes).
+    """
+    lookup = await lookup_service.resolve_appid(appid)
+    if not lookup:
+        return {"appid": appid, "status": "not_found", "inserted": 0}
+    game_id, slug, title = lookup
+    try:
+        await get_writer().run(queries.upsert_game, game_id=game_id, slug=slug,
+                               title=title, appid=appid)
+        search_index.invalidate()
+    except Exception as e:
+        logger.debug(f"upsert_game skip appid={appid}: {e}")
+    result = await _sync_history(game_id, appid, full_refresh)
+    return {"game_id": game_id, "title": title, "appid": appid, **result}
+
+
+async def sync_by_game_id(game_id: str, full_refresh: bool = False) -> dict:
     """
     Sincroniza un juego por ITAD game_id.
     Usado cuando el usuario hace click en un resultado de búsqueda —
     ya tenemos el game_id de ITAD pero el juego puede no estar en DB.
     """
-    con = get_db()
-    existing = queries.get_game(con, game_id)
+    with db_cursor() as con:
+        existing = queries.get_game(con, game_id)
     if not existing:
         try:
-            queries.upsert_game(con, game_id=game_id, slug=game_id,
-                                title=game_id, appid=None)
+            await get_writer().run(queries.upsert_game, game_id=game_id, slug=None,
+                                   title=game_id, appid=None)
+            search_index.invalidate()
         except Exception:
             pass
-    async with ITADClient(settings.itad_api_key) as client:
-        records = await client.get_price_history(game_id)
-        if not records:
-            return {"game_id": game_id, "status": "no_history", "inserted": 0}
-        inserted = queries.upsert_price_records(con, [r.model_dump() for r in records])
-        logger.info(f"✓ game_id={game_id}: {inserted} registros")
-        return {"game_id": game_id, "status": "ok", "inserted": inserted}
+    result = await _sync_history(game_id, (existing or {}).get("appid"), full_refresh)
+    return {"game_id": game_id, **result}
+
 
+# Syncs simultáneos del mismo juego (varios usuarios, o por appid y por game_id
+# a la vez) comparten un solo request a ITAD y una sola escritura. Solo se cachea
+# un sync exitoso: tras un fallo o "sin historial" el reintento va a ITAD.
+_sync_flight = SingleFlight("sync.game", ttl=settings.singleflight_ttl_seconds,
+                            cache_if=lambda result: result.get("status") == "ok")
 
-async def sync_top_games(top_n: int = 100) -> dict:
+
+async def _sync_history(game_id: str, appid: Optional[int], full_refresh: bool) -> dict:
+    return await _sync_flight.do((game_id, full_refresh),
+                                 lambda: _fetch_and_store(game_id, appid, full_refresh))
+
+
+async def _fetch_and_store(game_id: str, appid: Optional[int], full_refresh: bool) -> dict:
+    since = _history_since([game_id], full_refresh)[game_id]
+    history = await get_client().get_price_history_columns(game_id, appid=appid, since=since)
+    if history is None:
+        # Sin mark_refreshed: el scheduler lo vuelve a intentar en el próximo tick
+        return {"status": "failed", "inserted": 0}
+    rows, columns = history
+    log_failure(get_writer().submit(queries.mark_refreshed, [game_id]), "mark_refreshed")
+    if not rows:
+        return {"status": "up_to_date" if since else "no_history", "inserted": 0}
+    inserted = await get_writer().run(queries.upsert_price_columns, columns)
+    logger.info(f"✓ game_id={game_id}: {inserted} registros")
+    return {"status": "ok", "inserted": inserted}
+
+
+_last_pipeline: Optional[Pipeline] = None
+
+
+def sync_status() -> dict:
+    """Contadores por etapa del último sync_top_games (en curso o terminado)."""
+    if _last_pipeline is None:
+        return {"pipeline": "sync_top_games", "running": False, "stages": []}
+    return _last_pipeline.metrics()
+
+
+async def sync_top_games(top_n: int = 100, full_refresh: bool = False) -> dict:
+    """Sincroniza los top N de SteamSpy (ver sync_apps)."""
     if not settings.itad_api_key:
         raise ValueError("ITAD_API_KEY no configurada")
-    summary = {"total_games": 0, "total_inserted": 0, "errors": 0, "synced": []}
-    async with httpx.AsyncClient(timeout=30) as http_client:
-        appids = await get_top_appids(http_client, top_n)
-    if not appids:
+    apps = await get_top_apps(await get_steam_client().http(), top_n)
+    return await sync_apps(apps, full_refresh=full_refresh)
+
+
+# checkpoint(ids, status, error): status = done | skipped | failed
+Checkpoint = Callable[[list, str, Optional[str]], Awaitable[None]]
+
+
+def _new_summary() -> dict:
+    return {"total_games": 0, "total_inserted": 0, "errors": 0, "synced": [],
+            "incremental": 0, "full": 0, "up_to_date": 0, "not_in_itad": 0}
+
+
+async def sync_apps(apps: dict[int, Optional[str]], full_refresh: bool = False,
+                    checkpoint: Optional[Checkpoint] = None) -> dict:
+    """
+    Sincroniza un lote de appids ({appid: nombre}). Los appids se resuelven primero
+    en lote (itad_lookup_cache + lookup bulk de ITAD) y luego corre un pipeline de
+    etapas solapadas: fetch (historial HTTP) → normalize (parseo, en thread)
+      → write (lotes de SYNC_WRITE_BATCH_ROWS filas al writer de DuckDB)
+    Concurrencia y tamaño de colas configurables (SYNC_*). Métricas en sync_status().
+
+    `checkpoint` se llama tras confirmar cada lote escrito (y para los appids
+    descartados antes del pipeline); la cola de trabajos lo usa para reanudar.
+    Un historial que ITAD no devolvió (request fallido o JSON inválido) se
+    reporta como failed, así el trabajo lo reintenta. Los appids que fallan
+    por una excepción dentro de una etapa no se reportan.
+    """
+    summary = _new_summary()
+    if not apps:
         return summary
+    appids = list(apps)
     logger.info(f"Iniciando sync de {len(appids)} juegos...")
-    con = get_db()
-    async with ITADClient(settings.itad_api_key) as itad:
-        batch_size = settings.request_batch_size
-        for i in range(0, len(appids), batch_size):
-            batch = appids[i:i + batch_size]
-            lookup_results = await asyncio.gather(
-                *[itad.lookup_game(appid) for appid in batch],
-                return_exceptions=True
-            )
-            for appid, lookup in zip(batch, lookup_results):
-                if isinstance(lookup, Exception) or not lookup:
-                    summary["errors"] += 1
-                    continue
-                game_id, slug, title = lookup
-                try:
-                    try:
-                        queries.upsert_game(con, game_id=game_id, slug=slug,
-                                            title=title, appid=appid)
-                    except Exception as e:
-                        logger.debug(f"upsert_game skip {appid}: {e}")
-                    records = await itad.get_price_history(game_id, appid=appid)
-                    if records:
-                        inserted = queries.upsert_price_records(
-                            con, [r.model_dump() for r in records])
-                        summary["total_inserted"] += inserted
-                        summary["total_games"] += 1
-                        summary["synced"].append(appid)
-                        logger.info(f"  ✓ {title} ({appid}): {inserted} registros")
-                    else:
-                        summary["errors"] += 1
-                except Exception as e:
-                    logger.warning(f"Error appid={appid}: {e}")
-                    summary["errors"] += 1
-            await asyncio.sleep(settings.request_delay)
-            logger.info(f"Progreso: {min(i+batch_size,len(appids))}/{len(appids)} | "
-                        f"Insertados: {summary['total_inserted']}")
-    logger.info(f"Sync completado: {summary}")
+
+    async def report(ids: list[int], status: str, error: Optional[str] = None):
+        if checkpoint and ids:
+            await checkpoint(ids, status, error)
+
+    resolved = await lookup_service.resolve_appids(appids, titles=apps)
+    targets, not_in_itad, unresolved = [], [], []
+    for appid in appids:
+        found = resolved.get(appid)
+        if not found:
+            (not_in_itad if appid in resolved else unresolved).append(appid)
+            continue
+        game_id, slug, title = found
+        targets.append({"appid": appid, "game_id": game_id, "slug": slug, "title": title})
+    summary["not_in_itad"] += len(not_in_itad)
+    summary["errors"] += len(unresolved)
+    await report(not_in_itad, "skipped", "no existe en ITAD")
+    await report(unresolved, "failed", "lookup ITAD falló")
+
+    await _sync_targets("sync_top_games", targets, full_refresh, summary, report, key="appid")
     return summary
+
+
+async def sync_games(games: list[dict], full_refresh: bool = False,
+                     checkpoint: Optional[Checkpoint] = None) -> dict:
+    """
+    Sincroniza juegos ya conocidos (filas de games: id/slug/title/appid) sin pasar
+    por el lookup de appid: un request de historial a ITAD por juego.
+    Usado por el scheduler de refresco; `checkpoint` recibe game_ids.
+    """
+    summary = _new_summary()
+    if not games:
+        return summary
+    targets = [{"appid": g.get("appid"), "game_id": g["id"], "slug": g.get("slug"),
+                "title": g.get("title") or g["id"]} for g in games]
+
+    async def report(ids: list[str], status: str, error: Optional[str] = None):
+        if checkpoint and ids:
+            await checkpoint(ids, status, error)
+
+    await _sync_targets("refresh", targets, full_refresh, summary, report, key="game_id")
+    return summary
+
+
+async def _sync_targets(name: str, targets: list[dict], full_refresh: bool, summary: dict,
+                        report: Callable[..., Awaitable[None]], key: str) -> None:
+    """
+    Pipeline de etapas solapadas sobre juegos ya resueltos a game_id:
+    fetch (historial HTTP) → normalize (parseo, en thread) → write (lotes de
+    SYNC_WRITE_BATCH_ROWS filas al writer de DuckDB). Acumula en `summary` y
+    reporta cada lote escrito con report(ids, status), con target[key] como id.
+    """
+    global _last_pipeline
+    itad = get_client()
+
+    async def fetch(game: dict) -> dict:
+        since_by_game = await asyncio.to_thread(_history_since, [game["game_id"]], full_refresh)
+        game["since"] = since_by_game[game["game_id"]]
+        summary["incremental" if game["since"] else "full"] += 1
+        game["raw"] = await itad.fetch_price_history(game["game_id"], since=game["since"])
+        return game
+
+    async def normalize(game: dict) -> dict:
+        raw = game.pop("raw")
+        game["rows"], game["error"] = 0, None
+        if raw is None:
+            game["error"] = "request a ITAD falló"
+            return game
+        # Streaming: del cuerpo crudo a columnas Arrow sin objetos por registro
+        try:
+            game["rows"], game["columns"] = await asyncio.to_thread(
+                parse_history_columns, raw, game["game_id"], game["appid"], bool(game["since"]))
+        except ValueError:
+            game["error"] = "respuesta de ITAD inválida"
+        return game
+
+    async def write(games: list[dict]) -> None:
+        writer = get_writer()
+        tables = []
+        for g in games:
+            log_failure(writer.submit(queries.upsert_game, game_id=g["game_id"], slug=g["slug"],
+                                      title=g["title"], appid=g["appid"]),
+                        f"upsert_game {g['game_id']}")
+            if g["rows"]:
+                tables.append(pa.table(g.pop("columns")))
+        # Solo los que ITAD respondió (aunque sin registros nuevos): un fallo no
+        # debe sacar al juego de la cola de refresco
+        fetched = [g["game_id"] for g in games if not g["error"]]
+        if fetched:
+            log_failure(writer.submit(queries.mark_refreshed, fetched), "mark_refreshed")
+
+        search_index.invalidate()
+
+        inserted = 0
+        if tables:
+            inserted = await writer.run(queries.upsert_price_columns, pa.concat_tables(tables))
+        done, empty, failed = [], [], {}
+        for g in games:
+            if g["error"]:
+                summary["errors"] += 1
+                failed.setdefault(g["error"], []).append(g[key])
+            elif g["rows"]:
+                summary["total_games"] += 1
+                summary["synced"].append(g[key])
+                done.append(g[key])
+            elif g["since"]:
+                summary["up_to_date"] += 1
+                done.append(g[key])
+            else:
+                summary["errors"] += 1
+                empty.append(g[key])
+        summary["total_inserted"] += inserted
+        await report(done, "done")
+        await report(empty, "failed", "ITAD no devolvió historial")
+        for error, ids in failed.items():
+            await report(ids, "failed", error)
+        logger.info(f"  ✓ lote de {len(games)} juegos: {inserted} registros | "
+                    f"Progreso: {len(summary['synced']) + summary['up_to_date']}/{len(targets)}")
+
+    pipeline = (
+        Pipeline(name, queue_size=settings.sync_queue_size)
+        .stage("fetch",     fetch,     concurrency=settings.sync_fetch_concurrency)
+        .stage("normalize", normalize, concurrency=settings.sync_parse_concurrency)
+        .stage("write",     write,     batch_size=settings.sync_write_batch_rows,
+               size=lambda g: g["rows"])
+    )
+    _last_pipeline = pipeline
+    await pipeline.run(targets)
+
+    # Errores de etapa (excepciones) que no pasaron por el conteo por juego
+    summary["errors"] += sum(st.errors for st in pipeline.stages)
+    summary["pipeline"] = pipeline.metrics()
+    logger.info(f"Sync completado: { {k: v for k, v in summary.items() if k != 'synced'} }")
@@ -0,0 +1,115 @@
+"""
+tests/test_features.py
+======================
+Paridad de build_features_batch con build_features juego por juego.
+
+Uso:
+  python -m pytest -q tests
+
+Sobre una DuckDB temporal con historiales sintéticos (incluidos los bordes:
+sin ventas, un solo registro, precio regular NaN, precios 0) el dict de
+batch_row debe ser idéntico al que build_features arma desde get_game_bundle.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import duckdb
+import numpy as np
+import pytest
+
+from src.db import queries
+from src.db.models import create_all_tables
+from src.ml.features import batch_row, build_features, build_features_batch
+
+
+def _history(game_id: str, prices: list[float], cuts: list[int], regular: float = 19.99) -> dict:
+    """Registros semanales que terminan hace 3 días (días desde venta/mínimo ≠ 0)."""
+    n = len(prices)
+    end = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(days=3)
+    return {
+        "game_id":     np.full(n, game_id, dtype=object),
+        "appid":       np.full(n, 10, dtype=np.int32),
+        "timestamp":   np.array([end - timedelta(weeks=n - 1 - i) for i in range(n)], dtype="datetime64[us]"),
+        "price_usd":   np.asarray(prices, dtype=float),
+        "regular_usd": np.full(n, regular, dtype=float),
+        "cut_pct":     np.asarray(cuts, dtype=np.int32),
+        "shop_id":     np.full(n, 61, dtype=np.int32),
+        "shop_name":   np.full(n, "Steam", dtype=object),
+    }
+
+
+def _sales(n: int, seed: int, free_every: int = 0) -> tuple[list[float], list[int]]:
+    """Descuentos aleatorios; con free_every, uno de cada `free_every` registros a precio 0."""
+    rng = np.random.default_rng(seed)
+    cuts = [int(c) for c in rng.choice([0, 0, 0, 10, 25, 50, 75], size=n)]
+    prices = [round(19.99 * (1 - c / 100), 2) for c in cuts]
+    if free_every:
+        prices = [0.0 if i % free_every == free_every - 1 else p for i, p in enumerate(prices)]
+    return prices, cuts
+
+
+GAMES = {
+    # Más de un año de historial: cruza Q4 y verano, con tendencia
+    "long":        _history("long", *_sales(80, seed=1)),
+    # Algunos precios 0 (gratis por un tiempo): fuera de la tendencia
+    "free-weeks":  _history("free-weeks", *_sales(30, seed=2, free_every=7)),
+    "no-sales":    _history("no-sales", [19.99] * 12, [0] * 12),
+    "nan-regular": _history("nan-regular", *_sales(8, seed=3), regular=float("nan")),
+    "three":       _history("three", [19.99, 9.99, 19.99], [0, 50, 0]),
+    "single":      _history("single", [4.99], [75]),
+}
+
+
+@pytest.fixture(scope="module")
+def con(tmp_path_factory):
+    con = duckdb.connect(str(tmp_path_factory.mktemp("db") / "test.duckdb"))
+    create_all_tables(con)
+    for game_id, columns in GAMES.items():
+        queries.upsert_price_columns(con, columns)
+        queries.upsert_game(con, game_id, game_id, game_id.title(), 10)
+    yield con
+    con.close()
+
+
+def _single(con, game_id: str):
+    bundle = queries.get_game_bundle(con, game_id, include_history=True)
+    return build_features(bundle["stats"], bundle["history"], bundle["seasonal"])
+
+
+def test_batch_matches_build_features(con):
+    batch = build_features_batch(queries.get_feature_inputs(con))
+    pos = {gid: i for i, gid in enumerate(batch["game_id"])}
+
+    for game_id in GAMES:
+        expected = _single(con, game_id)
+        got = batch_row(batch, pos[game_id]) if game_id in pos else None
+        assert got == expected, game_id
+
+
+def test_single_record_has_no_features(con):
+    assert _single(con, "single") is None
+    assert "single" not in list(queries.get_feature_inputs(con)["game_id"])
+
+
+def test_no_sales_caps_days_since_last_sale(con):
+    batch = build_features_batch(queries.get_feature_inputs(con, ["no-sales"]))
+    row = batch_row(batch, 0)
+    assert row["days_since_last_sale"] == 730
+    assert row["sale_frequency"] == 0.0
+    assert row["current_discount_pct"] == 0
+
+
+def test_nan_regular_price_is_stored_as_null(con):
+    regular = con.execute(
+        "SELECT COUNT(regular_usd) FROM price_history WHERE game_id = 'nan-regular'"
+    ).fetchone()[0]
+    assert regular == 0
+    assert _single(con, "nan-regular") is not None
+
+
+def test_feature_state_matches_history(con):
+    batch = build_features_batch(queries.get_feature_inputs(con))
+    state = build_features_batch(queries.get_feature_state(con))
+    assert list(state["game_id"]) == list(batch["game_id"])
+    for i in range(len(batch["game_id"])):
+        assert batch_row(state, i) == batch_row(batch, i), batch["game_id"][i]
@@ -1,6 +1,6 @@
 export interface Game {
   id: string
-  slug: string
+  slug: string | null
   title: string
   appid?: number
   total_records?: number
@@ -10,7 +10,7 @@ export interface Game {
 
 export interface SearchResult {
   id: string
-  slug: string
+  slug: string | null
   title: string
   type?: string
 }